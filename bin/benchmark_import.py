@@ -0,0 +1,88 @@
+#! /usr/bin/env python
+
+# Author: Marc Claesen
+#
+# Copyright (c) 2014 KU Leuven, ESAT-STADIUS
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# 3. Neither name of copyright holders nor the names of its contributors
+# may be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# ``AS IS'' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED.  IN NO EVENT SHALL THE REGENTS OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# This executable measures the time it takes to import optunity and to
+# launch a standalone session (which happens on every call from R, MATLAB, ...).
+# Each measurement is done in a fresh interpreter.
+#
+# Usage: python benchmark_import.py [repetitions]
+
+from __future__ import print_function
+import subprocess
+import sys
+import timeit
+
+# optional dependencies that should not be imported at startup
+_heavy = ['numpy', 'scipy', 'pandas', 'pyspark', 'deap', 'hyperopt', 'bayesopt']
+
+_probe = """
+import sys, time
+start = time.time()
+import %s
+elapsed = time.time() - start
+print(elapsed)
+print(','.join(m for m in %r if m in sys.modules))
+"""
+
+
+def measure(module, repetitions):
+    """Returns the best import time of module and the heavy modules it imported."""
+    best = float('inf')
+    for _ in range(repetitions):
+        output = subprocess.check_output([sys.executable, '-c',
+                                          _probe % (module, _heavy)])
+        elapsed, heavy = output.decode().split('\n')[:2]
+        best = min(best, float(elapsed))
+    return best, heavy
+
+
+def measure_session(repetitions):
+    """Returns the best wall clock time of a standalone session requesting a manual."""
+    command = [sys.executable, '-m', 'optunity.standalone']
+    def session():
+        p = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        p.communicate(b'{"manual": ""}\n')
+    return min(timeit.repeat(session, number=1, repeat=repetitions))
+
+
+if __name__ == '__main__':
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    for module in ['optunity', 'optunity.standalone']:
+        elapsed, heavy = measure(module, repetitions)
+        print('import %-20s %8.1f ms    heavy dependencies: %s'
+              % (module, 1000 * elapsed, heavy or 'none'))
+
+    print('standalone manual session   %8.1f ms' % (1000 * measure_session(repetitions)))
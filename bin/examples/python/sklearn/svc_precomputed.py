@@ -0,0 +1,45 @@
+# Example of tuning an SVC model in scikit-learn with Optunity,
+# reusing RBF kernel matrices across evaluations with the same gamma.
+# This example requires sklearn
+
+import optunity
+import optunity.metrics
+import optunity.cross_validation
+import sklearn.svm
+import sklearn.metrics.pairwise
+import numpy
+
+# CREATE THE TRAINING SET
+from sklearn.datasets import load_digits
+digits = load_digits()
+n = digits.data.shape[0]
+
+positive_digit = 8
+negative_digit = 9
+
+positive_idx = [i for i in range(n) if digits.target[i] == positive_digit]
+negative_idx = [i for i in range(n) if digits.target[i] == negative_digit]
+
+# add some noise to the data to make it a little challenging
+original_data = digits.data[positive_idx + negative_idx, ...]
+data = original_data + 5 * numpy.random.randn(original_data.shape[0], original_data.shape[1])
+labels = [True] * len(positive_idx) + [False] * len(negative_idx)
+
+# the Gram matrix only depends on gamma, it is computed once per gamma value
+def rbf(x, gamma):
+    return sklearn.metrics.pairwise.rbf_kernel(x, gamma=gamma)
+
+cache = optunity.cross_validation.KernelCache(rbf, ['gamma'])
+
+@optunity.cross_validated(x=data, y=labels, num_folds=5, kernel_cache=cache)
+def svm_auc(x_train, y_train, x_test, y_test, kernel_train, kernel_test, C, gamma):
+    model = sklearn.svm.SVC(C=C, kernel='precomputed').fit(kernel_train, y_train)
+    decision_values = model.decision_function(kernel_test)
+    return optunity.metrics.roc_auc(y_test, decision_values)
+
+# a grid search evaluates every C for the same gamma values
+optimal_pars, details, _ = optunity.maximize(svm_auc, 100, C=[0.1, 10], gamma=[0.001, 0.1],
+                                             solver_name='grid search')
+print('Optimal parameters: ' + str(optimal_pars))
+print('AUROC of tuned SVM: %1.3f' % details.optimum)
+print('Gram matrices computed: %d' % cache.num_computed)
@@ -37,7 +37,7 @@ __author__
 
 from .api import manual, maximize, minimize, optimize, available_solvers, maximize_structured, minimize_structured
 from .api import wrap_call_log, wrap_constraints, make_solver, suggest_solver
-from .cross_validation import cross_validated, generate_folds
+from .cross_validation import cross_validated, generate_folds, nested_cross_validation
 from .parallel import pmap
 from .functions import call_log2dataframe
 
@@ -49,4 +49,5 @@ __all__ = ['manual', 'maximize', 'minimize', 'optimize',
            'wrap_call_log', 'wrap_constraints', 'make_solver',
            'suggest_solver', 'cross_validated', 'generate_folds',
            'pmap', 'available_solvers', 'call_log2dataframe',
-           'maximize_structured', 'minimize_structured']
+           'maximize_structured', 'minimize_structured',
+           'nested_cross_validation']
@@ -53,6 +53,7 @@ e.g. :mod:`optunity.solvers`.
 import timeit
 import sys
 import operator
+import functools
 
 # optunity imports
 from . import functions as fun
@@ -61,6 +62,7 @@ from . import search_spaces
 from .solvers import solver_registry
 from .util import DocumentedNamedTuple as DocTup
 from .constraints import wrap_constraints
+from .cross_validation import FoldRacing
 
 
 def _manual_lines(solver_name=None):
@@ -75,7 +77,7 @@ def _manual_lines(solver_name=None):
 
     Raises ``KeyError`` if ``solver_name`` is not registered."""
     if solver_name:
-        return solver_registry.get(solver_name).desc_full, [solver_name]
+        return solver_registry.manual(solver_name), [solver_name]
     else:
         return solver_registry.manual(), solver_registry.solver_names()
 
@@ -96,7 +98,7 @@ def manual(solver_name=None):
 
     Raises ``KeyError`` if ``solver_name`` is not registered."""
     if solver_name:
-        man = solver_registry.get(solver_name).desc_full
+        man = solver_registry.manual(solver_name)
     else:
         man = solver_registry.manual()
     print('\n'.join(man))
@@ -138,7 +140,7 @@ def suggest_solver(num_evals=50, solver_name=None, **kwargs):
         solvercls = solver_registry.get(solver_name)
     else:
         solver_name = 'particle swarm'
-        solvercls = solvers.ParticleSwarm
+        solvercls = solver_registry.get(solver_name)
     if hasattr(solvercls, 'suggest_from_box'):
         suggestion = solvercls.suggest_from_box(num_evals, **kwargs)
     elif hasattr(solvercls, 'suggest_from_seed'):
@@ -230,7 +232,11 @@ def optimize(solver, func, maximize=True, max_evals=0, pmap=map, decoder=None):
     Please refer to docs of optunity.maximize_results
     and optunity.maximize_stats.
 
+    If ``func`` races cross-validation folds (cfr. :class:`optunity.cross_validation.FoldRacing`),
+    the racing rule follows the direction of optimization.
+
     """
+    _orient_racing(func, maximize)
 
     if max_evals > 0:
         f = fun.max_evals(max_evals)(func)
@@ -252,6 +258,8 @@ def optimize(solver, func, maximize=True, max_evals=0, pmap=map, decoder=None):
         else:
             index, _ = min(enumerate(f.call_log.values()), key=operator.itemgetter(1))
         solution = list(f.call_log.keys())[index]._asdict()
+        # call logs of structured search spaces contain decoded arguments
+        decoder = None
     time = timeit.default_timer() - time
 
     # TODO why is this necessary?
@@ -338,67 +346,283 @@ def _wrap_hard_box_constraints(f, box, default):
     return wrap_constraints(f, default, range_oo=box)
 
 
-def maximize_structured(f, search_space, num_evals=50, pmap=map):
-    """Basic function maximization routine. Maximizes ``f`` within
-    the given box constraints.
+# solvers that cannot search the box of a structured search space:
+# a grid need not contain a value of every choice
+_unstructured_solvers = ('grid search',)
 
-    :param f: the function to be maximized
-    :param search_space: the search space (see :doc:`/user/structured_search_spaces` for details)
-    :param num_evals: number of permitted function evaluations
-    :param pmap: the map function to use
-    :type pmap: callable
-    :returns: retrieved maximum, extra information and solver info
 
-    This function will implicitly choose an appropriate solver and
-    its initialization based on ``num_evals`` and the box constraints.
+def _suggest_structured(num_evals, solver_name, search_space, box):
+    """Suggests a solver for a structured search space.
+
+    Solvers that support structured search spaces natively (via ``suggest_from_tree``)
+    receive the search space itself, all others work on its box constraints.
+
+    >>> _suggest_structured(20, 'grid search', {'x': [0, 1]}, {'x': [0, 1]})
+    Traceback (most recent call last):
+    ...
+    ValueError: Solver 'grid search' does not support structured search spaces.
 
     """
+    if solver_name in _unstructured_solvers:
+        raise ValueError('Solver ' + repr(solver_name) +
+                         ' does not support structured search spaces.')
+    solvercls = solver_registry.get(solver_name or 'particle swarm')
+    if hasattr(solvercls, 'suggest_from_tree'):
+        suggestion = solvercls.suggest_from_tree(num_evals, search_space)
+        suggestion['solver_name'] = solver_name
+        return suggestion
+    return suggest_solver(num_evals, solver_name or 'particle swarm', **box)
+
+
+class _Collected(Exception):
+    """Raised to collect the arguments of an evaluation instead of performing it."""
+    pass
+
+
+class _BranchBatches(object):
+    """Evaluates the candidates of a structured search space in batches per active branch.
+
+    Solvers evaluate batches of candidates via :func:`pmap`, with a function that eventually
+    calls :func:`objective` with a vector representation. This class first collects the vectors
+    of a batch, by interrupting these calls. The vectors are then decoded and grouped per active branch,
+    and the groups are evaluated, after which the solver's function is called again to obtain its results.
+
+    :param f: the objective function, or a dict of objective functions per branch, keyed by
+        option names or tuples of option names
+    :param tree: the :class:`optunity.search_spaces.SearchTree`
+    :param pmap: the map function used to evaluate groups
+    :param batched: whether objective functions evaluate an entire group per call
+    :param max_evals: maximum number of objective function evaluations
+
+    """
+
+    def __init__(self, f, tree, pmap, batched, max_evals):
+        self._f = f
+        self._tree = tree
+        self._columns = tree.columns()
+        self._pmap = pmap
+        self._batched = batched
+        self._max_evals = max_evals
+        self._num_evals = 0
+        self._collected = None
+        self._values = None
+        self._call_log = fun.CallLog()
+
+    @property
+    def call_log(self):
+        """Call log of the objective function(s), with decoded arguments."""
+        return self._call_log
+
+    def select(self, choices):
+        """Returns the objective function of the branch with given choices.
+
+        >>> tree = search_spaces.SearchTree({'a': {'x': None, 'y': {'b': {'u': None, 'v': None}}}})
+        >>> batches = _BranchBatches({'x': 1, 'y': 2, ('y', 'v'): 3}, tree, map, False, 10)
+        >>> [batches.select(c) for c in [{'a': 'x'}, {'a': 'y', 'b': 'u'}, {'a': 'y', 'b': 'v'}]]
+        [1, 2, 3]
+
+        """
+        if not isinstance(self._f, dict):
+            return self._f
+        options = set(choices.values())
+        best = None
+        for key in self._f:
+            required = (key, ) if not isinstance(key, tuple) else key
+            if options.issuperset(required) and (best is None or len(required) > len(best[0])):
+                best = (required, key)
+        if best is None:
+            raise KeyError('No objective function for branch ' + str(choices) + '.')
+        return self._f[best[1]]
+
+    def objective(self):
+        """Returns the objective function of the vector representation, for use in solvers."""
+        def f(**kwargs):
+            if self._collected is not None:
+                self._collected.append(kwargs)
+                raise _Collected()
+            if self._values is not None:
+                key = fun.Args(**kwargs)
+                if key in self._values:
+                    return self._result(self._values[key])
+            # evaluated outside of pmap
+            return self._result(self._evaluate([kwargs])[0])
+        f.call_log = self.call_log
+        return f
+
+    def _result(self, value):
+        if value is _Collected:
+            raise fun.MaximumEvaluationsException(self._max_evals)
+        return value
+
+    def pmap(self, f, *args):
+        """Evaluates ``f`` for all arguments, with the objective function evaluated per branch."""
+        args = list(zip(*args))
+        self._collected = []
+        try:
+            for a in args:
+                try:
+                    f(*a)
+                except _Collected:
+                    pass
+            vectors = self._collected
+        finally:
+            self._collected = None
+
+        values = self._evaluate(vectors)
+        self._values = dict((fun.Args(**v), value) for v, value in zip(vectors, values))
+        try:
+            return [f(*a) for a in args]
+        finally:
+            self._values = None
+
+    def _evaluate(self, vectors):
+        """Evaluates vector representations, grouped by active branch.
+
+        Evaluations beyond the maximum number of evaluations are marked with ``_Collected``.
+        """
+        results = [None] * len(vectors)
+        matrix = [[v[k] for k in self._columns] for v in vectors]
+        work, duplicates = [], []
+        for choices, rows, decoded in self._tree.decode_batch(matrix, grouped=True):
+            todo, pending = [], {}
+            for i, d in zip(rows, decoded):
+                # the call log has all hyperparameters, functions only those of their branch
+                key = fun.Args(**d)
+                value = self.call_log.data.get(key, None)
+                if value is not None:
+                    results[i] = value
+                elif key in pending:
+                    duplicates.append((i, pending[key]))
+                elif self._num_evals < self._max_evals:
+                    pending[key] = i
+                    todo.append((i, d, dict((k, v) for k, v in d.items() if v is not None)))
+                    self._num_evals += 1
+                else:
+                    results[i] = _Collected
+            if todo:
+                work.append((self.select(choices), todo))
+
+        if self._batched:
+            groups = [(objective, [kwargs for _, _, kwargs in todo]) for objective, todo in work]
+            values = list(self._pmap(_evaluate_group, groups))
+        else:
+            values = [list(self._pmap(functools.partial(_evaluate_kwargs, objective),
+                                      [kwargs for _, _, kwargs in todo]))
+                      for objective, todo in work]
+
+        for (_, todo), group_values in zip(work, values):
+            for (i, d, _), value in zip(todo, group_values):
+                self.call_log.insert(value, **d)
+                results[i] = value
+        for i, j in duplicates:
+            results[i] = results[j]
+        return results
+
+
+def _evaluate_kwargs(f, kwargs):
+    return f(**kwargs)
+
+
+def _evaluate_group(group):
+    f, batch = group
+    return f(batch)
+
+
+def _orient_racing(f, maximize):
+    """Sets the direction of the racing rules of cross-validated functions in ``f``,
+    which is a function or a dict of functions."""
+    for g in (f.values() if isinstance(f, dict) else [f]):
+        racing = getattr(g, 'racing', None)
+        if isinstance(racing, FoldRacing):
+            racing.orient(maximize)
+
+
+def _optimize_structured(f, search_space, num_evals, pmap, solver_name, batched, maximize):
+    _orient_racing(f, maximize)
     tree = search_spaces.SearchTree(search_space)
     box = tree.to_box()
+    if maximize:
+        default = -sys.float_info.max
+    else:
+        default = sys.float_info.max
 
-    # we need to position the call log here
-    # because the function signature used later on is internal logic
-    f = fun.logged(f)
+    if isinstance(f, dict) or batched:
+        # candidates are evaluated in groups per branch, which counts evaluations itself
+        batches = _BranchBatches(f, tree, pmap, batched, num_evals)
+        f = _wrap_hard_box_constraints(batches.objective(), box, default)
+        pmap, max_evals = batches.pmap, 0
+    else:
+        # we need to position the call log here
+        # because the function signature used later on is internal logic
+        f = fun.logged(f)
 
-    # wrap the decoder and constraints for the internal search space representation
-    f = tree.wrap_decoder(f)
-    f = _wrap_hard_box_constraints(f, box, -sys.float_info.max)
+        # wrap the decoder and constraints for the internal search space representation
+        f = tree.wrap_decoder(f)
+        f = _wrap_hard_box_constraints(f, box, default)
+        max_evals = num_evals
 
-    suggestion = suggest_solver(num_evals, "particle swarm", **box)
+    suggestion = _suggest_structured(num_evals, solver_name, search_space, box)
     solver = make_solver(**suggestion)
-    solution, details = optimize(solver, f, maximize=True, max_evals=num_evals,
+    solution, details = optimize(solver, f, maximize=maximize, max_evals=max_evals,
                                  pmap=pmap, decoder=tree.decode)
     return solution, details, suggestion
 
-def minimize_structured(f, search_space, num_evals=50, pmap=map):
-    """Basic function minimization routine. Minimizes ``f`` within
+
+def maximize_structured(f, search_space, num_evals=50, pmap=map, solver_name=None,
+                        batched=False):
+    """Basic function maximization routine. Maximizes ``f`` within
     the given box constraints.
 
-    :param f: the function to be maximized
+    :param f: the function to be maximized, or a dict of functions per branch of the
+        search space, keyed by option names or tuples of option names
     :param search_space: the search space (see :doc:`/user/structured_search_spaces` for details)
     :param num_evals: number of permitted function evaluations
     :param pmap: the map function to use
     :type pmap: callable
+    :param solver_name: name of the solver to use (optional, defaults to particle swarm),
+        any solver except grid search
+    :type solver_name: string
+    :param batched: whether ``f`` evaluates a list of hyperparameter dicts per call,
+        returning a list of function values (default false)
+    :type batched: bool
     :returns: retrieved maximum, extra information and solver info
 
     This function will implicitly choose an appropriate solver and
     its initialization based on ``num_evals`` and the box constraints.
 
+    If ``f`` is a dict or ``batched`` is true, every batch of candidates of the solver
+    is grouped per active branch (cfr. :func:`optunity.search_spaces.SearchTree.decode_batch`).
+    Each group is evaluated via ``pmap``, or as a single call if ``batched``.
+    Functions then only receive the choices and hyperparameters of their branch.
+
     """
-    tree = search_spaces.SearchTree(search_space)
-    box = tree.to_box()
+    return _optimize_structured(f, search_space, num_evals, pmap, solver_name,
+                                batched, maximize=True)
 
-    # we need to position the call log here
-    # because the function signature used later on is internal logic
-    f = fun.logged(f)
+def minimize_structured(f, search_space, num_evals=50, pmap=map, solver_name=None,
+                        batched=False):
+    """Basic function minimization routine. Minimizes ``f`` within
+    the given box constraints.
 
-    # wrap the decoder and constraints for the internal search space representation
-    f = tree.wrap_decoder(f)
-    f = _wrap_hard_box_constraints(f, box, sys.float_info.max)
+    :param f: the function to be minimized, or a dict of functions per branch of the
+        search space, keyed by option names or tuples of option names
+    :param search_space: the search space (see :doc:`/user/structured_search_spaces` for details)
+    :param num_evals: number of permitted function evaluations
+    :param pmap: the map function to use
+    :type pmap: callable
+    :param solver_name: name of the solver to use (optional, defaults to particle swarm),
+        any solver except grid search
+    :type solver_name: string
+    :param batched: whether ``f`` evaluates a list of hyperparameter dicts per call,
+        returning a list of function values (default false)
+    :type batched: bool
+    :returns: retrieved maximum, extra information and solver info
 
-    suggestion = suggest_solver(num_evals, "particle swarm", **box)
-    solver = make_solver(**suggestion)
-    solution, details = optimize(solver, f, maximize=False, max_evals=num_evals,
-                                 pmap=pmap, decoder=tree.decode)
-    return solution, details, suggestion
+    This function will implicitly choose an appropriate solver and
+    its initialization based on ``num_evals`` and the box constraints.
+
+    See :func:`maximize_structured` for the evaluation of candidates per branch.
 
+    """
+    return _optimize_structured(f, search_space, num_evals, pmap, solver_name,
+                                batched, maximize=False)
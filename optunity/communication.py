@@ -34,22 +34,60 @@
 
 from __future__ import print_function
 import json
+import mmap
+import os
+import stat
 import sys
 import socket
+import tempfile
+import struct
+import array
+import numbers
 import itertools
+import collections
+import operator
 from . import functions
-from . import parallel
+from .util import module_available
 import math
 
+# msgpack is only imported once MessagePack frames are used
+_msgpack_available = module_available('msgpack')
 
-import multiprocessing
 import threading
 
 __DEBUG = False
 
+# binary frames: a big-endian uint32 payload length followed by the payload,
+# whose first byte is one of the tags below
+_FRAME_HEADER = struct.Struct('>I')
+_TAG_JSON = b'j'
+_TAG_MSGPACK = b'm'
+_TAG_VALUES = b'v'
+_TAG_ARGUMENTS = b'a'
 
-__channel_in = sys.stdin
-__channel_out = sys.stdout
+
+def delta_encode(indices):
+    """Sorts given indices and encodes them as differences between consecutive
+    indices. The first index is kept as is.
+
+    >>> delta_encode([7, 2, 3, 10])
+    [2, 1, 4, 3]
+    >>> delta_decode([2, 1, 4, 3])
+    [2, 3, 7, 10]
+
+    """
+    indices = sorted(indices)
+    return indices[:1] + [b - a for a, b in zip(indices, indices[1:])]
+
+
+def delta_decode(deltas):
+    """Decodes indices encoded by :func:`delta_encode`."""
+    indices = []
+    current = 0
+    for delta in deltas:
+        current += delta
+        indices.append(current)
+    return indices
 
 
 def _find_replacement(key, kwargs):
@@ -97,62 +135,759 @@ def json_decode(data):
     return json.loads(data)
 
 
+def _is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def _pack_doubles(values):
+    """Packs a sequence of numbers as little-endian float64."""
+    packed = array.array('d', values)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    if hasattr(packed, 'tobytes'):
+        return packed.tobytes()
+    return packed.tostring()
+
+
+def _unpack_doubles(data):
+    """Unpacks little-endian float64 into a list of floats."""
+    unpacked = array.array('d')
+    if hasattr(unpacked, 'frombytes'):
+        unpacked.frombytes(data)
+    else:
+        unpacked.fromstring(data)
+    if sys.byteorder == 'big':
+        unpacked.byteswap()
+    return unpacked.tolist()
+
+
+def _argument_matrix(batch):
+    """Returns (keys, row-major values) if batch is a list of dicts with
+    identical keys and numeric values, None otherwise."""
+    if not batch or not all(isinstance(args, dict) for args in batch):
+        return None
+    keys = sorted(batch[0])
+    if not keys:
+        return None
+    values = []
+    for args in batch:
+        if len(args) != len(keys):
+            return None
+        try:
+            row = [args[key] for key in keys]
+        except KeyError:
+            return None
+        if not all(map(_is_number, row)):
+            return None
+        values.extend(row)
+    return keys, values
+
+
+def _msgpack():
+    """Imports and returns msgpack, which is only needed for MessagePack frames."""
+    if not _msgpack_available:
+        raise ImportError('MessagePack frames require msgpack but it is missing.')
+    import msgpack
+    return msgpack
+
+
+def encode_frame(data, encoding='json'):
+    """Encodes data as the payload of a binary frame.
+
+    :param data: the message to encode
+    :param encoding: encoding of generic messages, 'json' or 'msgpack'
+    :returns: the payload (tag byte followed by the body)
+
+    Batches of numeric arguments and numeric value vectors are packed
+    as float64, everything else is encoded generically.
+
+    >>> payload = encode_frame([{'x': 1, 'y': 2}, {'x': 3, 'y': 4}])
+    >>> payload[:1] == _TAG_ARGUMENTS
+    True
+    >>> decode_frame(payload)
+    [{'x': 1.0, 'y': 2.0}, {'x': 3.0, 'y': 4.0}]
+    >>> decode_frame(encode_frame({'values': [0.5, 1.5]}))
+    {'values': [0.5, 1.5]}
+    >>> decode_frame(encode_frame({'x': 'a'}))
+    {'x': 'a'}
+
+    """
+    if isinstance(data, list):
+        matrix = _argument_matrix(data)
+        if matrix is not None:
+            keys, values = matrix
+            header = json.dumps(keys).encode('utf-8')
+            return b''.join([_TAG_ARGUMENTS, _FRAME_HEADER.pack(len(header)),
+                             header, _pack_doubles(values)])
+    elif isinstance(data, dict) and list(data) == ['values'] \
+            and isinstance(data['values'], (list, tuple)) \
+            and all(map(_is_number, data['values'])):
+        return _TAG_VALUES + _pack_doubles(data['values'])
+
+    if encoding == 'msgpack':
+        return _TAG_MSGPACK + _msgpack().packb(data, use_bin_type=True)
+    return _TAG_JSON + json.dumps(data).encode('utf-8')
+
+
+def decode_frame(payload):
+    """Decodes the payload of a binary frame. Inverse of :func:`encode_frame`.
+
+    Packed value vectors are decoded to ``{'values': [...]}``, packed
+    argument matrices to a list of dictionaries.
+
+    """
+    tag, body = payload[:1], payload[1:]
+    if tag == _TAG_JSON:
+        return json.loads(body.decode('utf-8'))
+    elif tag == _TAG_MSGPACK:
+        return _msgpack().unpackb(body, raw=False)
+    elif tag == _TAG_VALUES:
+        return {'values': _unpack_doubles(body)}
+    elif tag == _TAG_ARGUMENTS:
+        size = _FRAME_HEADER.size
+        header_length = _FRAME_HEADER.unpack(body[:size])[0]
+        keys = json.loads(body[size:size + header_length].decode('utf-8'))
+        values = _unpack_doubles(body[size + header_length:])
+        num_keys = len(keys)
+        return [dict(zip(keys, values[idx:idx + num_keys]))
+                for idx in range(0, len(values), num_keys)]
+    raise ValueError('Unknown frame tag: ' + repr(tag))
+
+
+def _read_exactly(stream, size):
+    """Reads exactly size bytes from stream."""
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = stream.read(remaining)
+        if not chunk:
+            raise EOFError("Unexpected end of communication.")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+def _byte_stream(stream):
+    """Returns the underlying byte stream of a text stream, if any."""
+    return getattr(stream, 'buffer', stream)
+
+
+def _shm_directory():
+    """Returns the directory for shared memory files: /dev/shm if available."""
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+class SharedMemoryRing(object):
+    """A ring buffer in a memory-mapped file, used to hand bulk payloads
+    to a client on the same host without pushing them through a stream.
+
+    Payloads are written at increasing offsets and wrap around to the start
+    of the buffer when the end is reached. A payload is never overwritten
+    before it is released: writes that would overwrite it fail instead.
+
+    >>> ring = SharedMemoryRing(16)
+    >>> ring.write(b'0123456789')
+    0
+    >>> ring.write(b'abcdefghij') is None
+    True
+    >>> ring.release(0)
+    >>> ring.write(b'abcdefghij')
+    0
+    >>> ring.read(0, 4)
+    b'abcd'
+    >>> ring.write(b'x' * 17) is None
+    True
+    >>> ring.close()
+
+    """
+
+    def __init__(self, size=64 * 1024 * 1024):
+        """Creates a ring buffer of given size in bytes."""
+        fd, self._path = tempfile.mkstemp(prefix='optunity-', suffix='.shm',
+                                          dir=_shm_directory())
+        try:
+            os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        except Exception:
+            os.close(fd)
+            os.unlink(self._path)
+            raise
+        os.close(fd)
+        self._size = size
+        self._head = 0
+        # offset -> length of payloads that have not been released
+        self._live = {}
+
+    @property
+    def path(self):
+        """Path of the memory-mapped file."""
+        return self._path
+
+    @property
+    def size(self):
+        """Size of the buffer in bytes."""
+        return self._size
+
+    @property
+    def live(self):
+        """Number of payloads that have not been released."""
+        return len(self._live)
+
+    def write(self, data):
+        """Writes data to the buffer and returns its offset, or None if
+        there is no room without overwriting a payload that was not released."""
+        length = len(data)
+        if length > self._size:
+            return None
+        offset = self._head
+        if offset + length > self._size:
+            offset = 0
+        if any(offset < start + size and start < offset + length
+               for start, size in self._live.items()):
+            return None
+        self._map[offset:offset + length] = data
+        self._live[offset] = length
+        self._head = offset + length
+        return offset
+
+    def release(self, offset):
+        """Releases the payload at offset, after which it may be overwritten."""
+        self._live.pop(offset, None)
+
+    def read(self, offset, length):
+        """Reads length bytes starting at offset."""
+        return self._map[offset:offset + length]
+
+    def close(self):
+        """Unmaps the buffer and removes its file."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+            os.unlink(self._path)
+
+    def __del__(self):
+        if getattr(self, '_map', None) is not None:
+            self.close()
+
+
+def read_shm_payload(reference):
+    """Reads a payload described by ``{'path': ..., 'offset': ..., 'length': ...}``.
+
+    Only regular files named ``optunity-*`` in the shared memory directory
+    (see :func:`_shm_directory`) are accepted and the payload must lie
+    within the file, so a peer cannot make us read arbitrary files.
+
+    >>> ring = SharedMemoryRing(16)
+    >>> offset = ring.write(b'payload')
+    >>> read_shm_payload({'path': ring.path, 'offset': offset, 'length': 7})
+    b'payload'
+    >>> read_shm_payload({'path': ring.path, 'offset': 10, 'length': 7})
+    Traceback (most recent call last):
+    ...
+    ValueError: Shared memory payload exceeds its file.
+    >>> ring.close()
+    >>> read_shm_payload({'path': '/etc/passwd', 'offset': 0, 'length': 1}) # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    ValueError: Shared memory payloads must be files named optunity-* in ...
+
+    """
+    directory = os.path.realpath(_shm_directory())
+    path = os.path.realpath(str(reference['path']))
+    if os.path.dirname(path) != directory \
+            or not os.path.basename(path).startswith('optunity-'):
+        raise ValueError('Shared memory payloads must be files named optunity-* in '
+                         + directory)
+
+    offset, length = reference['offset'], reference['length']
+    if not all(isinstance(x, numbers.Integral) and not isinstance(x, bool)
+               and x >= 0 for x in (offset, length)):
+        raise ValueError('Invalid shared memory payload offset or length.')
+
+    # no symlinks (the path was resolved above) and don't block on fifos
+    flags = os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0) | getattr(os, 'O_NONBLOCK', 0)
+    with os.fdopen(os.open(path, flags), 'rb') as f:
+        info = os.fstat(f.fileno())
+        if not stat.S_ISREG(info.st_mode):
+            raise ValueError('Shared memory payloads must be regular files.')
+        if offset + length > info.st_size:
+            raise ValueError('Shared memory payload exceeds its file.')
+        f.seek(offset)
+        payload = f.read(length)
+    if len(payload) != length:
+        raise EOFError("Incomplete shared memory payload.")
+    return payload
+
+
+class Channel(object):
+    """A connection with the external environment.
+
+    Channels start in text mode, exchanging newline-delimited JSON messages.
+    :meth:`enable_binary` switches to length-prefixed binary frames.
+    The underlying streams are always byte streams, so switching modes
+    never loses buffered data. Text written to an output text stream is
+    flushed before every message, so it precedes the message:
+
+    >>> import io
+    >>> out = io.BytesIO()
+    >>> text = io.TextIOWrapper(out, write_through=False)
+    >>> channel = Channel(io.BytesIO(), text)
+    >>> _ = text.write('log\\n')
+    >>> channel.send('{}')
+    >>> out.getvalue()
+    b'log\\n{}\\n'
+
+    """
+
+    def __init__(self, channel_in, channel_out, sock=None):
+        """Constructs a Channel.
+
+        :param channel_in: stream to read from
+        :param channel_out: stream to write to
+        :param sock: the socket both streams belong to, if any
+
+        """
+        self._in = _byte_stream(channel_in)
+        self._out = _byte_stream(channel_out)
+        # text still buffered in a text stream must precede our bytes
+        self._text_out = None if self._out is channel_out else channel_out
+        self._socket = sock
+        self._encoding = None
+        self._ring = None
+        self._shm_threshold = None
+
+    @property
+    def socket(self):
+        """The socket of this channel, or None."""
+        return self._socket
+
+    @property
+    def encoding(self):
+        """Encoding of generic binary frames, or None in text mode."""
+        return self._encoding
+
+    @property
+    def binary(self):
+        """Whether this channel uses binary frames."""
+        return self._encoding is not None
+
+    def enable_binary(self, encoding='json'):
+        """Switches to binary frames.
+
+        :param encoding: encoding of generic messages, 'json' or 'msgpack'
+
+        """
+        if encoding not in ('json', 'msgpack'):
+            raise ValueError('Unknown binary encoding: ' + str(encoding))
+        if encoding == 'msgpack' and not _msgpack_available:
+            raise ValueError('MessagePack encoding requires msgpack.')
+        self._encoding = encoding
+
+    @property
+    def shm(self):
+        """The shared memory ring for bulk payloads, or None."""
+        return self._ring
+
+    def enable_shm(self, size=64 * 1024 * 1024, threshold=64 * 1024):
+        """Sends messages larger than threshold bytes through a shared memory ring
+        and accepts shared memory payloads from the other side.
+
+        :param size: size of the ring buffer in bytes
+        :type size: int
+        :param threshold: minimum size of messages to send through shared memory
+        :type threshold: int
+
+        """
+        self.disable_shm()
+        self._ring = SharedMemoryRing(size)
+        self._shm_threshold = threshold
+
+    def disable_shm(self):
+        """Stops using shared memory and removes the ring buffer, if any."""
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+
+    def release_shm(self, offset):
+        """Releases a payload sent through shared memory once the other side read it.
+
+        :param offset: the offset returned by :meth:`send_message`, or None
+
+        """
+        if self._ring is not None and offset is not None:
+            self._ring.release(offset)
+
+    def write_frame(self, payload):
+        """Writes a frame with given payload and flushes."""
+        self._flush_text()
+        self._out.write(_FRAME_HEADER.pack(len(payload)))
+        self._out.write(payload)
+        self._out.flush()
+
+    def _flush_text(self):
+        if self._text_out is not None:
+            self._text_out.flush()
+
+    def read_frame(self):
+        """Reads a frame and returns its payload."""
+        header = _read_exactly(self._in, _FRAME_HEADER.size)
+        return _read_exactly(self._in, _FRAME_HEADER.unpack(header)[0])
+
+    def _write(self, payload):
+        """Writes an encoded message and flushes."""
+        if self.binary:
+            self.write_frame(payload)
+        else:
+            self._flush_text()
+            self._out.write(payload + b'\n')
+            self._out.flush()
+
+    def _encode(self, data):
+        if self.binary:
+            return encode_frame(data, self.encoding)
+        return json_encode(data).encode('utf-8')
+
+    def _decode(self, payload):
+        if self.binary:
+            return decode_frame(payload)
+        return json_decode(payload.decode('utf-8'))
+
+    def send(self, data):
+        """Writes a JSON string to channel and flushes."""
+        if self.binary:
+            self.write_frame(_TAG_JSON + data.encode('utf-8'))
+        else:
+            self._write(data.encode('utf-8'))
+
+    def receive(self):
+        """Reads a JSON string from channel."""
+        if self.binary:
+            return json_encode(self.receive_message())
+        line = self._in.readline()
+        if line.endswith(b'\n'):
+            line = line[:-1]
+        if not line:
+            raise EOFError("Unexpected end of communication.")
+        return line.decode('utf-8')
+
+    def send_message(self, data, inline=False):
+        """Encodes data and sends it.
+
+        :param data: the message
+        :param inline: always send the message itself, e.g. when the ring buffer
+            may be removed before the other side reads it
+        :type inline: bool
+
+        With shared memory enabled, large messages are written to the ring buffer
+        and only a ``{"shm_payload": {"path": ..., "offset": ..., "length": ...}}``
+        reference is sent. The offset of such a payload is returned (None for
+        messages sent inline) and it occupies the ring buffer until it is
+        released via :meth:`release_shm`. Messages are sent inline while the
+        ring buffer is full.
+
+        """
+        payload = self._encode(data)
+        offset = None
+        if self._ring is not None and not inline \
+                and len(payload) > self._shm_threshold:
+            offset = self._ring.write(payload)
+            if offset is not None:
+                payload = self._encode({'shm_payload': {'path': self._ring.path,
+                                                        'offset': offset,
+                                                        'length': len(payload)}})
+        self._write(payload)
+        return offset
+
+    def receive_message(self):
+        """Receives a message and returns its decoded data."""
+        if self.binary:
+            data = decode_frame(self.read_frame())
+        else:
+            data = json_decode(self.receive())
+        if self._ring is not None and isinstance(data, dict) \
+                and list(data) == ['shm_payload']:
+            data = self._decode(read_shm_payload(data['shm_payload']))
+        return data
+
+    def close(self):
+        """Closes the streams and socket of this channel."""
+        self.disable_shm()
+        for stream in (self._in, self._out):
+            try:
+                stream.close()
+            except (IOError, OSError):
+                pass
+        if self._socket is not None:
+            self._socket.close()
+
+
+__channel = Channel(sys.stdin, sys.stdout)
+
+# sessions of a daemon each use their own channel
+_session = threading.local()
+
+
+def channel():
+    """Returns the channel of the current session."""
+    return getattr(_session, 'channel', None) or __channel
+
+
+def use_channel(session_channel):
+    """Uses given channel for all communication in the calling thread.
+
+    :param session_channel: the channel, or None to revert to the default channel
+    :type session_channel: Channel
+
+    """
+    _session.channel = session_channel
+
+
+def _set_channel(sock):
+    global __channel
+    __channel = Channel(sock.makefile('rb'), sock.makefile('wb'), sock)
+
+
 def send(data):
     """Writes data to channel and flushes."""
-    print(data, file=__channel_out)
-    __channel_out.flush()
+    channel().send(data)
 
 
 def receive():
     """Reads data from channel."""
-    line = __channel_in.readline()[:-1]
-    if not line:
-        raise EOFError("Unexpected end of communication.")
-    return line
+    return channel().receive()
+
+
+def send_message(data, inline=False):
+    """Encodes data and sends it through the channel, see :meth:`Channel.send_message`."""
+    return channel().send_message(data, inline)
+
+
+def release_shm(offset):
+    """Releases a shared memory payload, see :meth:`Channel.release_shm`."""
+    channel().release_shm(offset)
+
+
+def receive_message():
+    """Receives a message from the channel and decodes it."""
+    return channel().receive_message()
+
+
+def send_stream(name, header, chunks, inline=False):
+    """Sends a streamed message: the header, every chunk as a separate message
+    and finally ``{"end_stream": name}``.
+
+    :param name: name of the stream
+    :type name: str
+    :param header: first message of the stream
+    :type header: dict
+    :param chunks: messages to send after the header
+    :type chunks: iterable
+    :param inline: never send messages through shared memory
+    :type inline: bool
+
+    Chunks are encoded and sent one at a time, so they can be generated lazily.
+
+    """
+    send_message(header, inline)
+    for chunk in chunks:
+        send_message(chunk, inline)
+    send_message({'end_stream': name}, inline)
+
+
+def enable_binary(encoding='json'):
+    """Switches the channel to binary frames, see :meth:`Channel.enable_binary`."""
+    channel().enable_binary(encoding)
+
+
+def enable_shm(**kwargs):
+    """Enables shared memory payloads on the channel, see :meth:`Channel.enable_shm`."""
+    channel().enable_shm(**kwargs)
+
+
+def _unix_address(address):
+    """Returns the path of a ``unix:<path>`` address, or None for other addresses."""
+    address = str(address)
+    if address.startswith('unix:'):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ValueError('Unix domain sockets are not supported on this platform.')
+        return address[len('unix:'):]
+    return None
+
+
+def _bind_unix(path):
+    """Returns a Unix domain socket bound to path."""
+    serv_sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # remove a stale socket from an earlier server
+    if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+        os.unlink(path)
+    serv_sock.bind(path)
+    return serv_sock
 
 
 def open_socket(port, host='localhost'):
-    """Opens a socket to host:port and reconfigures internal channels."""
-    global __channel_in
-    global __channel_out
+    """Opens a socket to host:port and reconfigures internal channels.
+
+    If port is of the form ``unix:<path>``, a Unix domain socket is used instead.
+
+    """
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.bind(('', 0))
-        sock.connect((host, port))
-        __channel_in = sock.makefile('r')
-        __channel_out = sock.makefile('w')
+        path = _unix_address(port)
+        if path is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.bind(('', 0))
+            sock.connect((host, port))
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(path)
+        _set_channel(sock)
     except (socket.error, OverflowError, ValueError) as e:
         print('Error making socket: ' + str(e), file=sys.stderr)
         sys.exit(1)
 
 
-def open_server_socket():
-    serv_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+def open_server_socket(address=None):
+    """Opens a socket to listen for a single session.
+
+    :param address: ``unix:<path>`` to listen on a Unix domain socket,
+        None to listen on an arbitrary free TCP port
+    :returns: the port (or address) that is being listened on and the server socket
+
+    """
     try:
-        serv_sock.bind(('', 0))
-    except socket.err as msg:
-        print('Bind failed. Error Code : ' + str(msg[0]) + ' Message ' + msg[1])
-        sys.exit()
+        path = _unix_address(address) if address else None
+        if path is None:
+            serv_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            serv_sock.bind(('', 0))
+        else:
+            serv_sock = _bind_unix(path)
+    except (socket.error, ValueError) as msg:
+        print('Bind failed: ' + str(msg), file=sys.stderr)
+        sys.exit(1)
     serv_sock.listen(0)
-    port = serv_sock.getsockname()[1]
-    return port, serv_sock
+    if path is None:
+        return serv_sock.getsockname()[1], serv_sock
+    return address, serv_sock
+
+
+def open_daemon_socket(address='0', host='localhost'):
+    """Opens a socket to listen for daemon sessions.
+
+    :param address: TCP port (0 for an arbitrary free port) or ``unix:<path>``
+        for a Unix domain socket
+    :type address: str
+    :param host: the host to bind to for TCP
+    :type host: str
+    :returns: the address that is being listened on and the server socket
+
+    """
+    path = _unix_address(address)
+    if path is None:
+        serv_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        serv_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        serv_sock.bind((host, int(address)))
+        address = str(serv_sock.getsockname()[1])
+    else:
+        serv_sock = _bind_unix(path)
+    serv_sock.listen(socket.SOMAXCONN)
+    return address, serv_sock
+
+
+def accept_session(server_socket):
+    """Accepts a connection on a daemon socket and returns its channel."""
+    sock, _ = server_socket.accept()
+    return Channel(sock.makefile('rb'), sock.makefile('wb'), sock)
 
 
 def accept_server_connection(server_socket):
-    global __channel_in
-    global __channel_out
     try:
         sock, _ = server_socket.accept()
-        __channel_in = sock.makefile('r')
-        __channel_out = sock.makefile('w')
+        _set_channel(sock)
+        if getattr(socket, 'AF_UNIX', None) == server_socket.family:
+            # the socket file is no longer needed once connected
+            os.unlink(server_socket.getsockname())
+            server_socket.close()
     except (socket.error, OverflowError, ValueError) as e:
         print('Error making socket: ' + str(e), file=sys.stderr)
         sys.exit(1)
 
 
+class _Pending(object):
+    """Placeholder for the value of an evaluation that is queued in a vector request.
+
+    Negation and arithmetic with constants are deferred until the value is known.
+
+    >>> p = 2 - (-_Pending(1))
+    >>> p.resolve([5.0, 3.0])
+    5.0
+
+    """
+    __slots__ = ('index', 'transforms')
+
+    def __init__(self, index, transforms=()):
+        self.index = index
+        self.transforms = transforms
+
+    def resolve(self, values):
+        """Returns the value of this evaluation, given all values of the vector request."""
+        value = values[self.index]
+        for transform in self.transforms:
+            value = transform(value)
+        return value
+
+    def _defer(self, transform):
+        return _Pending(self.index, self.transforms + (transform,))
+
+    def __neg__(self):
+        return self._defer(operator.neg)
+
+    def __pos__(self):
+        return self
+
+    def __add__(self, other):
+        return self._defer(lambda value: value + other)
+
+    def __radd__(self, other):
+        return self._defer(lambda value: other + value)
+
+    def __sub__(self, other):
+        return self._defer(lambda value: value - other)
+
+    def __rsub__(self, other):
+        return self._defer(lambda value: other - value)
+
+    def __mul__(self, other):
+        return self._defer(lambda value: value * other)
+
+    def __rmul__(self, other):
+        return self._defer(lambda value: other * value)
+
+    def __repr__(self):
+        return '<pending evaluation ' + str(self.index) + '>'
+
+
+def _resolve(result, values):
+    """Replaces placeholders in result (possibly nested in lists or tuples) by their values."""
+    if isinstance(result, _Pending):
+        return result.resolve(values)
+    elif type(result) in (list, tuple):
+        return type(result)(_resolve(x, values) for x in result)
+    return result
+
+
+def _pending_indices(result):
+    """Returns the set of queue indices result depends on."""
+    if isinstance(result, _Pending):
+        return set([result.index])
+    elif type(result) in (list, tuple):
+        return set(itertools.chain.from_iterable(map(_pending_indices, result)))
+    return set()
+
+
 class EvalManager(object):
 
-    def __init__(self, max_vectorized=100, replacements={}):
+    def __init__(self, max_vectorized=100, replacements={}, pipeline=0):
         """Constructs an EvalManager object.
 
         :param max_vectorized: the maximum size of a vector evaluation
@@ -160,6 +895,9 @@ class EvalManager(object):
         :type max_vectorized: int
         :param replacements: a mapping of `original:replacement` keyword names
         :type replacements: dict
+        :param pipeline: maximum number of outstanding evaluation requests,
+            0 to disable pipelining
+        :type pipeline: int
 
         """
         # are we doing a parallel function evaluation?
@@ -169,21 +907,13 @@ class EvalManager(object):
         # the queue used for parallel evaluations
         self._queue = None
 
-        # lock to use to add evaluations to the queue
-        self._queue_lock = multiprocessing.Lock()
-
-        # lock to get results
-        self._result_lock = multiprocessing.Lock()
-
-        # used to check whether Future started running
-        self._semaphore = None
-
-        # used to signal Future's to get their result
-        self._processed_semaphore = None
-
         # keys that must be replaced
         self._replacements = dict((v, k) for k, v in replacements.items())
 
+        # pipelined requests are tagged with unique ids
+        self._pipeline = pipeline
+        self._request_ids = itertools.count()
+
 
     @property
     def replacements(self):
@@ -196,16 +926,13 @@ class EvalManager(object):
         return self._max_vectorized
 
     @property
-    def cv(self):
-        return self._cv
+    def pipeline(self):
+        """Maximum number of outstanding evaluation requests (0 if not pipelined)."""
+        return self._pipeline
 
     @property
-    def semaphore(self):
-        return self._semaphore
-
-    @property
-    def processed_semaphore(self):
-        return self._processed_semaphore
+    def cv(self):
+        return self._cv
 
     def pmap(self, f, *args):
         """Performs vector evaluations through pipes.
@@ -215,10 +942,14 @@ class EvalManager(object):
         :param args: function arguments
         :type args: iterables
 
-        The vector evaluation is sent in chunks of size self.max_vectorized.
+        The vector evaluation is sent in chunks of size self.max_vectorized,
+        unless requests are pipelined.
 
         """
-        argslist = zip(*args)
+        if self.pipeline:
+            return self._vector_eval(f, *args)
+
+        argslist = list(zip(*args))
         results = []
 
         # partition the vector evaluation in chunks <= self.max_vectorized
@@ -229,66 +960,145 @@ class EvalManager(object):
         return results
 
     def _vector_eval(self, f, *args):
+        results = dict(self.imap_unordered(f, *args))
+        return [results[idx] for idx in range(len(results))]
+
+    def _enqueue(self, f, *args):
+        """Calls f for all arguments while vectorized, which queues the
+        evaluations and returns placeholders for their values."""
         self._queue = []
         self._vectorized = True
-        self._semaphore = multiprocessing.Semaphore(0)
-        self._processed_semaphore = multiprocessing.Semaphore(0)
-
-        # make sure correct evaluations lead to counter increments
-        def wrap(*args):
-            result = f(*args)
-            # signal mgr to add next future
-            self.semaphore.release()
-            return result
-
-        # create list of futures
-        futures = []
-        for ar in zip(*args):
-            futures.append(parallel.Future(wrap, *ar))
-            try:
-                self.semaphore.acquire()
-            except functions.MaximumEvaluationsException:
-                if not len(self.queue):
-                    # FIXME: some threads may be running atm
-                    raise
-                break
-
-        # process queue
-        self.flush_queue()
-
-        # notify all waiting futures
-        for _ in range(len(self.queue)):
-            self.processed_semaphore.release()
-
-        # gather results
-        results = [f() for f in futures]
-        for f in futures:
-            f.join()
-        return results
+        results = []
+        try:
+            for ar in zip(*args):
+                try:
+                    results.append(f(*ar))
+                except functions.MaximumEvaluationsException:
+                    if not len(self.queue):
+                        raise
+                    break
+        finally:
+            self._vectorized = False
+        return self._queue, results
+
+    def imap_unordered(self, f, *args):
+        """Evaluates f for all arguments and yields ``(index, result)`` pairs
+        as soon as results are available.
+
+        :param f: the objective function (piped_function_eval)
+        :type f: callable
+        :param args: function arguments
+        :type args: iterables
+
+        All evaluations are queued first, placeholder values are resolved
+        as replies arrive, both in the results and in the call log of f.
+        With pipelining, replies may arrive in any order. If the maximum number
+        of evaluations is reached, only the first results are yielded.
+
+        """
+        call_log = getattr(f, 'call_log', None)
+        queue, results = self._enqueue(f, *args)
+
+        # call log entries waiting for each queued evaluation
+        log_keys = collections.defaultdict(list)
+        if call_log is not None:
+            for key, value in list(call_log.items()):
+                if isinstance(value, _Pending):
+                    log_keys[value.index].append((key, value))
+
+        # results waiting for each queued evaluation
+        missing = [_pending_indices(result) for result in results]
+        waiting = collections.defaultdict(list)
+        for idx, indices in enumerate(missing):
+            for queue_idx in indices:
+                waiting[queue_idx].append(idx)
+
+        values = {}
+        evaluations = self._evaluate_queue(queue)
+        try:
+            for idx, indices in enumerate(missing):
+                if not indices:
+                    yield idx, results[idx]
+
+            for queue_idx, value in evaluations:
+                values[queue_idx] = value
+                for key, pending in log_keys.pop(queue_idx, []):
+                    call_log[key] = pending.resolve(values)
+                for idx in waiting.pop(queue_idx, []):
+                    missing[idx].discard(queue_idx)
+                    if not missing[idx]:
+                        yield idx, _resolve(results[idx], values)
+        finally:
+            evaluations.close()
+            # placeholders must not outlive an incomplete request
+            for entries in log_keys.values():
+                for key, _ in entries:
+                    del call_log.data[key]
+
+    def _evaluate_queue(self, queue):
+        """Sends queued evaluations and yields ``(queue index, value)`` pairs."""
+        if not queue:
+            return
+        if not self.pipeline:
+            for item in enumerate(self._request(queue)['values']):
+                yield item
+            return
+
+        outstanding = {}
+        remaining = iter(enumerate(queue))
+        try:
+            while True:
+                for queue_idx, kwargs in remaining:
+                    request_id = next(self._request_ids)
+                    offset = send_message({'id': request_id, 'evaluate': kwargs})
+                    outstanding[request_id] = queue_idx, offset
+                    if len(outstanding) >= self.pipeline:
+                        break
+                if not outstanding:
+                    break
+                reply = self._receive_reply()
+                queue_idx, offset = outstanding.pop(reply['id'])
+                release_shm(offset)
+                yield queue_idx, reply['value']
+        except GeneratorExit:
+            # keep the protocol in sync for subsequent requests
+            while outstanding:
+                release_shm(outstanding.pop(self._receive_reply()['id'])[1])
+            raise
+
+    def _request(self, data):
+        """Sends a request and returns the reply."""
+        offset = send_message(data)
+        reply = self._receive_reply()
+        # the client read the request before replying to it
+        release_shm(offset)
+        return reply
+
+    def _receive_reply(self):
+        decoded = receive_message()
+        if decoded.get('error', False):  # TODO: allow error handling higher up?
+            print('ERROR: ' + decoded['error'], file=sys.stderr)
+            sys.exit(1)
+        return decoded
 
     def pipe_eval(self, **kwargs):
         # fix python keywords back to original
         kwargs = _replace_keys(kwargs, self.replacements)
 
-        json_data = json_encode(kwargs)
-        send(json_data)
+        if self.pipeline:
+            return next(self._evaluate_queue([kwargs]))[1]
 
-        json_reply = receive()
-        decoded = json_decode(json_reply)
-        if decoded.get('error', False):  # TODO: allow error handling higher up?
-            sys.stderr('ERROR: ' + decoded['error'])
-            sys.exit(1)
-        return decoded['value']
+        decoded = self._request(kwargs)
+        if 'value' in decoded:
+            return decoded['value']
+        # binary clients may reply with a packed vector of length 1
+        return decoded['values'][0]
 
     def add_to_queue(self, **kwargs):
+        """Queues an evaluation and returns its index in the vector request."""
         kwargs = _replace_keys(kwargs, self.replacements)
-        try:
-            self.queue_lock.acquire()
-            self.queue.append(kwargs)
-            idx = len(self.queue) - 1
-        finally:
-            self.queue_lock.release()
-        return idx
+        self.queue.append(kwargs)
+        return len(self.queue) - 1
 
     @property
     def vectorized(self):
@@ -298,30 +1108,153 @@ class EvalManager(object):
     def queue(self):
         return self._queue
 
+    def worker_pool(self, f, number_of_processes=None):
+        """Returns a pool that evaluates f through pipelined requests,
+        see :class:`_PipelinedPool`. Requires pipelining."""
+        if not self.pipeline:
+            raise ValueError('Asynchronous evaluations require pipelined requests.')
+        return _PipelinedPool(self, f, number_of_processes)
+
+
+class _PipelinedPool(object):
+    """Evaluates a function through pipelined evaluation requests, with the
+    interface of :class:`optunity.parallel.WorkerPool`.
+
+    Every submitted evaluation is requested immediately and results are
+    retrieved in the order in which replies arrive, so asynchronous solvers
+    can submit new evaluations while others are still outstanding.
+    The call log of the function is updated as replies arrive.
+
+    >>> import io
+    >>> out = io.BytesIO()
+    >>> use_channel(Channel(io.BytesIO(b'{"id": 1, "value": 4}\\n{"id": 0, "value": 1}\\n'), out))
+    >>> mgr = EvalManager(pipeline=2)
+    >>> f = functions.logged(make_piped_function(mgr))
+    >>> g = lambda x: f(x=x)
+    >>> g.call_log = f.call_log
+    >>> with mgr.worker_pool(g) as pool:
+    ...     jobs = [pool.submit(x) for x in [1, 2]]
+    ...     results = [pool.result() for _ in jobs]
+    >>> results
+    [(1, 4), (0, 1)]
+    >>> out.getvalue().decode('utf-8').splitlines()
+    ['{"id": 0, "evaluate": {"x": 1}}', '{"id": 1, "evaluate": {"x": 2}}']
+    >>> [value for value in f.call_log.values()]
+    [1, 4]
+    >>> use_channel(None)
+
+    """
+
+    def __init__(self, mgr, f, number_of_processes=None):
+        """Constructs a pool.
+
+        :param mgr: the EvalManager to send requests with
+        :type mgr: EvalManager
+        :param f: the objective function, based on a piped function
+        :param number_of_processes: maximum number of outstanding requests,
+            at most (and by default) the pipeline size of mgr
+        :type number_of_processes: int or None
+
+        """
+        self._mgr = mgr
+        self._f = f
+        self._call_log = getattr(f, 'call_log', None)
+        self._nprocs = min(number_of_processes or mgr.pipeline, mgr.pipeline)
+        self._num_submitted = 0
+        # request id -> (evaluation id, placeholder result, call log key, shm offset)
+        self._outstanding = {}
+        # evaluations that required no request, e.g. because of constraints
+        self._done = collections.deque()
+
     @property
-    def queue_lock(self):
-        return self._queue_lock
+    def number_of_processes(self):
+        """The maximum number of outstanding requests."""
+        return self._nprocs
 
-    def get(self, number):
+    @property
+    def pending(self):
+        """The number of submitted evaluations whose result has not been retrieved."""
+        return len(self._outstanding) + len(self._done)
+
+    def submit(self, *args):
+        """Submits the evaluation of ``f(*args)``.
+
+        :returns: the identifier of this evaluation, as returned by :func:`result`
+        """
+        if self._outstanding is None:
+            raise ValueError('Pool is closed.')
+        queue, results = self._mgr._enqueue(self._f, *[[arg] for arg in args])
+        i = self._num_submitted
+        self._num_submitted += 1
+        if not queue:
+            self._done.append((i, results[0]))
+            return i
+
+        # the placeholder of this evaluation is the last entry of the call log
+        key = None
+        if self._call_log is not None and len(self._call_log):
+            last = next(reversed(self._call_log.data))
+            if isinstance(self._call_log.data[last], _Pending) and not \
+                    any(last == entry[2] for entry in self._outstanding.values()):
+                key = last
+
+        request_id = next(self._mgr._request_ids)
+        offset = send_message({'id': request_id, 'evaluate': queue[0]})
+        self._outstanding[request_id] = (i, results[0], key, offset)
+        return i
+
+    def result(self):
+        """Waits for the next evaluation to finish.
+
+        :returns: the identifier of the evaluation and its result
+        """
+        if self._done:
+            return self._done.popleft()
+        if not self._outstanding:
+            raise ValueError('No evaluations are pending.')
+        reply = self._mgr._receive_reply()
+        i, result, key, offset = self._outstanding.pop(reply['id'])
+        release_shm(offset)
+        values = {0: reply['value']}
+        if key is not None:
+            self._call_log[key] = self._call_log[key].resolve(values)
+        return i, _resolve(result, values)
+
+    def close(self):
+        """Waits for outstanding requests, which keeps the protocol in sync."""
+        if self._outstanding is None:
+            return
         try:
-            self._result_lock.acquire()
-            value = self._results[number]
+            while self._outstanding:
+                self.result()
         finally:
-            self._result_lock.release()
-        return value
+            # placeholders must not outlive an incomplete request
+            for _, _, key, _ in self._outstanding.values():
+                if key is not None:
+                    del self._call_log.data[key]
+            self._outstanding = None
+            self._done.clear()
 
-    def flush_queue(self):
-        self._results = []
-        if self._queue:
-            json_data = json_encode(self.queue)
-            send(json_data)
+    def __enter__(self):
+        return self
 
-            json_reply = receive()
-            decoded = json_decode(json_reply)
-            if decoded.get('error', False):
-                sys.stderr('ERROR: ' + decoded['error'])
-                sys.exit(1)
-            self._results = decoded['values']
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def make_pmap(mgr):
+    """Returns a pmap function that evaluates through mgr.
+
+    With pipelining, the function also offers asynchronous evaluations via
+    its ``worker_pool`` attribute (see :meth:`EvalManager.worker_pool`),
+    which solvers use instead of :class:`optunity.parallel.WorkerPool`.
+
+    """
+    def pmap(f, *args):
+        return mgr.pmap(f, *args)
+    if mgr.pipeline:
+        pmap.worker_pool = mgr.worker_pool
+    return pmap
 
 
 def make_piped_function(mgr):
@@ -330,14 +1263,8 @@ def make_piped_function(mgr):
 
         args must be a namedtuple."""
         if mgr.vectorized:
-            # add to mgr queue
-            number = mgr.add_to_queue(**kwargs)
-            # signal mgr to continue
-            mgr.semaphore.release()
-
-            # wait for results
-            mgr.processed_semaphore.acquire()
-            return mgr.get(number)
+            # the value is known once mgr sends the vector request
+            return _Pending(mgr.add_to_queue(**kwargs))
         else:
             return mgr.pipe_eval(**kwargs)
     return piped_function_eval
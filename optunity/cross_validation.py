@@ -35,12 +35,16 @@
 The main functions in this module are:
 
 * :func:`cross_validated`
+* :func:`nested_cross_validation`
 * :func:`generate_folds`
 * :func:`strata_by_labels`
 * :func:`random_permutation`
 * :func:`mean`
 * :func:`identity`
 * :func:`list_mean`
+* :class:`FoldRacing`
+* :class:`WarmStartStore`
+* :class:`KernelCache`
 
 .. moduleauthor:: Marc Claesen
 
@@ -53,17 +57,32 @@ import functools
 import operator as op
 import array
 import inspect
+import threading
+import collections
+import numbers
+import sys
+
+from . import parallel
+from . import functions
+from .util import DocumentedNamedTuple as DocTup
 
 
 __all__ = ['select', 'random_permutation', 'cross_validated',
            'generate_folds', 'strata_by_labels', 'mean', 'identity',
-           'list_mean', 'mean_and_list']
+           'list_mean', 'mean_and_list', 'FoldRacing',
+           'nested_cross_validation', 'WarmStartStore', 'FoldState',
+           'KernelCache']
 
-_spark_available = True
 try:
-    import pyspark
-except ImportError:
-    _spark_available = False
+    _getargspec = inspect.getfullargspec
+except AttributeError:  # Python 2
+    _getargspec = inspect.getargspec
+
+
+def _is_rdd(collection):
+    # collection can only be an RDD if PySpark was imported, so never import it here
+    rdd = getattr(sys.modules.get('pyspark'), 'rdd', None)
+    return rdd is not None and isinstance(collection, rdd.RDD)
 
 
 def select(collection, indices):
@@ -78,7 +97,7 @@ def select(collection, indices):
     except IndexError: # caused by scipy.sparse in some versions
         return collection[indices, :]
     except TypeError: # not dealing with numpy or comparable, probably a list
-        if _spark_available and isinstance(collection, pyspark.rdd.RDD):
+        if _is_rdd(collection):
             indexset = set(indices)
             return collection.zipWithIndex().filter(lambda x: x[1] in indexset).map(lambda x: x[0])
         return [collection[i] for i in indices]
@@ -272,6 +291,488 @@ def list_mean(list_of_measures):
 def identity(x):
     return x
 
+
+class WarmStartStore(object):
+    """Bounded store of objects (e.g. fitted models or kernel matrices) per
+    cross-validation fold and hyperparameter tuple, to warm start training
+    from the results of nearby hyperparameters.
+
+    :param max_size: maximum number of stored objects (default 100),
+        the least recently used objects are evicted first
+
+    Pass a store to :func:`cross_validated` via ``warm_start``. The objective
+    then receives a :class:`FoldState` as its ``state`` argument.
+
+    >>> store = WarmStartStore(max_size=2)
+    >>> store.put((0, 0), {'C': 1.0}, 'model C=1')
+    >>> store.put((0, 0), {'C': 4.0}, 'model C=4')
+    >>> store.nearest((0, 0), {'C': 2.0})
+    ({'C': 1.0}, 'model C=1')
+    >>> store.put((0, 1), {'C': 1.0}, 'other fold')
+    >>> len(store)
+    2
+    >>> store.get((0, 0), {'C': 1.0}) is None
+    True
+
+    """
+
+    def __init__(self, max_size=100):
+        assert max_size > 0, 'max_size must be positive.'
+        self._max_size = max_size
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self): return self._max_size
+
+    def __len__(self): return len(self._data)
+
+    def put(self, fold, hyperparameters, obj):
+        """Stores ``obj`` for given fold and hyperparameters.
+
+        :param fold: fold identifier, e.g. (iteration, fold index)
+        :param hyperparameters: dict of hyperparameter values
+        :param obj: the object to store
+
+        """
+        key = (fold, functions.Args(**hyperparameters))
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = obj
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def get(self, fold, hyperparameters):
+        """Returns the object stored for given fold and hyperparameters, or None."""
+        key = (fold, functions.Args(**hyperparameters))
+        with self._lock:
+            obj = self._data.pop(key, None)
+            if obj is not None:
+                self._data[key] = obj
+        return obj
+
+    def nearest(self, fold, hyperparameters):
+        """Returns the object stored for given fold whose hyperparameters are nearest
+        to ``hyperparameters`` (Euclidean distance over numeric hyperparameters,
+        other hyperparameters must be identical).
+
+        :returns: a tuple (hyperparameters, object) or None if no candidate exists
+
+        """
+        best, best_dist = None, None
+        with self._lock:
+            for (key_fold, args), obj in self._data.items():
+                if key_fold != fold:
+                    continue
+                candidate = args._asdict()
+                dist = WarmStartStore._distance(hyperparameters, candidate)
+                if dist is not None and (best_dist is None or dist < best_dist):
+                    best, best_dist = (candidate, obj), dist
+        return best
+
+    @staticmethod
+    def _distance(a, b):
+        if set(a.keys()) != set(b.keys()):
+            return None
+        dist = 0.0
+        for k, v in a.items():
+            w = b[k]
+            if isinstance(v, numbers.Number) and isinstance(w, numbers.Number):
+                dist += (float(v) - float(w)) ** 2
+            elif v != w:
+                return None
+        return dist
+
+
+class FoldState(object):
+    """Warm-start state of a single fold, passed to objective functions as ``state``
+    when :func:`cross_validated` is used with a :class:`WarmStartStore`.
+
+    The objective can use :func:`nearest` or :attr:`previous` to initialize training
+    and :func:`save` to make its own results available to later evaluations.
+    """
+
+    def __init__(self, store, fold, hyperparameters, previous=None):
+        self._store = store
+        self._fold = fold
+        self._hyperparameters = hyperparameters
+        self._previous = previous
+        self._saved = None
+
+    @property
+    def fold(self):
+        """The current fold, as a tuple (iteration, fold index)."""
+        return self._fold
+
+    @property
+    def hyperparameters(self):
+        """The hyperparameters of the current evaluation."""
+        return self._hyperparameters
+
+    @property
+    def previous(self):
+        """The object saved for the previous fold of the current evaluation, or None."""
+        return self._previous
+
+    @property
+    def saved(self):
+        """The object that was saved for this fold, or None."""
+        return self._saved
+
+    def nearest(self):
+        """Returns the object saved for this fold by the evaluation with the nearest
+        hyperparameters, as a tuple (hyperparameters, object), or None."""
+        return self._store.nearest(self.fold, self.hyperparameters)
+
+    def save(self, obj):
+        """Saves ``obj`` for this fold and the current hyperparameters."""
+        self._saved = obj
+        self._store.put(self.fold, self.hyperparameters, obj)
+
+
+def _submatrix(matrix, rows, cols):
+    """Returns the submatrix of given rows and columns.
+
+    >>> _submatrix([[0, 1, 2], [3, 4, 5], [6, 7, 8]], [2, 0], [1, 2])
+    [[7, 8], [1, 2]]
+
+    """
+    try:
+        return matrix.take(rows, axis=0).take(cols, axis=1)
+    except AttributeError:  # not a NumPy array, probably a list of lists
+        return [[matrix[i][j] for j in cols] for i in rows]
+
+
+def _matrix_size(matrix):
+    """Returns the memory used by a matrix in bytes: exact for NumPy arrays,
+    the size of the stored entries for SciPy sparse matrices and
+    an estimate of 8 bytes per entry for nested sequences."""
+    if hasattr(matrix, 'nbytes'):
+        return matrix.nbytes
+    if hasattr(matrix, 'nnz'):
+        # values and indices of the stored entries
+        return matrix.nnz * 16
+    rows = len(matrix)
+    return 8 * rows * (len(matrix[0]) if rows else 0)
+
+
+class KernelCache(object):
+    """LRU cache of precomputed kernel (Gram) matrices, keyed by kernel hyperparameters.
+
+    :param kernel: function to compute the Gram matrix of a data set: ``kernel(x, **params)``,
+        where ``params`` are the kernel hyperparameters
+    :param parameters: names of the kernel hyperparameters (e.g. ``['gamma']``)
+    :param max_bytes: memory cap on the cached matrices (default 512 MB),
+        the least recently used matrices are evicted first
+
+    Pass a cache to :func:`cross_validated` via ``kernel_cache``. The decorated function
+    then receives two additional arguments:
+
+    - ``kernel_train``: the kernel matrix between training instances
+    - ``kernel_test``: the kernel matrix between test and training instances
+
+    Both are slices of the full Gram matrix, which is only computed once per
+    unique tuple of kernel hyperparameters. For instance, an SVM with a precomputed
+    kernel only pays for solving its quadratic program when only ``C`` changes.
+
+    The cache is local to a process. With :func:`optunity.pmap`, every worker process
+    starts from the cache as it was when the workers were created.
+
+    >>> cache = KernelCache(lambda x, a: [[a * i * j for j in x] for i in x], ['a'])
+    >>> @cross_validated(x=[1, 2, 3], num_folds=3, folds=[[[0], [1], [2]]],
+    ...                  kernel_cache=cache, aggregator=identity)
+    ... def f(x_train, x_test, kernel_train, kernel_test, a, c):
+    ...     return kernel_test
+    >>> f(a=1, c=0)
+    [[[2, 3]], [[2, 6]], [[3, 6]]]
+    >>> f(a=1, c=1) == f(a=1, c=0)
+    True
+    >>> cache.num_computed
+    1
+
+    Matrices of other types than NumPy arrays and SciPy sparse matrices
+    count as 8 bytes per entry towards ``max_bytes``.
+
+    >>> cache = KernelCache(lambda x, a: [[a * i * j for j in x] for i in x], ['a'],
+    ...                     max_bytes=100)
+    >>> _ = cache.gram([1, 2, 3], a=1)
+    >>> _ = cache.gram([1, 2, 3], a=2)
+    >>> len(cache), cache.num_bytes
+    (1, 72)
+
+    """
+
+    def __init__(self, kernel, parameters, max_bytes=512 * 1024 * 1024):
+        self._kernel = kernel
+        self._parameters = list(parameters)
+        self._max_bytes = max_bytes
+        self._data = collections.OrderedDict()
+        self._num_bytes = 0
+        self._num_computed = 0
+        self._lock = threading.Lock()
+
+    @property
+    def kernel(self): return self._kernel
+
+    @property
+    def parameters(self):
+        """Names of the kernel hyperparameters."""
+        return self._parameters
+
+    @property
+    def max_bytes(self): return self._max_bytes
+
+    @property
+    def num_bytes(self):
+        """Memory used by cached matrices."""
+        return self._num_bytes
+
+    @property
+    def num_computed(self):
+        """Number of Gram matrices that have been computed."""
+        return self._num_computed
+
+    def __len__(self): return len(self._data)
+
+    def gram(self, x, **hyperparameters):
+        """Returns the Gram matrix of ``x`` for given hyperparameters, computing it if necessary.
+
+        :param x: the data
+        :param hyperparameters: hyperparameters, those that are not kernel hyperparameters are ignored
+
+        """
+        params = dict((k, hyperparameters[k]) for k in self.parameters)
+        key = (id(x), functions.Args(**params))
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self._data[key] = entry
+                return entry[0]
+
+        matrix = self.kernel(x, **params)
+        size = _matrix_size(matrix)
+        with self._lock:
+            self._num_computed += 1
+            if size <= self.max_bytes and not key in self._data:
+                self._data[key] = matrix, size
+                self._num_bytes += size
+                while self._num_bytes > self.max_bytes:
+                    _, (_, evicted) = self._data.popitem(last=False)
+                    self._num_bytes -= evicted
+        return matrix
+
+    def clear(self):
+        """Removes all cached matrices."""
+        with self._lock:
+            self._data.clear()
+            self._num_bytes = 0
+
+
+class _RDDFoldPlan(object):
+    """Partitions a Spark RDD according to a set of folds.
+
+    Every record is tagged with its fold id once, by broadcasting a compact
+    row-to-fold lookup table. The tagged RDD is cached, and training and test sets
+    are obtained by filtering on fold id, so index sets are not shipped to executors
+    and the data is not re-indexed for every split.
+
+    """
+
+    def __init__(self, rdd, folds, num_rows):
+        fold_ids = array.array('i', [-1] * num_rows)
+        for fold_id, fold in enumerate(folds):
+            for idx in fold:
+                fold_ids[idx] = fold_id
+        lookup = rdd.context.broadcast(fold_ids)
+        # the lambdas must not reference self, Spark would attempt to serialize it
+        self._tagged = rdd.zipWithIndex().map(
+            lambda rec: (lookup.value[rec[1]], rec[0])).cache()
+        self._lookup = lookup
+
+    def train(self, fold):
+        """Returns the training set of given fold as an RDD."""
+        return self._tagged.filter(lambda rec: rec[0] >= 0 and rec[0] != fold) \
+                           .map(lambda rec: rec[1])
+
+    def test(self, fold):
+        """Returns the test set of given fold as an RDD."""
+        return self._tagged.filter(lambda rec: rec[0] == fold) \
+                           .map(lambda rec: rec[1])
+
+    def unpersist(self):
+        """Releases the cached tagged RDD and the broadcast lookup table."""
+        self._tagged.unpersist()
+        self._lookup.unpersist()
+
+
+def _first(value):
+    """Returns the first element of value if it is a sequence, value itself otherwise."""
+    try:
+        return value[0]
+    except (TypeError, IndexError):
+        return value
+
+
+class FoldRacing(object):
+    """Racing rule to abort cross-validation of a hyperparameter tuple early
+    when it is unlikely to beat the incumbent, i.e. the best tuple that
+    completed all folds so far.
+
+    :param maximize: (optional) whether higher fold scores are better. If None, this follows
+        the direction of the optimization the decorated function is passed to, e.g. with
+        :func:`optunity.maximize` or :func:`optunity.minimize` (default None, i.e. true when
+        the function is evaluated directly)
+    :param min_folds: minimum number of folds to evaluate before aborting (default 2)
+    :param z: width of the confidence bound, in standard errors (default 1.96).
+        Evaluation is aborted when the upper (lower when minimizing) confidence bound on the
+        mean paired difference with the incumbent's scores on the same folds is worse than zero.
+        With ``z=0``, evaluation is aborted as soon as the running mean is worse than
+        the incumbent on the same folds.
+    :param penalty: (optional) value to return for aborted evaluations.
+        If None, the aggregated score of the evaluated folds is returned.
+
+    Aborted evaluations return a :class:`optunity.functions.TruncatedValue`, which is
+    marked in call logs (cfr. :func:`optunity.functions.CallLog.truncated`).
+    Racing requires the aggregator of :func:`cross_validated` to return a number.
+
+    The direction is set via :func:`FoldRacing.orient`. Optimizing in the opposite direction
+    of an explicit ``maximize`` raises a ``ValueError``, as racing would abort the most
+    promising evaluations.
+
+    The incumbent is tracked per process. When evaluations are spread over
+    multiple processes, e.g. with :func:`optunity.pmap`, each process races
+    against the best result it has seen itself.
+
+    >>> racing = FoldRacing(min_folds=2, z=0)
+    >>> @cross_validated(x=list(range(4)), num_folds=4, folds=[[[i] for i in range(4)]],
+    ...                  racing=racing)
+    ... def f(x_train, x_test, a):
+    ...     return a
+    >>> f(a=1.0)
+    1.0
+    >>> v = f(a=0.5)
+    >>> v.truncated, v.num_evaluated
+    (True, 2)
+    >>> f(a=2.0)
+    2.0
+    >>> racing.incumbent
+    [2.0, 2.0, 2.0, 2.0]
+
+    When minimizing, lower fold scores are better.
+
+    >>> racing.orient(maximize=False)
+    >>> f(a=1.0)
+    1.0
+    >>> f(a=2.0).truncated
+    True
+
+    """
+
+    def __init__(self, maximize=None, min_folds=2, z=1.96, penalty=None):
+        assert min_folds >= 1, 'min_folds must be at least 1.'
+        self._maximize = maximize
+        self._oriented = None
+        self._min_folds = min_folds
+        self._z = z
+        self._penalty = penalty
+        self._incumbent = None
+        self._lock = threading.Lock()
+
+    @property
+    def maximize(self):
+        """Whether higher fold scores are better."""
+        if self._maximize is not None:
+            return self._maximize
+        return self._oriented is not False
+
+    def orient(self, maximize):
+        """Sets the direction of optimization, which determines whether higher fold scores
+        are better if ``maximize`` was not specified on construction.
+        The incumbent is discarded when the direction changes.
+
+        :param maximize: whether the objective is maximized
+
+        Raises ``ValueError`` if ``maximize`` was specified on construction and differs.
+
+        >>> FoldRacing(maximize=True).orient(maximize=False)
+        Traceback (most recent call last):
+        ...
+        ValueError: FoldRacing was constructed with maximize=True, but the objective is minimized.
+
+        """
+        if self._maximize is not None and self._maximize != bool(maximize):
+            raise ValueError('FoldRacing was constructed with maximize=' + str(self._maximize)
+                             + ', but the objective is ' + ('maximized.' if maximize
+                                                            else 'minimized.'))
+        with self._lock:
+            if self.maximize != bool(maximize):
+                self._incumbent = None
+            self._oriented = bool(maximize)
+
+    @property
+    def min_folds(self): return self._min_folds
+
+    @property
+    def z(self): return self._z
+
+    @property
+    def penalty(self): return self._penalty
+
+    @property
+    def incumbent(self):
+        """Fold scores of the best complete evaluation so far, or None."""
+        return self._incumbent
+
+    def stop(self, scores):
+        """Determines whether evaluation should be aborted given the fold scores so far.
+
+        :param scores: scores of the folds evaluated so far
+        :returns: True if the evaluation cannot be expected to beat the incumbent
+
+        """
+        with self._lock:
+            incumbent = self._incumbent
+        if incumbent is None or len(scores) < self.min_folds:
+            return False
+
+        sign = 1.0 if self.maximize else -1.0
+        diffs = [sign * (float(_first(s)) - float(_first(i)))
+                 for s, i in zip(scores, incumbent)]
+        n = len(diffs)
+        mean_diff = sum(diffs) / n
+        if n > 1 and self.z:
+            var = sum((d - mean_diff) ** 2 for d in diffs) / (n - 1)
+            bound = mean_diff + self.z * math.sqrt(var / n)
+        else:
+            bound = mean_diff
+        return bound < 0
+
+    def update(self, scores):
+        """Updates the incumbent with the scores of a complete evaluation, if they are better."""
+        total = sum(float(_first(s)) for s in scores)
+        with self._lock:
+            if self._incumbent is None:
+                self._incumbent = list(scores)
+                return
+            current = sum(float(_first(s)) for s in self._incumbent)
+            if (self.maximize and total > current) or \
+                    (not self.maximize and total < current):
+                self._incumbent = list(scores)
+
+    def truncate(self, estimate, num_evaluated, num_total):
+        """Constructs the result of an aborted evaluation.
+
+        :param estimate: aggregated score of the evaluated folds
+        :param num_evaluated: number of evaluated folds
+        :param num_total: total number of folds
+        :returns: a :class:`optunity.functions.TruncatedValue`
+
+        """
+        if self.penalty is not None:
+            estimate = self.penalty
+        return functions.TruncatedValue(estimate, num_evaluated, num_total)
+
+
 class cross_validated_callable(object):
     """Function decorator that takes care of cross-validation.
     Evaluations of the decorated function will always return a cross-validated
@@ -293,12 +794,41 @@ class cross_validated_callable(object):
         Not every instance must be in a cluster.
         Specify clusters as a list of lists of instance indices.
     :param aggregator: function to aggregate scores of different folds (default: mean)
+    :param share_data: (optional) whether to place NumPy arrays and SciPy sparse matrices
+        in shared memory, so worker processes attach to a single copy of ``x`` and ``y``
+        instead of receiving a pickled copy (default false). See :func:`optunity.parallel.share`.
+        This only helps with executors that pickle tasks, such as
+        :class:`concurrent.futures.ProcessPoolExecutor` and spawn-based pools.
+        Forked workers, e.g. of :func:`optunity.pmap` on Linux, inherit the data without
+        pickling, so sharing only adds a copy
+    :param racing: (optional) a :class:`FoldRacing` rule to abort evaluations
+        early when they are unlikely to beat the best result so far (default None).
+        Unless specified on the rule, whether higher scores are better follows the direction
+        of the optimization routine, e.g. :func:`optunity.minimize` makes lower scores better.
+        Solvers used directly, via :meth:`optunity.solvers.Solver.optimize`, require
+        :func:`FoldRacing.orient` or an explicit ``maximize``
+    :param warm_start: (optional) a :class:`WarmStartStore`. If specified, the decorated function
+        receives an additional argument ``state`` (a :class:`FoldState`) to reuse results of
+        previous folds and evaluations (default None)
+    :param kernel_cache: (optional) a :class:`KernelCache`. If specified, the decorated function
+        receives additional arguments ``kernel_train`` and ``kernel_test``,
+        sliced from a cached Gram matrix of ``x`` (default None)
+    :param fidelity: (optional) name of a keyword argument via which callers can request
+        the number of folds to evaluate, e.g. to evaluate 2 out of 10 folds first (default None).
+        Folds are evaluated in order, across iterations. Fold scores are cached per hyperparameter
+        tuple, in the ``fold_scores`` attribute (a :class:`optunity.functions.CallLog`),
+        so evaluating more folds later only evaluates the remaining folds
 
     Use :func:`cross_validated` to create instances of this class.
     """
     def __init__(self, f, x, num_folds=10, y=None, strata=None, folds=None,
                  num_iter=1, regenerate_folds=False, clusters=None,
-                 aggregator=mean):
+                 aggregator=mean, share_data=False, racing=None,
+                 warm_start=None, kernel_cache=None, fidelity=None):
+        assert not (fidelity and regenerate_folds), 'fidelity requires fixed folds.'
+        if share_data:
+            x = parallel.share(x)
+            y = parallel.share(y)
         self._x = x
         self._y = y
         self._strata = strata
@@ -306,6 +836,15 @@ class cross_validated_callable(object):
         self._regenerate_folds = regenerate_folds
         self._f = f
         self._reduce = aggregator
+        # a plain attribute, so the optimization routines find it through wrappers
+        self.racing = racing
+        self._warm_start = warm_start
+        self._kernel_cache = kernel_cache
+        self._fidelity = fidelity
+        # a plain attribute, like call_log, so wrappers and worker processes see it
+        self.fold_scores = functions.CallLog() if fidelity else None
+        self._len_x = None
+        self._rdd_plans = {}
         if folds:
             assert (len(folds) == num_iter), 'Number of fold sets does not equal num_iter.'
             assert (len(folds[0]) == num_folds), 'Number of folds does not match num_folds.'
@@ -318,13 +857,35 @@ class cross_validated_callable(object):
     @property
     def len_x(self):
         """ Number of samples in x """
-        if _spark_available and isinstance(self._x, pyspark.rdd.RDD):
-            return self._x.count()
-        else:
-            try:
-                return len(self._x)
-            except TypeError:
-                return self._x.shape[0]
+        if self._len_x is None:
+            if _is_rdd(self._x):
+                self._len_x = self._x.count()
+            else:
+                try:
+                    self._len_x = len(self._x)
+                except TypeError:
+                    self._len_x = self._x.shape[0]
+        return self._len_x
+
+    def _rdd_plan(self, name, data, iteration):
+        """Returns the fold plan of RDD ``data`` for given iteration, computing it if necessary."""
+        key = (name, iteration)
+        if not key in self._rdd_plans:
+            self._rdd_plans[key] = _RDDFoldPlan(data, self.folds[iteration],
+                                                self.len_x)
+        return self._rdd_plans[key]
+
+    def _drop_rdd_plans(self):
+        for plan in self._rdd_plans.values():
+            plan.unpersist()
+        self._rdd_plans = {}
+
+    def _partition(self, name, data, iteration, fold, rows_train, rows_test):
+        """Returns the training and test set of ``data`` for given fold."""
+        if _is_rdd(data):
+            plan = self._rdd_plan(name, data, iteration)
+            return plan.train(fold), plan.test(fold)
+        return select(data, rows_train), select(data, rows_test)
 
 
     @property
@@ -332,6 +893,21 @@ class cross_validated_callable(object):
         """The aggregation function."""
         return self._reduce
 
+    @property
+    def kernel_cache(self):
+        """The kernel cache, or None."""
+        return self._kernel_cache
+
+    @property
+    def warm_start(self):
+        """The warm-start store, or None."""
+        return self._warm_start
+
+    @property
+    def fidelity(self):
+        """Name of the keyword argument that sets the number of folds to evaluate, or None."""
+        return self._fidelity
+
     @property
     def f(self):
         """The decorated function."""
@@ -381,31 +957,71 @@ class cross_validated_callable(object):
         if args:
             # called with positionals, we must translate them to kwargs of f
             # otherwise positionals mess up with bounded arguments
-            argspec = inspect.getargspec(self.f).args
-            argspec.remove('x_train')
-            argspec.remove('x_test')
-            if self.y is not None:
-                argspec.remove('y_train')
-                argspec.remove('y_test')
+            bound = ['x_train', 'x_test', 'y_train', 'y_test', 'state',
+                     'kernel_train', 'kernel_test']
+            argspec = [arg for arg in _getargspec(self.f).args
+                       if not arg in bound]
             for argname, arg in zip(argspec, args):
                 kwargs[argname] = arg
+        num_total = self.num_iter * self.num_folds
+        num_requested = num_total
+        if self.fidelity is not None and self.fidelity in kwargs:
+            num_requested = min(num_total, int(kwargs.pop(self.fidelity)))
+            assert num_requested > 0, 'At least one fold must be evaluated.'
+        hyperparameters = dict(kwargs)
 
         if self.regenerate_folds:
+            self._drop_rdd_plans()
             self._folds = [generate_folds(self.len_x, self.num_folds, self.strata)
                            for _ in range(self.num_iter)]
         scores = []
-        for folds in self.folds:
-            for fold in range(self.num_folds):
+        if self.fold_scores is not None:
+            # continue from the folds that were evaluated before
+            scores = list(self.fold_scores.get(**hyperparameters) or [])
+        if self.kernel_cache is not None and len(scores) < num_requested:
+            gram = self.kernel_cache.gram(self.x, **hyperparameters)
+        previous = None
+        if self.warm_start is not None and 0 < len(scores) < num_requested:
+            previous = self.warm_start.get(divmod(len(scores) - 1, self.num_folds),
+                                           hyperparameters)
+        try:
+            for index in range(len(scores), num_requested):
+                iteration, fold = divmod(index, self.num_folds)
+                folds = self.folds[iteration]
                 rows_test = folds[fold]
                 rows_train = list(it.chain(*[folds[i]
                                                     for i in range(self.num_folds)
                                                     if not i == fold]))
-                kwargs['x_train'] = select(self.x, rows_train)
-                kwargs['x_test'] = select(self.x, rows_test)
+                kwargs['x_train'], kwargs['x_test'] = self._partition('x', self.x,
+                                                                      iteration, fold,
+                                                                      rows_train, rows_test)
                 if not self.y is None:  # dealing with a supervised algorithm
-                    kwargs['y_train'] = select(self.y, rows_train)
-                    kwargs['y_test'] = select(self.y, rows_test)
+                    kwargs['y_train'], kwargs['y_test'] = self._partition('y', self.y,
+                                                                          iteration, fold,
+                                                                          rows_train, rows_test)
+                if self.kernel_cache is not None:
+                    kwargs['kernel_train'] = _submatrix(gram, rows_train, rows_train)
+                    kwargs['kernel_test'] = _submatrix(gram, rows_test, rows_train)
+                if self.warm_start is not None:
+                    kwargs['state'] = FoldState(self.warm_start, (iteration, fold),
+                                                hyperparameters, previous)
                 scores.append(self.f(**kwargs))
+                if self.warm_start is not None:
+                    previous = kwargs['state'].saved
+                if (self.racing and len(scores) < num_total
+                        and self.racing.stop(scores)):
+                    return self.racing.truncate(self.reduce(scores),
+                                                len(scores), num_total)
+        finally:
+            if self.fold_scores is not None:
+                # the most recent entry is last, so worker processes can send it back
+                self.fold_scores.data.pop(functions.Args(**hyperparameters), None)
+                self.fold_scores.insert(list(scores), **hyperparameters)
+        scores = scores[:num_requested]
+        if len(scores) < num_total:
+            return functions.TruncatedValue(self.reduce(scores), len(scores), num_total)
+        if self.racing:
+            self.racing.update(scores)
         return self.reduce(scores)
 
     def __getattr__(self, name):
@@ -416,7 +1032,9 @@ class cross_validated_callable(object):
 
 
 def cross_validated(x, num_folds=10, y=None, strata=None, folds=None, num_iter=1,
-                    regenerate_folds=False, clusters=None, aggregator=mean):
+                    regenerate_folds=False, clusters=None, aggregator=mean,
+                    share_data=False, racing=None, warm_start=None,
+                    kernel_cache=None, fidelity=None):
     """Function decorator to perform cross-validation as configured.
 
     :param x: data to be used for cross-validation
@@ -435,6 +1053,29 @@ def cross_validated(x, num_folds=10, y=None, strata=None, folds=None, num_iter=1
         Not every instance must be in a cluster.
         Specify clusters as a list of lists of instance indices.
     :param aggregator: function to aggregate scores of different folds (default: mean)
+    :param share_data: (optional) whether to place NumPy arrays and SciPy sparse matrices
+        in shared memory, so worker processes attach to a single copy of ``x`` and ``y``
+        instead of receiving a pickled copy (default false). See :func:`optunity.parallel.share`.
+        This only helps with executors that pickle tasks, such as
+        :class:`concurrent.futures.ProcessPoolExecutor` and spawn-based pools.
+        Forked workers, e.g. of :func:`optunity.pmap` on Linux, inherit the data without
+        pickling, so sharing only adds a copy
+    :param racing: (optional) a :class:`FoldRacing` rule to abort evaluations
+        early when they are unlikely to beat the best result so far (default None).
+        Unless specified on the rule, whether higher scores are better follows the direction
+        of the optimization routine, e.g. :func:`optunity.minimize` makes lower scores better.
+        Solvers used directly, via :meth:`optunity.solvers.Solver.optimize`, require
+        :func:`FoldRacing.orient` or an explicit ``maximize``
+    :param warm_start: (optional) a :class:`WarmStartStore`. If specified, the decorated function
+        receives an additional argument ``state`` (a :class:`FoldState`) to reuse results of
+        previous folds and evaluations (default None)
+    :param kernel_cache: (optional) a :class:`KernelCache`. If specified, the decorated function
+        receives additional arguments ``kernel_train`` and ``kernel_test``,
+        sliced from a cached Gram matrix of ``x`` (default None)
+    :param fidelity: (optional) name of a keyword argument via which callers can request
+        the number of folds to evaluate, e.g. to evaluate 2 out of 10 folds first (default None).
+        Folds are evaluated in order, across iterations. Fold scores are cached per hyperparameter
+        tuple, so evaluating more folds later only evaluates the remaining folds
     :returns: a :class:`cross_validated_callable` with the proper configuration.
 
     This resulting decorator must be used on a function with the following signature (+ potential other arguments):
@@ -464,6 +1105,33 @@ def cross_validated(x, num_folds=10, y=None, strata=None, folds=None, num_iter=1
     >>> f(a=2)
     [2, 3, 4, 5, 6]
 
+    With ``fidelity``, a subset of folds can be evaluated first. Evaluating more folds
+    of the same hyperparameters later only evaluates the remaining folds.
+    Results of a subset of folds are :class:`optunity.functions.TruncatedValue` objects,
+    which requires the aggregator to return a number.
+
+    >>> evaluated = []
+    >>> @cross_validated(x=data, num_folds=5, folds=[[[i] for i in range(5)]], fidelity='num_folds')
+    ... def f(x_train, x_test, a):
+    ...     evaluated.append(x_test[0])
+    ...     return x_test[0] + a
+    >>> v = f(a=1, num_folds=2)
+    >>> v, v.num_evaluated
+    (1.5, 2)
+    >>> f(a=1)
+    3.0
+    >>> evaluated
+    [0, 1, 2, 3, 4]
+    >>> f.fold_scores.get(a=1)
+    [1, 2, 3, 4, 5]
+
+    Worker processes of :func:`optunity.pmap` send their fold scores back.
+
+    >>> list(parallel.pmap(f, [2]))
+    [4.0]
+    >>> f.fold_scores.get(a=2)
+    [2, 3, 4, 5, 6]
+
     The number of folds must be less than or equal to the size of the data.
 
     >>> data = list(range(5))
@@ -482,14 +1150,181 @@ def cross_validated(x, num_folds=10, y=None, strata=None, folds=None, num_iter=1
     AssertionError
 
     """
-    assert(num_folds <= len(x))
-    assert(y is None or len(y) == len(x))
     args = dict(locals())
+    if not _is_rdd(x):  # avoid a pass over the data just for sanity checks
+        assert(num_folds <= len(x))
+        assert(y is None or _is_rdd(y) or len(y) == len(x))
     def wrapper(f):
         args['f'] = f
         return cross_validated_callable(**args)
     return wrapper
 
 
+nested_cv_results = DocTup("""
+**Results of nested cross-validation**:
+
+estimate
+    aggregated score of the outer folds, an estimate of generalization performance
+    of the entire tuning procedure
+
+scores
+    list of scores per outer fold
+
+optima
+    list of optimal hyperparameters per outer fold
+
+call_logs
+    list of call logs (as dicts) of the inner tuning problem per outer fold
+
+outer_folds
+    the outer folds (list of lists of instance indices)
+
+inner_folds
+    the inner folds per outer fold, with instance indices relative to the
+    training set of the outer fold
+                           """,
+                           'nested_cv_results', ['estimate', 'scores', 'optima',
+                                                 'call_logs', 'outer_folds',
+                                                 'inner_folds'])
+
+
+def _relative(groups, indices):
+    """Maps lists of absolute instance indices to positions in ``indices``,
+    dropping instances that are not in ``indices``."""
+    if not groups:
+        return None
+    position = dict((idx, pos) for pos, idx in enumerate(indices))
+    relative = [[position[idx] for idx in group if idx in position]
+                for group in groups]
+    return [group for group in relative if group]
+
+
+class _NestedFold(object):
+    """Tunes and evaluates a single outer fold of nested cross-validation."""
+
+    def __init__(self, f, x, y, outer_folds, inner_folds, num_evals, maximize,
+                 solver_name, aggregator, call_logs, box):
+        self.f = f
+        self.x = x
+        self.y = y
+        self.outer_folds = outer_folds
+        self.inner_folds = inner_folds
+        self.num_evals = num_evals
+        self.maximize = maximize
+        self.solver_name = solver_name
+        self.aggregator = aggregator
+        self.call_logs = call_logs
+        self.box = box
+
+    def __call__(self, fold):
+        from . import api
+
+        rows_test = self.outer_folds[fold]
+        rows_train = list(it.chain(*[self.outer_folds[i]
+                                     for i in range(len(self.outer_folds))
+                                     if not i == fold]))
+        data = {'x_train': select(self.x, rows_train),
+                'x_test': select(self.x, rows_test)}
+        if not self.y is None:
+            data['y_train'] = select(self.y, rows_train)
+            data['y_test'] = select(self.y, rows_test)
+
+        inner_folds = self.inner_folds[fold]
+        inner = cross_validated(x=data['x_train'], y=data.get('y_train', None),
+                                num_folds=len(inner_folds), folds=[inner_folds],
+                                aggregator=self.aggregator)(self.f)
+        if self.call_logs and self.call_logs[fold]:
+            inner = api.wrap_call_log(inner, self.call_logs[fold])
+
+        if self.maximize:
+            optimum, details, _ = api.maximize(inner, self.num_evals,
+                                               self.solver_name, **self.box)
+        else:
+            optimum, details, _ = api.minimize(inner, self.num_evals,
+                                               self.solver_name, **self.box)
+
+        kwargs = dict(optimum)
+        kwargs.update(data)
+        return optimum, self.f(**kwargs), details.call_log
+
+
+def nested_cross_validation(f, x, num_evals=50, y=None, num_folds=10,
+                            num_inner_folds=5, strata=None, clusters=None,
+                            maximize=True, solver_name=None, aggregator=mean,
+                            pmap=map, outer_folds=None, inner_folds=None,
+                            call_logs=None, share_data=False, **kwargs):
+    """Performs nested cross-validation: hyperparameters are tuned via :func:`cross_validated`
+    on the training set of every outer fold, and the tuned model is evaluated
+    on the outer test set.
+
+    :param f: the objective function, with the signature required by :func:`cross_validated`
+    :param x: data to be used for cross-validation
+    :param num_evals: number of permitted function evaluations per inner tuning problem
+    :param y: (optional) labels to be used for cross-validation
+    :param num_folds: number of outer folds (default 10)
+    :param num_inner_folds: number of inner folds (default 5)
+    :param strata: (optional) strata to account for when generating folds
+    :param clusters: (optional) clusters to account for when generating folds
+    :param maximize: maximize or minimize the inner objective (default true)
+    :param solver_name: (optional) name of the solver to use for inner tuning
+    :param aggregator: function to aggregate scores of different folds (default: mean)
+    :param pmap: the map function used to process outer folds, e.g. :func:`optunity.pmap`
+    :param outer_folds: (optional) prespecified outer folds (list of lists)
+    :param inner_folds: (optional) prespecified inner folds per outer fold, with indices
+        relative to the training set of the outer fold
+    :param call_logs: (optional) call logs (as dicts) of previous inner tuning problems
+        per outer fold. Inner configurations that were already evaluated are not re-evaluated.
+        This is only meaningful when ``outer_folds`` and ``inner_folds`` are identical
+        to those of the previous run.
+    :param share_data: (optional) place NumPy/SciPy data in shared memory,
+        see :func:`optunity.parallel.share` (default false)
+    :param kwargs: box constraints for the hyperparameters
+    :returns: a namedtuple with the results
+
+    All fold index sets are computed before tuning starts and are returned as part of
+    the results, so a subsequent run can reuse them along with the call logs.
+
+    >>> def f(x_train, x_test, a):
+    ...     return -(a - 1.0) ** 2
+    >>> res = nested_cross_validation(f, list(range(20)), num_evals=10, num_folds=4,
+    ...                               num_inner_folds=3, solver_name='grid search',
+    ...                               a=[0, 2])
+    >>> len(res.optima), len(res.scores), len(res.inner_folds[0])
+    (4, 4, 3)
+    >>> res.estimate <= 0.0
+    True
+
+    """
+    assert call_logs is None or (outer_folds and inner_folds), \
+        'Call logs can only be reused with prespecified outer and inner folds.'
+
+    if share_data:
+        x = parallel.share(x)
+        y = parallel.share(y)
+
+    if not outer_folds:
+        num_rows = len(x)
+        # generate_folds extends the list of strata it is given
+        outer_folds = generate_folds(num_rows, num_folds,
+                                     list(strata) if strata else None, clusters)
+    num_folds = len(outer_folds)
+
+    if not inner_folds:
+        inner_folds = []
+        for fold in range(num_folds):
+            rows_train = list(it.chain(*[outer_folds[i] for i in range(num_folds)
+                                         if not i == fold]))
+            inner_folds.append(generate_folds(len(rows_train), num_inner_folds,
+                                              _relative(strata, rows_train),
+                                              _relative(clusters, rows_train)))
+
+    task = _NestedFold(f, x, y, outer_folds, inner_folds, num_evals, maximize,
+                       solver_name, aggregator, call_logs, kwargs)
+    results = list(pmap(task, list(range(num_folds))))
+    optima, scores, logs = [list(r) for r in zip(*results)]
+    return nested_cv_results(aggregator(scores), scores, optima, logs,
+                             outer_folds, inner_folds)
+
+
 if __name__ == '__main__':
     pass
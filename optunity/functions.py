@@ -46,12 +46,10 @@ import functools
 import threading
 import operator as op
 
+from .util import module_available
 
-try:
-    import pandas
-    _pandas_available = True
-except:
-    _pandas_available = False
+# pandas is only imported when converting call logs
+_pandas_available = module_available('pandas')
 
 # http://stackoverflow.com/a/28752007
 def wraps(obj, attr_names=functools.WRAPPER_ASSIGNMENTS):
@@ -187,6 +185,19 @@ class CallLog(object):
         assert(type(other) is CallLog)
         self.data.update(other.data)
 
+    def truncated(self):
+        """Returns the arguments (as dicts) of all evaluations that were truncated.
+
+        >>> log = CallLog()
+        >>> log.insert(1.0, x=1)
+        >>> log.insert(TruncatedValue(0.5, 2, 10), x=2)
+        >>> log.truncated()
+        [{'x': 2}]
+
+        """
+        return [k._asdict() for k, v in self.data.items()
+                if getattr(v, 'truncated', False)]
+
     @staticmethod
     def from_dict(d):
         """Converts given dict to a valid call log used by logged functions.
@@ -236,6 +247,29 @@ class CallLog(object):
             return {'args': {}, 'values': []}
 
 
+class TruncatedValue(float):
+    """Function value of an evaluation that was stopped before completion,
+    for instance by racing cross-validation folds (cfr. :class:`optunity.cross_validation.FoldRacing`).
+
+    Behaves as an ordinary float, so solvers can use it as any other function value.
+    Entries with such values are reported by :func:`CallLog.truncated`.
+
+    >>> v = TruncatedValue(0.5, num_evaluated=2, num_total=10)
+    >>> v + 1
+    1.5
+    >>> v.truncated, v.num_evaluated, v.num_total
+    (True, 2, 10)
+
+    """
+    truncated = True
+
+    def __new__(cls, value, num_evaluated=None, num_total=None):
+        obj = float.__new__(cls, value)
+        obj.num_evaluated = num_evaluated
+        obj.num_total = num_total
+        return obj
+
+
 def logged(f):
     """Decorator that logs unique calls to ``f``.
 
@@ -329,7 +363,8 @@ def max_evals(max_evals):
 
     Throws a MaximumEvaluationsException during evaluations after
     the maximum is reached. Adds a field ``f.num_evals`` which tracks
-    the number of evaluations that have been performed.
+    the number of evaluations that have been performed and a field
+    ``f.max_evals`` with the maximum.
 
     >>> @max_evals(1)
     ... def f(x): return 2
@@ -355,6 +390,7 @@ def max_evals(max_evals):
                 wrapped_f.num_evals += 1
                 return f(*args, **kwargs)
         wrapped_f.num_evals = 0
+        wrapped_f.max_evals = max_evals
         return wrapped_f
     return wrapper
 
@@ -389,6 +425,7 @@ def call_log2dataframe(log):
     """
     if not _pandas_available:
         raise NotImplementedError('This function requires pandas')
+    import pandas
 
     args = log['args']
     values = log['values']
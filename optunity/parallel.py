@@ -33,8 +33,45 @@
 import threading
 import copy
 import functools
+import os
+import sys
+import tempfile
 
-__all__ = ['pmap', 'Future', 'create_pmap']
+__all__ = ['pmap', 'Future', 'create_pmap', 'WorkerPool', 'share', 'SharedArray',
+           'SharedSparse']
+
+from .util import module_available
+
+# NumPy is only imported when data is shared
+_numpy_available = module_available('numpy')
+
+# multiprocessing.shared_memory (Python >= 3.8) is also imported on first use,
+# older versions fall back to memory-mapped files
+_shared_memory_available = sys.version_info >= (3, 8)
+
+# logs of objective functions that worker processes send back to the parent:
+# the call log and the fold scores of cross-validated functions
+_logs = ('call_log', 'fold_scores')
+
+def _last_entries(f):
+    """Returns the most recent entry of every log of f, as ``{log: (key, value)}``."""
+    entries = {}
+    for name in _logs:
+        log = getattr(f, name, None)
+        if log is not None and len(log):
+            key = next(reversed(log.data))
+            entries[name] = key, log.data[key]
+    return entries
+
+def _record(f, entries):
+    """Records the entries of a worker process in the logs of f."""
+    for name, (key, value) in entries.items():
+        log = getattr(f, name)
+        # fold scores only grow, keep the longest list
+        current = log.data.get(key, None)
+        if isinstance(current, list) and len(current) >= len(value):
+            continue
+        log[key] = value
 
 def _fun(f, q_in, q_out):
     while True:
@@ -42,11 +79,19 @@ def _fun(f, q_in, q_out):
         if i is None:
             break
         value = f(*x)
-        if hasattr(f, 'call_log'):
-            k = list(f.call_log.keys())[-1]
-            q_out.put((i, value, k))
-        else:
-            q_out.put((i, value))
+        q_out.put((i, value, _last_entries(f)))
+
+def _pool_worker(f, q_in, q_out):
+    while True:
+        i, x = q_in.get()
+        if i is None:
+            break
+        try:
+            value = f(*x)
+        except Exception as e:
+            q_out.put((i, None, None, e))
+            continue
+        q_out.put((i, value, _last_entries(f), None))
 
 try:
     import multiprocessing
@@ -83,18 +128,113 @@ try:
         [p.join() for p in proc]
 
         # FIXME: strong coupling between pmap and functions.logged
-        if hasattr(f, 'call_log'):
-            for _, value, k in sorted(res):
-                f.call_log[k] = value
-            return [x for i, x, _ in sorted(res)]
-        else:
-            return [x for i, x in sorted(res)]
+        res = sorted(res, key=lambda r: r[0])
+        for _, _, entries in res:
+            _record(f, entries)
+        return [x for i, x, _ in res]
 
     def create_pmap(number_of_processes):
         def pmap_bound(f, *args):
             return pmap(f, *args, number_of_processes=number_of_processes)
         return pmap_bound
 
+    class WorkerPool(object):
+        """A pool of worker processes that evaluate ``f`` asynchronously.
+
+        Unlike :func:`pmap`, which evaluates a batch of arguments and waits until
+        all of them are done, work can be submitted at any time and results are
+        retrieved in the order in which they finish. This allows a caller to keep
+        all workers busy, by submitting new work whenever a result comes in.
+
+        :param f: the callable
+        :param number_of_processes: the number of worker processes, defaults to the number of CPUs
+
+        >>> pool = WorkerPool(abs, number_of_processes=2)
+        >>> jobs = [pool.submit(x) for x in [-1, -2, -3]]
+        >>> sorted(pool.result() for _ in jobs)
+        [(0, 1), (1, 2), (2, 3)]
+        >>> pool.close()
+
+        Exceptions raised by ``f`` are raised again by :func:`result`.
+
+        .. warning::
+            Python's multiprocessing library is incompatible with Jython.
+
+        """
+
+        def __init__(self, f, number_of_processes=None):
+            self._f = f
+            self._nprocs = number_of_processes or multiprocessing.cpu_count()
+            self._q_in = multiprocessing.Queue()
+            self._q_out = multiprocessing.Queue()
+            self._num_submitted = 0
+            self._pending = 0
+            self._proc = [multiprocessing.Process(target=_pool_worker,
+                                                  args=(f, self._q_in, self._q_out))
+                          for _ in range(self._nprocs)]
+            for p in self._proc:
+                p.daemon = True
+                p.start()
+
+        @property
+        def number_of_processes(self):
+            """The number of worker processes."""
+            return self._nprocs
+
+        @property
+        def pending(self):
+            """The number of submitted evaluations whose result has not been retrieved."""
+            return self._pending
+
+        def submit(self, *args):
+            """Submits the evaluation of ``f(*args)``.
+
+            :returns: the identifier of this evaluation, as returned by :func:`result`
+            """
+            if self._proc is None:
+                raise ValueError('WorkerPool is closed.')
+            i = self._num_submitted
+            self._q_in.put((i, args))
+            self._num_submitted += 1
+            self._pending += 1
+            return i
+
+        def result(self):
+            """Waits for the next evaluation to finish.
+
+            :returns: the identifier of the evaluation and its result
+            """
+            if not self._pending:
+                raise ValueError('No evaluations are pending.')
+            i, value, entries, error = self._q_out.get()
+            self._pending -= 1
+            if error is not None:
+                raise error
+            # FIXME: strong coupling between pmap and functions.logged
+            _record(self._f, entries)
+            return i, value
+
+        def close(self):
+            """Stops the worker processes, pending evaluations are abandoned."""
+            if self._proc is None:
+                return
+            if self._pending:
+                for p in self._proc:
+                    p.terminate()
+            else:
+                for _ in self._proc:
+                    self._q_in.put((None, None))
+            for p in self._proc:
+                p.join()
+            self._proc = None
+            self._pending = 0
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            self.close()
+
     # http://code.activestate.com/recipes/84317-easy-threading-with-futures/
     class Future:
         def __init__(self,func,*param):
@@ -138,6 +278,243 @@ try:
 except ImportError:
     pmap = map
     Future = None
+    WorkerPool = None
+
+
+class SharedArray(object):
+    """A read-only NumPy array that is passed to other processes by reference.
+
+    The data is copied once into shared memory (:mod:`multiprocessing.shared_memory`)
+    or, if that is unavailable, into a memory-mapped temporary file. Pickling a
+    SharedArray only transfers a handle, unpickling attaches to the existing buffer
+    without copying the data. Indexing returns NumPy arrays.
+
+    The buffer is released when the SharedArray in the process that created it
+    is garbage collected, or explicitly via :func:`close`.
+
+    Unpickled copies read the shared buffer:
+
+    >>> import pickle
+    >>> if _numpy_available:
+    ...     import numpy as np
+    ...     x = SharedArray(np.arange(6).reshape(3, 2))
+    ...     y = pickle.loads(pickle.dumps(x))
+    ...     rows = list(pmap(lambda z, i: z[i].tolist(), [x] * 3, range(3)))
+    ...     checks = [y[[0, 2], ...].tolist() == [[0, 1], [4, 5]], len(y) == 3,
+    ...               rows == [[0, 1], [2, 3], [4, 5]]]
+    ...     x.close()
+    ... else:
+    ...     checks = [True] * 3
+    >>> checks
+    [True, True, True]
+
+    """
+
+    def __init__(self, array):
+        if not _numpy_available:
+            raise ImportError('SharedArray requires NumPy but it is missing.')
+        import numpy as np
+        array = np.ascontiguousarray(array)
+        self._shape = array.shape
+        self._dtype = array.dtype.str
+        self._name = None
+        self._path = None
+        self._shm = None
+        self._owner = os.getpid()
+
+        if array.size == 0:
+            # nothing worth sharing, this is pickled by value
+            self._array = array.copy()
+            return
+
+        if _shared_memory_available:
+            from multiprocessing import shared_memory
+            self._shm = shared_memory.SharedMemory(create=True, size=array.nbytes)
+            self._name = self._shm.name
+            self._array = np.ndarray(array.shape, dtype=array.dtype,
+                                     buffer=self._shm.buf)
+        else:
+            fd, self._path = tempfile.mkstemp(prefix='optunity-', suffix='.mmap')
+            os.close(fd)
+            self._array = np.memmap(self._path, dtype=array.dtype, mode='w+',
+                                    shape=array.shape)
+        self._array[...] = array
+        self._array.flags.writeable = False
+
+    def __getstate__(self):
+        state = {'shape': self._shape, 'dtype': self._dtype,
+                 'name': self._name, 'path': self._path}
+        if self._name is None and self._path is None:
+            state['array'] = self._array
+        return state
+
+    def __setstate__(self, state):
+        self._shape = state['shape']
+        self._dtype = state['dtype']
+        self._name = state['name']
+        self._path = state['path']
+        self._shm = None
+        self._owner = None
+        import numpy as np
+        if self._name is not None:
+            from multiprocessing import shared_memory
+            self._shm = shared_memory.SharedMemory(name=self._name)
+            self._array = np.ndarray(self._shape, dtype=self._dtype,
+                                     buffer=self._shm.buf)
+            self._array.flags.writeable = False
+        elif self._path is not None:
+            self._array = np.memmap(self._path, dtype=self._dtype, mode='r',
+                                    shape=self._shape)
+        else:
+            self._array = state['array']
+
+    @property
+    def array(self):
+        """The shared data as a (read-only) NumPy array."""
+        return self._array
+
+    @property
+    def shape(self): return self._shape
+
+    @property
+    def dtype(self): return self.array.dtype
+
+    @property
+    def ndim(self): return len(self._shape)
+
+    def __len__(self): return self._shape[0]
+
+    def __getitem__(self, item): return self.array[item]
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None:
+            return self.array
+        return self.array.astype(dtype)
+
+    def __repr__(self):
+        return 'SharedArray(shape=' + str(self.shape) + ', dtype=' + str(self.dtype) + ')'
+
+    def close(self):
+        """Releases the shared buffer. Only the creating process removes it."""
+        self._array = None
+        if self._shm is not None:
+            self._shm.close()
+            if self._owner == os.getpid():
+                self._shm.unlink()
+            self._shm = None
+        elif self._path is not None and self._owner == os.getpid():
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+        self._owner = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class SharedSparse(object):
+    """A read-only SciPy sparse matrix that is passed to other processes by reference.
+
+    The ``data``, ``indices`` and ``indptr`` arrays of the CSR (or CSC) representation
+    are stored in :class:`SharedArray` objects. Matrices in other formats are converted
+    to CSR. Indexing behaves as indexing the underlying sparse matrix.
+
+    >>> if _numpy_available and module_available('scipy'):
+    ...     import scipy.sparse
+    ...     x = share(scipy.sparse.coo_matrix([[0, 1.5], [0, 0], [2.5, 0]]))
+    ...     rows = list(pmap(lambda z, i: z[i].toarray().tolist(), [x] * 3, range(3)))
+    ...     checks = [isinstance(x, SharedSparse), x.format == 'csr',
+    ...               rows == [[[0, 1.5]], [[0, 0]], [[2.5, 0]]]]
+    ...     x.close()
+    ... else:
+    ...     checks = [True] * 3
+    >>> checks
+    [True, True, True]
+
+    """
+
+    def __init__(self, matrix):
+        if not matrix.format in ('csr', 'csc'):
+            matrix = matrix.tocsr()
+        self._format = matrix.format
+        self._shape = matrix.shape
+        self._data = SharedArray(matrix.data)
+        self._indices = SharedArray(matrix.indices)
+        self._indptr = SharedArray(matrix.indptr)
+        self._matrix = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_matrix'] = None
+        return state
+
+    @property
+    def matrix(self):
+        """The shared data as a sparse matrix, constructed without copying."""
+        if self._matrix is None:
+            import scipy.sparse
+            if self._format == 'csr': cls = scipy.sparse.csr_matrix
+            else: cls = scipy.sparse.csc_matrix
+            self._matrix = cls((self._data.array, self._indices.array,
+                                self._indptr.array),
+                               shape=self._shape, copy=False)
+        return self._matrix
+
+    @property
+    def shape(self): return self._shape
+
+    @property
+    def format(self): return self._format
+
+    def __len__(self): return self._shape[0]
+
+    def __getitem__(self, item): return self.matrix[item]
+
+    def __repr__(self):
+        return 'SharedSparse(shape=' + str(self.shape) + ', format=' + self.format + ')'
+
+    def close(self):
+        """Releases the shared buffers."""
+        self._matrix = None
+        for arr in (self._data, self._indices, self._indptr):
+            arr.close()
+
+
+def _is_sparse(data):
+    # if scipy.sparse was never imported, data cannot be a sparse matrix
+    sparse = sys.modules.get('scipy.sparse', None)
+    return sparse is not None and sparse.issparse(data)
+
+
+def share(data):
+    """Places NumPy arrays and SciPy sparse matrices in shared memory.
+
+    :param data: the data to share
+    :returns: a :class:`SharedArray` or :class:`SharedSparse` wrapping ``data``,
+        or ``data`` itself if it is of any other type (or already shared)
+
+    Shared data is pickled as a handle, so worker processes attach to a single copy of
+    the data instead of receiving their own. This only helps with executors that pickle
+    tasks, such as :class:`concurrent.futures.ProcessPoolExecutor` and spawn-based pools:
+    forked workers, e.g. of :func:`pmap` on Linux, inherit data without pickling it.
+
+    >>> share([1, 2, 3])
+    [1, 2, 3]
+
+    """
+    if isinstance(data, (SharedArray, SharedSparse)):
+        return data
+    # data can only be a NumPy array if NumPy was imported
+    np = sys.modules.get('numpy')
+    if np is not None and isinstance(data, np.ndarray):
+        return SharedArray(data)
+    if _is_sparse(data):
+        return SharedSparse(data)
+    return data
 
 if __name__ == '__main__':
     pass
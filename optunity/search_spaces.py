@@ -69,6 +69,11 @@ import itertools
 import collections
 import math
 
+from .util import module_available
+
+# NumPy is only imported when batches are decoded
+_numpy_available = module_available('numpy')
+
 DELIM = '|'
 
 class Options(object):
@@ -149,6 +154,164 @@ class Node(object):
                 yield key, v
 
 
+class _CompiledDecoder(object):
+    """Decision table to decode vector representations of a :class:`SearchTree`.
+
+    Every entry of the table holds the operations that are performed unconditionally
+    once the entry is reached, followed by at most one choice. The choice determines
+    the next entry, based on the integer part of the value in its column. Entries
+    are shared by all paths that reach them in the same state.
+
+    Decoding a point therefore only inspects the columns of the choices that are active,
+    after which the result is filled in from a template that is cached per branch.
+
+    :param keys: keys of the vector representation, in order of the columns
+    :param vectorcontent: content of the vector representation, per key
+
+    """
+
+    def __init__(self, keys, vectorcontent):
+        self._columns = list(keys)
+        self._index = dict((k, i) for i, k in enumerate(self._columns))
+        self._items = sorted(self._columns)
+        self._content = vectorcontent
+        # entry: (operations, choice), where choice is (column, key, options, next entries)
+        self._table = []
+        self._memo = {}
+        self._templates = {}
+        self._compile(0, ())
+
+    @property
+    def columns(self):
+        """Keys of the vector representation, in order of the columns."""
+        return self._columns
+
+    @property
+    def table(self):
+        """The decision table."""
+        return self._table
+
+    def _compile(self, idx, nested):
+        """Compiles the decoding of the sorted keys from ``idx`` onwards,
+        given the stack of choices and options that are being decoded.
+
+        This mirrors :func:`SearchTree._decode_sorted` step by step.
+        """
+        state = (idx, nested)
+        if state in self._memo:
+            return self._memo[state]
+        entry = len(self._table)
+        self._memo[state] = entry
+        self._table.append(None)
+
+        operations, choice = [], None
+        while idx < len(self._items):
+            key = self._items[idx]
+            keylist = key.split(DELIM)
+            if nested and len(keylist) >= len(nested):
+                if not all(a == b for a, b in zip(nested, keylist)):
+                    # inactive hyperparameter
+                    operations.append((None, keylist[-1]))
+                    idx += 1
+                    continue
+            elif nested:
+                nested = nested[:-2]
+                continue
+
+            content = self._content[key]
+            if type(content) is Options:
+                outkey = DELIM.join(keylist[len(nested):])
+                choice = (self._index[key], outkey, list(content),
+                          [self._compile(idx + 1, nested + (keylist[-1], option))
+                           for option in content])
+                break
+            operations.append((self._index[key], keylist[-1]))
+            idx += 1
+
+        self._table[entry] = (operations, choice)
+        return entry
+
+    @staticmethod
+    def _option(value, num_options):
+        return min(max(int(math.floor(value)), 0), num_options - 1)
+
+    def branch(self, row):
+        """Determines the active branch of ``row``, as a tuple of option indices."""
+        entry, path = 0, []
+        while True:
+            choice = self._table[entry][1]
+            if choice is None:
+                return tuple(path)
+            column, _, options, entries = choice
+            option = self._option(row[column], len(options))
+            path.append(option)
+            entry = entries[option]
+
+    def template(self, branch):
+        """Returns the template of given branch, as a tuple of constants (choices
+        and inactive hyperparameters) and pairs of (key, column) of active hyperparameters."""
+        template = self._templates.get(branch)
+        if template is not None:
+            return template
+        sources = collections.OrderedDict()
+        entry = 0
+        for option in branch + (None, ):
+            operations, choice = self._table[entry]
+            for column, key in operations:
+                if column is not None:
+                    sources[key] = (True, column)
+                elif not key in sources:
+                    sources[key] = (False, None)
+            if option is None:
+                break
+            column, key, options, entries = choice
+            sources[key] = (False, options[option])
+            entry = entries[option]
+        constants = dict((k, v) for k, (active, v) in sources.items() if not active)
+        columns = [(k, v) for k, (active, v) in sources.items() if active]
+        template = (constants, columns)
+        self._templates[branch] = template
+        return template
+
+    def decode(self, row):
+        """Decodes a single row, with values in order of :attr:`columns`."""
+        constants, columns = self.template(self.branch(row))
+        result = dict(constants)
+        for key, column in columns:
+            result[key] = row[column]
+        return result
+
+    def group(self, matrix):
+        """Groups the rows of ``matrix`` by active branch.
+
+        :returns: an OrderedDict mapping branches to lists of row indices
+        """
+        groups = collections.OrderedDict()
+        if _numpy_available and hasattr(matrix, 'shape'):
+            import numpy as np
+            self._group_vectorized(np.asarray(matrix, dtype=float),
+                                   np.arange(len(matrix)), 0, (), groups)
+            for branch, rows in groups.items():
+                groups[branch] = rows.tolist()
+        else:
+            for i, row in enumerate(matrix):
+                groups.setdefault(self.branch(row), []).append(i)
+        return groups
+
+    def _group_vectorized(self, matrix, rows, entry, branch, groups):
+        import numpy as np
+        choice = self._table[entry][1]
+        if choice is None:
+            groups[branch] = rows
+            return
+        column, _, options, entries = choice
+        values = np.floor(matrix[rows, column])
+        selected = np.clip(values, 0, len(options) - 1).astype(int)
+        for option in np.unique(selected).tolist():
+            self._group_vectorized(matrix, rows[selected == option], entries[option],
+                                   branch + (option, ), groups)
+
+
 class SearchTree(object):
     """Tree structure to model a search space.
 
@@ -208,6 +371,7 @@ class SearchTree(object):
         self._content = [Node(k, v) for k, v in sorted(d.items())]
         self._vectordict = collections.OrderedDict()
         self._vectorcontent = collections.OrderedDict()
+        self._decoder = None
 
     @property
     def vectordict(self): return self._vectordict
@@ -249,9 +413,56 @@ class SearchTree(object):
                 else:
                     self.vectordict[key] = v
                     self.vectorcontent[key] = v
+            self._decoder = _CompiledDecoder(self.vectordict.keys(), self.vectorcontent)
 
         return dict([(k, v) for k, v in self.vectordict.items()])
 
+    def _compiled(self):
+        if self._decoder is None:
+            self.to_box()
+            if self._decoder is None: # empty search space
+                self._decoder = _CompiledDecoder([], self.vectorcontent)
+        return self._decoder
+
+    def columns(self):
+        """
+        Returns the keys of the vector representation, in the order in which
+        :func:`decode_batch` expects the columns of its input.
+
+        >>> SearchTree({'kernel': {'linear': None, 'rbf': {'gamma': [0, 3]}}}).columns()
+        ['kernel', 'kernel|rbf|gamma']
+
+        """
+        return list(self._compiled().columns)
+
+    def conditions(self):
+        """
+        Determines when each hyperparameter of the vector representation is active.
+
+        :returns: dict mapping every key of :func:`to_box` to a list of (choice key, option index) pairs,
+            all of which must hold for the hyperparameter to be active.
+
+        The option index of a choice is the integer part of its vector value.
+
+        >>> tree = SearchTree({'kernel': {'linear': None, 'rbf': {'gamma': [0, 3]}}, 'c': [0, 1]})
+        >>> c = tree.conditions()
+        >>> c['c'], c['kernel'], c['kernel|rbf|gamma']
+        ([], [], [('kernel', 1)])
+
+        """
+        self.to_box()
+        result = {}
+        for key in self.vectordict:
+            keylist = key.split(DELIM)
+            conditions = []
+            for i in range(1, len(keylist) - 1, 2):
+                prefix = DELIM.join(keylist[:i])
+                content = self.vectorcontent.get(prefix)
+                if type(content) is Options:
+                    conditions.append((prefix, content.cases.index(keylist[i])))
+            result[key] = conditions
+        return result
+
     def decode(self, vd):
         """
         Decodes a vector representation (as a dictionary) into a result dictionary.
@@ -264,6 +475,78 @@ class SearchTree(object):
         * Active hyperparameters have numeric values.
         * Inactive hyperparameters have value None.
 
+        Vector representations with all keys of :func:`to_box` are decoded with
+        a decision table that is compiled once, which only inspects the active choices.
+
+        The decision table yields the same results as decoding the sorted items:
+
+        >>> import random
+        >>> space = {'algorithm': {'k-nn': {'k': [1, 10]},
+        ...                        'SVM': {'kernel': {'linear': {'C': [0, 2]},
+        ...                                           'rbf': {'gamma': [0, 1], 'C': [0, 10]},
+        ...                                           'poly': {'degree': [2, 5], 'C': [0, 50]}}},
+        ...                        'naive-bayes': None},
+        ...          'x': {'a': None, 'b': {'y': [0, 1]}}}
+        >>> tree = SearchTree(space)
+        >>> box = tree.to_box()
+        >>> rng = random.Random(0)
+        >>> points = [dict((k, rng.uniform(v[0], 0.999 * v[1] + 0.001 * v[0])) for k, v in box.items())
+        ...           for _ in range(200)]
+        >>> all(tree.decode(p) == tree._decode_sorted(p) for p in points)
+        True
+
+        """
+        decoder = self._compiled()
+        if len(vd) == len(decoder.columns) and all(k in vd for k in decoder.columns):
+            return decoder.decode([vd[k] for k in decoder.columns])
+        return self._decode_sorted(vd)
+
+    def decode_batch(self, matrix, grouped=False):
+        """
+        Decodes a batch of vector representations.
+
+        :param matrix: vector representations as rows, with values in the order of :func:`columns`
+        :type matrix: list of lists or 2-D NumPy array
+        :param grouped: whether to group the rows by active branch
+        :type grouped: bool
+        :returns: a list with the decoded representation of every row, or if ``grouped``, a list of
+            (branch, row indices, decoded representations) per active branch, where the branch
+            is a dict of the choices that are made
+
+        >>> tree = SearchTree({'kernel': {'linear': None, 'rbf': {'gamma': [0, 3]}}})
+        >>> tree.columns()
+        ['kernel', 'kernel|rbf|gamma']
+        >>> tree.decode_batch([[0.5, 1.0], [1.5, 2.0]]) == [{'kernel': 'linear', 'gamma': None},
+        ...                                                  {'kernel': 'rbf', 'gamma': 2.0}]
+        True
+        >>> for branch, rows, decoded in tree.decode_batch([[1.2, 1.0], [0.5, 2.0], [1.7, 0.1]], grouped=True):
+        ...     print(branch, rows, [d['gamma'] for d in decoded])
+        {'kernel': 'rbf'} [0, 2] [1.0, 0.1]
+        {'kernel': 'linear'} [1] [None]
+
+        """
+        decoder = self._compiled()
+        rows = matrix.tolist() if hasattr(matrix, 'tolist') else matrix
+        if not grouped:
+            return [decoder.decode(row) for row in rows]
+
+        result = []
+        for branch, indices in decoder.group(matrix).items():
+            constants, columns = decoder.template(branch)
+            choices = dict((k, v) for k, v in constants.items() if v is not None)
+            decoded = []
+            for i in indices:
+                d = dict(constants)
+                for key, column in columns:
+                    d[key] = rows[i][column]
+                decoded.append(d)
+            result.append((choices, indices, decoded))
+        return result
+
+    def _decode_sorted(self, vd):
+        """Decodes a vector representation by walking through its sorted items.
+
+        This handles vector representations with any subset of the keys of :func:`to_box`.
         """
         result = {}
         currently_decoding_nested = []
@@ -30,43 +30,218 @@
 # NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+
+import math
+import functools
+
 from .solver_registry import register_solver
 from .util import Solver, _copydoc
-import functools
+from . import util
+from ..util import module_available
+
+# NumPy and SciPy are only imported once the solver is used
+_numpy_available = module_available('numpy')
+_scipy_available = module_available('scipy')
+
+
+def _solve_triangular(L, b, transpose=False):
+    """Solves L x = b (or L^T x = b) for lower triangular L in O(n^2) per right-hand side.
+
+    Uses SciPy when it is available and falls back to substitution in NumPy otherwise.
+
+    """
+    if _scipy_available:
+        import scipy.linalg
+        return scipy.linalg.solve_triangular(L, b, lower=True, trans=1 if transpose else 0,
+                                             check_finite=False)
+
+    import numpy as np
+    n = L.shape[0]
+    x = np.array(b, dtype=float)
+    if transpose:
+        for i in range(n - 1, -1, -1):
+            x[i] = (x[i] - L[i + 1:, i].dot(x[i + 1:])) / L[i, i]
+    else:
+        for i in range(n):
+            x[i] = (x[i] - L[i, :i].dot(x[:i])) / L[i, i]
+    return x
+
+
+def _matern52(A, B, lengthscale):
+    """Matern 5/2 kernel between the rows of A and B."""
+    import numpy as np
+    sqdist = (np.sum(A ** 2, axis=1)[:, None] + np.sum(B ** 2, axis=1)[None, :]
+              - 2 * A.dot(B.T))
+    r = math.sqrt(5.0) * np.sqrt(np.maximum(sqdist, 0.0)) / lengthscale
+    return (1.0 + r + r ** 2 / 3.0) * np.exp(-r)
 
-import random
 
-_numpy_available = True
-try:
+def _expected_improvement(mu, sd, best):
+    """Expected improvement over best for minimization."""
     import numpy as np
-except ImportError:
-    _numpy_available = False
+    z = (best - mu) / sd
+    if _scipy_available:
+        import scipy.special
+        cdf = scipy.special.ndtr(z)
+    else:
+        cdf = 0.5 * (1.0 + np.array([math.erf(v / math.sqrt(2.0)) for v in z]))
+    pdf = np.exp(-0.5 * z ** 2) / math.sqrt(2 * math.pi)
+    return (best - mu) * cdf + sd * pdf
+
+
+class _GaussianProcess(object):
+    """Gaussian process on the unit hypercube with a Matern 5/2 kernel.
+
+    The Cholesky factor of the kernel matrix and its inverse are stored in preallocated
+    buffers, so observations can be added in O(n^2) and removed from the end in O(1).
+    Predictions only require matrix products with the inverse factor.
+
+    Hyperparameters are learned by maximizing the marginal likelihood over a grid
+    of length scales and noise levels, which requires factorizing from scratch.
+
+    """
+
+    lengthscales = (0.05, 0.1, 0.2, 0.35, 0.5, 0.75, 1.0, 1.5)
+    noises = (1e-6, 1e-4, 1e-2)
+
+    def __init__(self, num_dimensions, capacity):
+        import numpy as np
+        self._X = np.empty((capacity, num_dimensions))
+        self._y = np.empty(capacity)
+        self._L = np.zeros((capacity, capacity))
+        self._Linv = np.zeros((capacity, capacity))
+        self._size = 0
+        self._alpha = None
+        self.lengthscale = 0.5
+        self.noise = 1e-6
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self):
+        return len(self._y)
+
+    @property
+    def X(self):
+        return self._X[:self._size]
+
+    @property
+    def y(self):
+        return self._y[:self._size]
+
+    @property
+    def L(self):
+        return self._L[:self._size, :self._size]
+
+    @property
+    def Linv(self):
+        return self._Linv[:self._size, :self._size]
+
+    def _standardized(self):
+        y = self.y
+        std = y.std()
+        return y.mean(), std if std > 0 else 1.0
+
+    def _factorize(self, X, y, lengthscale, noise):
+        """Computes the Cholesky factor and negative log marginal likelihood."""
+        import numpy as np
+        K = _matern52(X, X, lengthscale) + noise * np.eye(len(y))
+        try:
+            L = np.linalg.cholesky(K)
+        except np.linalg.LinAlgError:
+            return None, float('inf')
+        alpha = _solve_triangular(L, y)
+        return L, 0.5 * alpha.dot(alpha) + np.log(np.diag(L)).sum()
+
+    def fit(self, X, y, learn=True):
+        """Replaces all observations and refactorizes, optionally learning hyperparameters."""
+        import numpy as np
+        self._size = len(y)
+        self._alpha = None
+        self._X[:self._size] = X
+        self._y[:self._size] = y
+        mean, std = self._standardized()
+        ys = (self.y - mean) / std
+
+        if learn:
+            candidates = [(l, n) for l in self.lengthscales for n in self.noises]
+        else:
+            candidates = [(self.lengthscale, self.noise)]
+        best = None
+        for lengthscale, noise in candidates:
+            L, nll = self._factorize(self.X, ys, lengthscale, noise)
+            if L is not None and (best is None or nll < best[0]):
+                best = (nll, L, lengthscale, noise)
+        if best is None:
+            # fall back to a heavily regularized model
+            L, nll = self._factorize(self.X, ys, self.lengthscale, 1.0)
+            best = (nll, L, self.lengthscale, 1.0)
+        _, L, self.lengthscale, self.noise = best
+        self._L[:self._size, :self._size] = L
+        self._Linv[:self._size, :self._size] = _solve_triangular(L, np.eye(self._size))
+
+    def add(self, x, y):
+        """Adds an observation, extending the Cholesky factor in O(n^2)."""
+        n = self._size
+        k = _matern52(self.X, x[None, :], self.lengthscale)[:, 0]
+        l = self.Linv.dot(k)
+        d = math.sqrt(max(1.0 + self.noise - l.dot(l), self.noise))
+        self._X[n] = x
+        self._y[n] = y
+        self._L[n, :n] = l
+        self._L[n, n] = d
+        self._Linv[n, :n] = -l.dot(self.Linv) / d
+        self._Linv[n, n] = 1.0 / d
+        self._size += 1
+        self._alpha = None
+
+    def truncate(self, size):
+        """Removes the most recent observations, keeping the first size."""
+        self._size = size
+        self._alpha = None
+
+    def predict(self, X):
+        """Posterior mean and standard deviation in each row of X."""
+        import numpy as np
+        mean, std = self._standardized()
+        Linv = self.Linv
+        if self._alpha is None:
+            self._alpha = Linv.T.dot(Linv.dot((self.y - mean) / std))
+        Ks = _matern52(X, self.X, self.lengthscale)
+        v = Linv.dot(Ks.T)
+        var = np.maximum(1.0 - np.sum(v ** 2, axis=0), 1e-12)
+        return mean + std * Ks.dot(self._alpha), std * np.sqrt(var)
 
-_bayesopt_available = True
-try:
-    import bayesopt
-except ImportError:
-    _bayesopt_available = False
 
 class BayesOpt(Solver):
     """
     .. include:: /global.rst
 
-    This solver provides an interface to BayesOpt, as described in [BO2014]_.
-    This solver uses BayesOpt in the back-end and exposes its solver with uniform priors.
+    This solver implements Bayesian optimization with a Gaussian process surrogate model
+    and expected improvement as acquisition function [BO2012]_.
 
     Please refer to |bayesopt| for details about this algorithm.
 
-    .. note::
+    Observations are added to the model through rank-one extensions of its Cholesky factor.
+    Batches of candidates are proposed via the kriging believer or constant liar heuristics [BO2010]_
+    and evaluated through ``pmap``. :func:`optunity.maximize` and :func:`optunity.minimize`
+    choose the batch size based on the number of evaluations. The model is capped to a subset of the evaluations for long runs.
 
-        This solver will always output some text upon running.
-        This is caused internally by BayesOpt, which provides no way to disable all output.
+    .. [BO2012] Snoek, Jasper, Hugo Larochelle, and Ryan P. Adams. "Practical Bayesian optimization of machine learning algorithms." Advances in Neural Information Processing Systems. 2012.
 
-    .. [BO2014] Martinez-Cantin, Ruben. "BayesOpt: A Bayesian optimization library for nonlinear optimization, experimental design and bandits." The Journal of Machine Learning Research 15.1 (2014): 3735-3739.
+    .. [BO2010] Ginsbourger, David, Rodolphe Le Riche, and Laurent Carraro. "Kriging is well-suited to parallelize optimization." Computational Intelligence in Expensive Optimization Problems. Springer, 2010. 131-162.
+
+    .. warning:: This solver has a dependency on NumPy_
+        and will be unavailable if it is not met. SciPy_ is used when available.
+
+        .. _NumPy: http://www.numpy.org
+        .. _SciPy: http://www.scipy.org
 
     """
 
-    def __init__(self, num_evals=100, seed=None, **kwargs):
+    def __init__(self, num_evals=100, seed=None, batch_size=1, batch_strategy='believer',
+                 num_startup=None, max_model_size=500, relearn_interval=10, **kwargs):
         """
 
         Initialize the BayesOpt solver.
@@ -74,40 +249,50 @@ class BayesOpt(Solver):
         :param num_evals: number of permitted function evaluations
         :type num_evals: int
         :param seed: the random seed to be used
-        :type seed: double
+        :type seed: int or None
+        :param batch_size: number of candidates proposed (and evaluated in parallel) per step
+        :type batch_size: int
+        :param batch_strategy: 'believer' (pending candidates take their predicted value)
+            or 'liar' (pending candidates take the worst observed value)
+        :type batch_strategy: str
+        :param num_startup: number of initial random evaluations, defaults to max(5, d + 1)
+        :type num_startup: int or None
+        :param max_model_size: maximum number of observations in the model
+        :type max_model_size: int
+        :param relearn_interval: number of evaluations between hyperparameter updates
+        :type relearn_interval: int
         :param kwargs: box constraints for each hyperparameter
         :type kwargs: {'name': [lb, ub], ...}
 
-
         """
-        if not _bayesopt_available:
-            raise ImportError('This solver requires bayesopt but it is missing.')
         if not _numpy_available:
             raise ImportError('This solver requires NumPy but it is missing.')
+        if batch_strategy not in ('believer', 'liar'):
+            raise ValueError('Unknown batch strategy: ' + str(batch_strategy))
 
         self._seed = seed
         self._bounds = kwargs
         self._num_evals = num_evals
-        # bayesopt does not support open intervals,
-        # while optunity uses open intervals
-        # so we manually shrink the bounding box slightly (yes, this is a dirty fix)
-        delta = 0.001
-        self._lb = np.array(map(lambda x: float(x[1][0] + delta * (x[1][1] - x[1][0])),
-                                sorted(kwargs.items())))
-        self._ub = np.array(map(lambda x: float(x[1][1] - delta * (x[1][1] - x[1][0])),
-                                sorted(kwargs.items())))
+        self._batch_size = batch_size
+        self._batch_strategy = batch_strategy
+        self._num_startup = num_startup or max(5, len(kwargs) + 1)
+        self._max_model_size = max_model_size
+        self._relearn_interval = relearn_interval
 
     @staticmethod
     def suggest_from_box(num_evals, **kwargs):
         """
         Verify that we can effectively make a solver from box.
 
-        >>> s = BayesOpt.suggest_from_box(30, x=[0, 1], y=[-1, 0], z=[-1, 1])
+        >>> s = BayesOpt.suggest_from_box(100, x=[0, 1], y=[-1, 0], z=[-1, 1])
+        >>> s['num_evals'], s['batch_size']
+        (100, 4)
         >>> solver = BayesOpt(**s) #doctest:+SKIP
 
         """
         d = dict(kwargs)
         d['num_evals'] = num_evals
+        d['batch_size'] = util.suggest_batch_size(num_evals)
         return d
 
     @property
@@ -118,49 +303,145 @@ class BayesOpt(Solver):
     def bounds(self):
         return self._bounds
 
-    @property
-    def lb(self):
-        return self._lb
-
-    @property
-    def ub(self):
-        return self._ub
-
     @property
     def num_evals(self):
         return self._num_evals
 
-    @_copydoc(Solver.optimize)
-    def optimize(self, f, maximize=True, pmap=map):
-
-        seed = self.seed if self.seed else random.randint(0, 9999)
-        params = {'n_iterations': self.num_evals,
-                  'random_seed': seed,
-                  'n_iter_relearn': 3,
-                  'verbose_level': 0}
-        n_dimensions = len(self.lb)
+    @property
+    def batch_size(self):
+        """Number of candidates per batch."""
+        return self._batch_size
 
-        print('lb %s' % str(self.lb))
-        print('ub %s' % str(self.ub))
+    @property
+    def batch_strategy(self):
+        """Batch strategy, 'believer' or 'liar'."""
+        return self._batch_strategy
 
-        if maximize:
-            def obj(args):
-                kwargs = dict([(k, v) for k, v in zip(sorted(self.bounds.keys()), args)])
-                return -f(**kwargs)
+    @property
+    def num_startup(self):
+        return self._num_startup
 
-        else:
-            def obj(args):
-                kwargs = dict([(k, v) for k, v in zip(sorted(self.bounds.keys()), args)])
-                return f(**kwargs)
+    @property
+    def max_model_size(self):
+        """Maximum number of observations in the surrogate model."""
+        return self._max_model_size
 
-        mvalue, x_out, error = bayesopt.optimize(obj, n_dimensions,
-                                                 self.lb, self.ub, params)
-        best = dict([(k, v) for k, v in zip(sorted(self.bounds.keys()), x_out)])
-        return best, None
+    @property
+    def relearn_interval(self):
+        return self._relearn_interval
 
+    def _subset(self, rng, X, y, size):
+        """Selects the observations used in the model once it is full:
+        the best half of size and a random sample of the rest.
+        """
+        import numpy as np
+        order = np.argsort(y)
+        num_best = size // 2
+        rest = rng.choice(order[num_best:], size=size - num_best, replace=False)
+        selected = np.concatenate([order[:num_best], rest])
+        return X[selected], y[selected]
+
+    def _maximize_ei(self, rng, gp, best, num_random=2000, num_starts=10, num_steps=30):
+        """Maximizes expected improvement via vectorized multistart local search."""
+        import numpy as np
+        d = gp.X.shape[1]
+        eps = 1e-6
+        incumbents = gp.X[np.argsort(gp.y)[:num_starts]]
+        local = incumbents + 0.05 * rng.standard_normal(incumbents.shape)
+        candidates = np.clip(np.vstack([rng.uniform(size=(num_random, d)), local]), eps, 1 - eps)
+        mu, sd = gp.predict(candidates)
+        ei = _expected_improvement(mu, sd, best)
+
+        top = np.argsort(-ei)[:num_starts]
+        starts, values = candidates[top], ei[top]
+        steps = np.full(len(starts), 0.1)
+        for _ in range(num_steps):
+            proposals = np.clip(starts + steps[:, None] * rng.standard_normal(starts.shape),
+                                eps, 1 - eps)
+            mu, sd = gp.predict(proposals)
+            proposed = _expected_improvement(mu, sd, best)
+            improved = proposed > values
+            starts[improved], values[improved] = proposals[improved], proposed[improved]
+            steps = np.where(improved, steps * 1.5, steps * 0.6)
+        return starts[np.argmax(values)]
 
-# BayesOpt is a simple wrapper around bayesopt's BayesOpt solver
-if _bayesopt_available and _numpy_available:
-    BayesOpt = register_solver('BayesOpt', 'Tree of Parzen estimators',
-                               ['BayesOpt: Tree of Parzen Estimators']
-                               )(BayesOpt)
+    @_copydoc(Solver.optimize)
+    def optimize(self, f, maximize=True, pmap=map):
+        import numpy as np
+
+        names = list(self.bounds.keys())
+        lb = np.array([float(self.bounds[k][0]) for k in names])
+        width = np.array([float(self.bounds[k][1]) for k in names]) - lb
+        rng = np.random.RandomState(self.seed)
+
+        @functools.wraps(f)
+        def evaluate(args):
+            return util.score(f(**dict(zip(names, args))))
+
+        # all observations, on the unit hypercube and as minimization
+        X = np.empty((0, len(names)))
+        y = np.empty(0)
+
+        gp = _GaussianProcess(len(names), self.max_model_size)
+        since_fit = 0
+        num_evals = 0
+        while num_evals < self.num_evals:
+            batch_size = min(self.batch_size, self.num_evals - num_evals)
+            if len(y) < self.num_startup:
+                batch = rng.uniform(1e-6, 1 - 1e-6, size=(batch_size, len(names)))
+            else:
+                if not len(gp) or since_fit >= self.relearn_interval:
+                    if len(y) > self.max_model_size:
+                        # subset of data approximation for long runs
+                        gp.fit(*self._subset(rng, X, y, 3 * self.max_model_size // 4))
+                    else:
+                        gp.fit(X, y)
+                    since_fit = 0
+
+                size = len(gp)
+                batch = np.empty((batch_size, len(names)))
+                for i in range(batch_size):
+                    batch[i] = self._maximize_ei(rng, gp, y.min())
+                    if i + 1 < batch_size and len(gp) < gp.capacity:
+                        if self.batch_strategy == 'believer':
+                            fantasy = gp.predict(batch[i:i + 1])[0][0]
+                        else:
+                            fantasy = y.max()
+                        gp.add(batch[i], fantasy)
+                gp.truncate(size)
+
+            scores = list(pmap(evaluate, (lb + batch * width).tolist()))
+            values = -np.array(scores, dtype=float) if maximize else np.array(scores, dtype=float)
+            for x, value in zip(batch, values):
+                X, y = np.vstack([X, x]), np.append(y, value)
+                if len(gp) and len(gp) < gp.capacity:
+                    gp.add(x, value)
+                else:
+                    since_fit = self.relearn_interval
+            since_fit += len(scores)
+            num_evals += len(scores)
+            if len(scores) < batch_size:
+                # evaluations ran out
+                break
+
+        if not len(y):
+            return dict([(k, float(l + 0.5 * w)) for k, l, w in zip(names, lb, width)]), None
+        best = lb + X[np.argmin(y)] * width
+        return dict([(k, float(v)) for k, v in zip(names, best)]), None
+
+
+if _numpy_available:
+    BayesOpt = register_solver('BayesOpt', 'Bayesian optimization with Gaussian processes',
+                               ['BayesOpt: Bayesian optimization with Gaussian processes',
+                                ' ',
+                                'This method requires the following parameters:',
+                                '- num_evals :: number of permitted function evaluations',
+                                '- seed :: (optional) seed for the random number generator',
+                                '- batch_size :: (optional) candidates evaluated in parallel per step, default 1',
+                                '- batch_strategy :: (optional) believer or liar, default believer',
+                                '- max_model_size :: (optional) maximum number of observations in the model, default 500',
+                                '- box constraints via key words: constraints are lists [lb, ub]',
+                                ' ',
+                                'The surrogate model is a Gaussian process with Matern 5/2 kernel',
+                                'and candidates are chosen by maximizing expected improvement.'
+                                ])(BayesOpt)
@@ -30,34 +30,118 @@
 # NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+
 import math
 import functools
 
 from .solver_registry import register_solver
 from .util import Solver, _copydoc
 from . import util
+from ..util import module_available
+
+# NumPy is only imported once the solver is used
+_numpy_available = module_available('numpy')
+
+
+def _default_lambda(num_dimensions):
+    """Default population size of CMA-ES."""
+    return 4 + int(3 * math.log(max(num_dimensions, 1)))
+
+
+def _cma_run(evaluate, mean, sigma, lambda_, budget, lower, upper, rng):
+    """Runs CMA-ES until it converges or the budget is exhausted.
 
-_numpy_available = True
-try:
+    :param evaluate: evaluates a population (one row per candidate),
+        returns the fitness of each candidate (lower is better)
+    :param mean: initial mean
+    :param sigma: initial step size
+    :param lambda_: population size
+    :param budget: maximum number of evaluations
+    :param lower: lower bound per dimension (may be -inf)
+    :param upper: upper bound per dimension (may be inf)
+    :param rng: NumPy random state
+    :returns: the number of evaluations used and whether the run converged
+
+    This follows Hansen's reference formulation, the eigendecomposition of the
+    covariance matrix is only updated once every few generations.
+
+    """
     import numpy as np
-except ImportError:
-    _numpy_available = False
-
-_deap_available = True
-try:
-    import deap
-    import deap.creator
-    import deap.base
-    import deap.tools
-    import deap.cma
-    import deap.algorithms
-except ImportError:
-    _deap_available = False
-except TypeError:
-    # this can happen because DEAP is in Python 2
-    # install needs to take proper care of converting
-    # 2 to 3 when necessary
-    _deap_available = False
+
+    n = len(mean)
+    mean = np.array(mean, dtype=float)
+
+    # selection and recombination
+    mu = lambda_ // 2
+    weights = math.log(mu + 0.5) - np.log(np.arange(1, mu + 1))
+    weights /= weights.sum()
+    mueff = 1.0 / np.sum(weights ** 2)
+
+    # adaptation
+    cc = (4.0 + mueff / n) / (n + 4.0 + 2.0 * mueff / n)
+    cs = (mueff + 2.0) / (n + mueff + 5.0)
+    c1 = 2.0 / ((n + 1.3) ** 2 + mueff)
+    cmu = min(1.0 - c1, 2.0 * (mueff - 2.0 + 1.0 / mueff) / ((n + 2.0) ** 2 + mueff))
+    damps = 1.0 + 2.0 * max(0.0, math.sqrt((mueff - 1.0) / (n + 1.0)) - 1.0) + cs
+    chin = math.sqrt(n) * (1.0 - 1.0 / (4.0 * n) + 1.0 / (21.0 * n ** 2))
+    eigen_interval = lambda_ / (c1 + cmu) / n / 10.0
+
+    pc = np.zeros(n)
+    ps = np.zeros(n)
+    B = np.eye(n)
+    D = np.ones(n)
+    C = np.eye(n)
+    invsqrtC = np.eye(n)
+
+    history = []
+    history_length = 10 + int(math.ceil(30.0 * n / lambda_))
+    evals = eigen_evals = 0
+    while evals + lambda_ <= budget:
+        z = rng.standard_normal((lambda_, n))
+        x = np.clip(mean + sigma * (z * D).dot(B.T), lower, upper)
+        fitness = evaluate(x)
+        evals += len(fitness)
+        if len(fitness) < lambda_:
+            # evaluations ran out
+            return evals, False
+
+        order = np.argsort(fitness)
+        selected = x[order[:mu]]
+        old_mean = mean
+        mean = weights.dot(selected)
+
+        # cumulation
+        ymean = (mean - old_mean) / sigma
+        ps = (1.0 - cs) * ps + math.sqrt(cs * (2.0 - cs) * mueff) * invsqrtC.dot(ymean)
+        hsig = (np.linalg.norm(ps) / math.sqrt(1.0 - (1.0 - cs) ** (2.0 * evals / lambda_))
+                / chin) < 1.4 + 2.0 / (n + 1.0)
+        pc = (1.0 - cc) * pc + hsig * math.sqrt(cc * (2.0 - cc) * mueff) * ymean
+
+        # covariance matrix and step size
+        steps = (selected - old_mean) / sigma
+        C = ((1.0 - c1 - cmu) * C
+             + c1 * (np.outer(pc, pc) + (1.0 - hsig) * cc * (2.0 - cc) * C)
+             + cmu * steps.T.dot(weights[:, None] * steps))
+        sigma *= math.exp((cs / damps) * (np.linalg.norm(ps) / chin - 1.0))
+
+        if evals - eigen_evals > eigen_interval:
+            eigen_evals = evals
+            C = np.triu(C) + np.triu(C, 1).T
+            eigenvalues, B = np.linalg.eigh(C)
+            D = np.sqrt(np.maximum(eigenvalues, 1e-300))
+            invsqrtC = (B / D).dot(B.T)
+
+        # termination criteria
+        history.append(fitness[order[0]])
+        recent = history[-history_length:]
+        if not np.isfinite(sigma) or sigma * max(D.max(), np.abs(pc).max()) < 1e-11:
+            return evals, True
+        if D.max() > 1e7 * D.min():
+            return evals, True
+        if len(history) >= history_length and max(recent) - min(recent) < 1e-12 \
+                and fitness[order[-1]] - fitness[order[0]] < 1e-12:
+            return evals, True
+    return evals, False
 
 
 class CMA_ES(Solver):
@@ -66,36 +150,62 @@ class CMA_ES(Solver):
 
     Please refer to |cmaes| for details about this algorithm.
 
-    This solver uses an implementation available in the DEAP library [DEAP2012]_.
+    This is a native implementation of CMA-ES [HANSEN2001]_, optionally restarted with
+    increasing population sizes (IPOP) [AUGER2005]_ or alternating large and small
+    populations (BIPOP) [HANSEN2009]_. Every generation is evaluated as a single batch
+    through ``pmap``.
 
-    .. warning:: This solver has dependencies on DEAP_ and NumPy_
-        and will be unavailable if these are not met.
+    .. warning:: This solver has a dependency on NumPy_
+        and will be unavailable if it is not met.
 
-        .. _DEAP: https://code.google.com/p/deap/
         .. _NumPy: http://www.numpy.org
 
     """
 
-    def __init__(self, num_generations, sigma=1.0, Lambda=None, **kwargs):
-        """blah
+    def __init__(self, num_generations, sigma=1.0, Lambda=None, restarts=0,
+                 restart_strategy='ipop', seed=None, **kwargs):
+        """Initializes a CMA-ES solver.
+
+        :param num_generations: number of generations, the solver uses at most
+            num_generations times the initial population size evaluations
+        :type num_generations: int
+        :param sigma: initial step size (relative to the box for box-constrained hyperparameters)
+        :type sigma: float
+        :param Lambda: initial population size, defaults to 4 + 3 log(n)
+        :type Lambda: int or None
+        :param restarts: maximum number of restarts after convergence
+        :type restarts: int
+        :param restart_strategy: 'ipop' or 'bipop'
+        :type restart_strategy: str
+        :param seed: seed for the random number generator
+        :type seed: int or None
+        :param kwargs: starting point or box constraints for each hyperparameter
+        :type kwargs: {'name': x0, ...} or {'name': [lb, ub], ...}
+
+        Hyperparameters with box constraints are normalized to the unit interval,
+        start in the middle of their box and are kept within it. Restarts
+        begin at a random point in the box.
 
-        .. warning:: |warning-unconstrained|
+        .. warning:: |warning-unconstrained| (for hyperparameters with a starting point)
 
         """
-        if not _deap_available:
-            raise ImportError('This solver requires DEAP but it is missing.')
         if not _numpy_available:
             raise ImportError('This solver requires NumPy but it is missing.')
+        if restart_strategy not in ('ipop', 'bipop'):
+            raise ValueError('Unknown restart strategy: ' + str(restart_strategy))
 
         self._num_generations = num_generations
         self._start = kwargs
         self._sigma = sigma
         self._lambda = Lambda
+        self._restarts = restarts
+        self._restart_strategy = restart_strategy
+        self._seed = seed
 
     @staticmethod
     def suggest_from_seed(num_evals, **kwargs):
         """Verify that we can effectively make a solver.
-        The doctest has to be skipped from automated builds, because DEAP may not be available
+        The doctest has to be skipped from automated builds, because NumPy may not be available
         and yet we want documentation to be generated.
 
         >>> s = CMA_ES.suggest_from_seed(30, x=1.0, y=-1.0, z=2.0)
@@ -109,13 +219,35 @@ class CMA_ES(Solver):
         # this will require slightly more function evaluations than permitted by num_evals
         return d
 
+    @staticmethod
+    def suggest_from_box(num_evals, **kwargs):
+        """Create a configuration for a CMA-ES solver within the given box, with BIPOP restarts.
+
+        :param num_evals: number of permitted function evaluations
+        :type num_evals: int
+        :param kwargs: box constraints
+        :type kwargs: {'param': [lb, ub], ...}
+
+        >>> s = CMA_ES.suggest_from_box(30, x=[0, 1], y=[-1, 0], z=[-1, 1])
+        >>> s['num_generations'], s['sigma']
+        (4, 0.3)
+        >>> solver = CMA_ES(**s) #doctest:+SKIP
+
+        """
+        d = dict(kwargs)
+        d['num_generations'] = max(1, num_evals // _default_lambda(len(kwargs)))
+        d['sigma'] = 0.3
+        d['restarts'] = 9
+        d['restart_strategy'] = 'bipop'
+        return d
+
     @property
     def num_generations(self):
         return self._num_generations
 
     @property
     def start(self):
-        """Returns the starting point for CMA-ES."""
+        """Returns the starting point (or box) for CMA-ES."""
         return self._start
 
     @property
@@ -126,56 +258,100 @@ class CMA_ES(Solver):
     def sigma(self):
         return self._sigma
 
+    @property
+    def restarts(self):
+        """Maximum number of restarts."""
+        return self._restarts
+
+    @property
+    def restart_strategy(self):
+        """Restart strategy, 'ipop' or 'bipop'."""
+        return self._restart_strategy
+
+    @property
+    def seed(self):
+        return self._seed
+
     @_copydoc(Solver.optimize)
     def optimize(self, f, maximize=True, pmap=map):
-        toolbox = deap.base.Toolbox()
-        if maximize:
-            fit = 1.0
-        else:
-            fit = -1.0
-        deap.creator.create("FitnessMax", deap.base.Fitness,
-                            weights=(fit,))
-        Fit = deap.creator.FitnessMax
-        deap.creator.create("Individual", list,
-                            fitness=Fit)
-        Individual = deap.creator.Individual
-
-        if self.lambda_:
-            strategy = deap.cma.Strategy(centroid=list(self.start.values()),
-                                            sigma=self.sigma, lambda_=self.lambda_)
-        else:
-            strategy = deap.cma.Strategy(centroid=list(self.start.values()),
-                                            sigma=self.sigma)
-        toolbox.register("generate", strategy.generate, Individual)
-        toolbox.register("update", strategy.update)
+        import numpy as np
+
+        names = list(self.start.keys())
+        values = [self.start[name] for name in names]
+        boxed = np.array([isinstance(v, (list, tuple)) for v in values])
+        n = len(names)
+
+        # internal coordinates: the unit interval for boxes,
+        # offsets to the starting point otherwise
+        offset = np.array([v[0] if box else v for v, box in zip(values, boxed)], dtype=float)
+        scale = np.array([v[1] - v[0] if box else 1.0 for v, box in zip(values, boxed)],
+                         dtype=float)
+        lower = np.where(boxed, 0.0, -np.inf)
+        upper = np.where(boxed, 1.0, np.inf)
+        initial_mean = np.where(boxed, 0.5, 0.0)
 
         @functools.wraps(f)
-        def evaluate(individual):
-            return (util.score(f(**dict([(k, v)
-                                for k, v in zip(self.start.keys(),
-                                                individual)]))),)
-        toolbox.register("evaluate", evaluate)
-        toolbox.register("map", pmap)
-
-        hof = deap.tools.HallOfFame(1)
-        deap.algorithms.eaGenerateUpdate(toolbox=toolbox,
-                                            ngen=self._num_generations,
-                                            halloffame=hof, verbose=False)
-
-        return dict([(k, v)
-                        for k, v in zip(self.start.keys(), hof[0])]), None
-
-# CMA_ES solver requires deap > 1.0.1
-# http://deap.readthedocs.org/en/latest/examples/cmaes.html
-if _deap_available and _numpy_available:
+        def evaluate(args):
+            return util.score(f(**dict(zip(names, args))))
+
+        best = {'x': offset + initial_mean * scale, 'fitness': float('inf')}
+
+        def evaluate_population(population):
+            points = offset + population * scale
+            fitness = np.array(list(pmap(evaluate, points.tolist())), dtype=float)
+            if maximize:
+                fitness = -fitness
+            if len(fitness):
+                idx = int(np.argmin(fitness))
+                if fitness[idx] < best['fitness']:
+                    best['x'], best['fitness'] = points[idx], fitness[idx]
+            return fitness
+
+        rng = np.random.RandomState(self.seed)
+        default_lambda = self.lambda_ or _default_lambda(n)
+        budget = self.num_generations * default_lambda
+
+        mean, sigma, lambda_ = initial_mean, self.sigma, default_lambda
+        large_lambda, large_evals, small_evals, small = default_lambda, 0, 0, False
+        used = 0
+        for restart in range(self.restarts + 1):
+            evals, converged = _cma_run(evaluate_population, mean, sigma, lambda_,
+                                        budget - used, lower, upper, rng)
+            used += evals
+            if small:
+                small_evals += evals
+            else:
+                large_evals += evals
+            if not converged:
+                break
+
+            # BIPOP alternates with small populations while they used fewer evaluations
+            small = self.restart_strategy == 'bipop' and small_evals < large_evals
+            if small:
+                u = rng.uniform()
+                lambda_ = max(2, int(default_lambda * (0.5 * large_lambda / default_lambda) ** (u ** 2)))
+                sigma = self.sigma * 10 ** (-2 * u)
+            else:
+                large_lambda *= 2
+                lambda_ = large_lambda
+                sigma = self.sigma
+            mean = np.where(boxed, rng.uniform(size=n), initial_mean)
+
+        return dict([(k, float(v)) for k, v in zip(names, best['x'])]), None
+
+
+if _numpy_available:
     CMA_ES = register_solver('cma-es', 'covariance matrix adaptation evolutionary strategy',
                         ['CMA-ES: covariance matrix adaptation evolutionary strategy',
                         ' ',
                         'This method requires the following parameters:',
                         '- num_generations :: number of generations to use',
                         '- sigma :: (optional) initial covariance, default 1',
-                        '- Lambda :: (optional) measure of reproducibility',
-                        '- starting point: through kwargs'
+                        '- Lambda :: (optional) initial population size',
+                        '- restarts :: (optional) maximum number of restarts, default 0',
+                        '- restart_strategy :: (optional) ipop or bipop, default ipop',
+                        '- seed :: (optional) seed for the random number generator',
+                        '- starting point or box constraints: through kwargs',
                         ' ',
                         'This method is described in detail in:',
                         'Hansen and Ostermeier, 2001. Completely Derandomized Self-Adaptation in Evolution Strategies. Evolutionary Computation'
@@ -0,0 +1,314 @@
+#! /usr/bin/env python
+
+# Copyright (c) 2014 KU Leuven, ESAT-STADIUS
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# 3. Neither name of copyright holders nor the names of its contributors
+# may be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# ``AS IS'' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED.  IN NO EVENT SHALL THE REGENTS OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import math
+import operator as op
+import random
+import functools
+
+from .. import functions as fun
+from .. import parallel
+from .solver_registry import register_solver
+from .util import Solver, _copydoc, shrink_bounds
+from . import util
+
+
+@register_solver('hyperband',
+                 'successive halving of configurations evaluated with growing resources',
+                 ['Samples configurations uniformly within box constraints and evaluates them',
+                  'with a small resource (e.g. number of epochs or subsample size).',
+                  'The best fraction 1/eta of every rung is promoted to the next rung, which',
+                  'has eta times the resource, until max_resource is reached.',
+                  ' ',
+                  'This function requires the following arguments:',
+                  '- num_evals :: number of function evaluations, across all rungs',
+                  '- box constraints via keywords: constraints are lists [lb, ub]',
+                  ' ',
+                  'This function accepts the following optional arguments:',
+                  '- resource_name :: the keyword via which the resource is passed to the objective function',
+                  '- max_resource :: the resource of the final rung',
+                  '- min_resource :: lower bound on the resource of the first rung',
+                  '- eta :: the factor by which rungs are reduced and resources grow (default 3)',
+                  '- num_brackets :: number of brackets to cycle through, 1 yields successive halving',
+                  '- asynchronous :: promote configurations asynchronously (ASHA) with a pool of workers',
+                  '- num_workers :: the number of asynchronous workers (defaults to the number of CPUs)',
+                  ' ',
+                  'This solver implements the techniques described here:',
+                  'Li, Lisha, et al. Hyperband: A novel bandit-based approach to hyperparameter optimization. Journal of Machine Learning Research 18 (2018): 1-52.',
+                  'Li, Liam, et al. A system for massively parallel hyperparameter tuning. Proceedings of Machine Learning and Systems 2 (2020): 230-246.']
+                 )
+class Hyperband(Solver):
+    """
+    .. include:: /global.rst
+
+    Please refer to |hyperband| for details on this algorithm.
+
+    """
+
+    def __init__(self, num_evals, resource_name=None, max_resource=1, min_resource=1,
+                 eta=3, num_brackets=None, asynchronous=False, num_workers=None,
+                 seed=None, **kwargs):
+        """Initializes the solver with bounds and a number of allowed evaluations.
+
+        :param num_evals: number of function evaluations, across all rungs
+        :type num_evals: int
+        :param resource_name: keyword via which the resource is passed to the objective function,
+            if None the objective function is always evaluated with full resources
+        :type resource_name: str or None
+        :param max_resource: the resource of the final rung
+        :type max_resource: int or float
+        :param min_resource: lower bound on the resource of the first rung
+        :type min_resource: int or float
+        :param eta: the factor by which rungs are reduced and resources grow
+        :type eta: int
+        :param num_brackets: number of brackets, None to use all brackets of Hyperband, 1 for successive halving
+        :type num_brackets: int or None
+        :param asynchronous: promote configurations asynchronously (ASHA) rather than per rung
+        :type asynchronous: bool
+        :param num_workers: the number of worker processes in asynchronous mode, defaults to the number of CPUs
+        :type num_workers: int or None
+        :param seed: seed for the random number generator
+        :type seed: int or None
+        :param kwargs: box constraints for each hyperparameter
+        :type kwargs: {'name': [lb, ub], ...}
+
+        Resources are integers if both ``min_resource`` and ``max_resource`` are.
+
+        >>> s = Hyperband(num_evals=100, resource_name='epochs', max_resource=81, x=[0, 1])
+        >>> s.resources
+        [1, 3, 9, 27, 81]
+        >>> s.brackets
+        [4, 3, 2, 1, 0]
+
+        """
+        assert all([len(v) == 2 and v[0] <= v[1]
+                    for v in kwargs.values()]), 'kwargs.values() are not [lb, ub] pairs'
+        assert eta > 1, 'eta must be larger than 1'
+        assert 0 < min_resource <= max_resource, 'resources must satisfy 0 < min_resource <= max_resource'
+        self._bounds = kwargs
+        self._num_evals = num_evals
+        self._resource_name = resource_name
+        self._max_resource = max_resource
+        self._min_resource = min_resource
+        self._eta = eta
+        self._num_brackets = num_brackets
+        self._asynchronous = asynchronous
+        self._num_workers = num_workers
+        self._seed = seed
+
+    @staticmethod
+    def suggest_from_box(num_evals, **kwargs):
+        """Creates a Hyperband solver that uses ``num_evals`` evaluations
+        within given bounds (lb, ub). The bounds are first tightened, resulting in
+        new bounds covering 99% of the area.
+
+        Objective functions in the simple API do not accept a resource, so the
+        suggested solver evaluates all configurations with full resources.
+
+        >>> s = Hyperband.suggest_from_box(30, x=[0, 1], y=[-1, 0])
+        >>> s['num_evals']
+        30
+        >>> solver = Hyperband(**s)
+
+        """
+        d = shrink_bounds(kwargs)
+        d['num_evals'] = num_evals
+        return d
+
+    @property
+    def bounds(self): return self._bounds
+
+    @property
+    def num_evals(self): return self._num_evals
+
+    @property
+    def resource_name(self): return self._resource_name
+
+    @property
+    def max_resource(self): return self._max_resource
+
+    @property
+    def min_resource(self): return self._min_resource
+
+    @property
+    def eta(self): return self._eta
+
+    @property
+    def num_brackets(self): return self._num_brackets
+
+    @property
+    def asynchronous(self): return self._asynchronous
+
+    @property
+    def num_workers(self): return self._num_workers
+
+    @property
+    def seed(self): return self._seed
+
+    @property
+    def resources(self):
+        """The resource of every rung, in increasing order."""
+        if self.resource_name is None:
+            return [self.max_resource]
+        num_rungs = 1
+        while self.max_resource * self.eta ** -num_rungs >= self.min_resource * (1 - 1e-9):
+            num_rungs += 1
+        integral = all(isinstance(r, int) for r in (self.min_resource, self.max_resource))
+        resources = []
+        for k in range(num_rungs - 1, -1, -1):
+            r = self.max_resource * float(self.eta) ** -k
+            if integral:
+                r = max(self.min_resource, int(round(r)))
+            resources.append(r)
+        return resources
+
+    @property
+    def brackets(self):
+        """The number of halvings of every bracket, in the order in which they are run."""
+        s_max = len(self.resources) - 1
+        num_brackets = min(self.num_brackets or s_max + 1, s_max + 1)
+        return list(range(s_max, s_max - num_brackets, -1))
+
+    def _bracket_sizes(self):
+        """Returns the number of configurations in the first rung of every bracket.
+
+        Bracket sizes follow Hyperband, scaled up so that a round of all brackets
+        uses at most ``num_evals`` evaluations when the budget allows it.
+        """
+        s_max = len(self.resources) - 1
+        sizes = [int(math.ceil(float(s_max + 1) / (s + 1) * self.eta ** s)) for s in self.brackets]
+        cost = sum(sum(max(1, n // self.eta ** i) for i in range(s + 1))
+                   for n, s in zip(sizes, self.brackets))
+        scale = max(1, self.num_evals // cost)
+        return [n * scale for n in sizes]
+
+    def _sample(self, rng):
+        return tuple(rng.uniform(lb, ub) for lb, ub in self.bounds.values())
+
+    def _successive_halving(self, evaluate, rng, maximize, pmap, record):
+        """Runs all brackets, with the evaluations of every rung through ``pmap``."""
+        resources = self.resources
+        num_evals = 0
+        while True:
+            for n, s in zip(self._bracket_sizes(), self.brackets):
+                configs = [self._sample(rng) for _ in range(n)]
+                for i in range(s + 1):
+                    k = len(resources) - 1 - s + i
+                    configs = configs[:self.num_evals - num_evals]
+                    values = list(pmap(evaluate, [(c, resources[k]) for c in configs]))
+                    num_evals += len(values)
+                    rung = fun.CallLog()
+                    for config, value in zip(configs, values):
+                        rung.insert(util.score(value), *config)
+                        record(k, config, util.score(value))
+                    if len(values) < len(configs) or num_evals >= self.num_evals:
+                        return
+                    # promote the best configurations to the next rung
+                    ranked = sorted(rung.items(), key=op.itemgetter(1), reverse=maximize)
+                    configs = [self._config(args) for args, _ in
+                               ranked[:max(1, n // self.eta ** (i + 1))]]
+
+    def _asha(self, evaluate, rng, maximize, budget, record, worker_pool):
+        """Asynchronous successive halving: workers are never idle waiting for a rung to finish."""
+        resources = self.resources
+        rungs = [fun.CallLog() for _ in resources]
+        promoted = [set() for _ in resources]
+
+        def next_job():
+            # promote the best configuration that is eligible, starting from the top
+            for k in range(len(resources) - 2, -1, -1):
+                ranked = sorted(rungs[k].items(), key=op.itemgetter(1), reverse=maximize)
+                for args, _ in ranked[:len(ranked) // self.eta]:
+                    if args not in promoted[k]:
+                        promoted[k].add(args)
+                        return k + 1, self._config(args)
+            return 0, self._sample(rng)
+
+        jobs = {}
+        with worker_pool(evaluate, self.num_workers) as pool:
+            num_evals = 0
+            while num_evals < budget or jobs:
+                while num_evals < budget and len(jobs) < pool.number_of_processes:
+                    k, config = next_job()
+                    jobs[pool.submit((config, resources[k]))] = (k, config)
+                    num_evals += 1
+                i, value = pool.result()
+                k, config = jobs.pop(i)
+                rungs[k].insert(util.score(value), *config)
+                record(k, config, util.score(value))
+
+    @staticmethod
+    def _config(args):
+        """Converts the arguments of a rung's call log back into a configuration."""
+        d = args._asdict()
+        return tuple(d['pos_' + str(i)] for i in range(len(d)))
+
+    @_copydoc(Solver.optimize)
+    def optimize(self, f, maximize=True, pmap=map):
+        names = list(self.bounds.keys())
+        resources = self.resources
+        rng = random.Random(self.seed)
+
+        @functools.wraps(f)
+        def evaluate(args):
+            config, resource = args
+            kwargs = dict(zip(names, config))
+            if self.resource_name is not None:
+                kwargs[self.resource_name] = resource
+            return f(**kwargs)
+
+        # the solution is the best configuration of the highest rung that was reached
+        best = {}
+        def record(k, config, value):
+            if not best or k > best['rung'] or (k == best['rung'] and
+                                                 (value > best['value'] if maximize
+                                                  else value < best['value'])):
+                best.update(rung=k, config=config, value=value)
+
+        # pmap may provide its own asynchronous evaluations, e.g. pipelined requests
+        worker_pool = getattr(pmap, 'worker_pool', parallel.WorkerPool)
+        if self.asynchronous and worker_pool is not None:
+            # worker processes do not share the count of evaluations, respect it here
+            budget = self.num_evals
+            if hasattr(f, 'max_evals'):
+                budget = min(budget, f.max_evals - getattr(f, 'num_evals', 0))
+            self._asha(evaluate, rng, maximize, budget, record, worker_pool)
+        else:
+            self._successive_halving(evaluate, rng, maximize, pmap, record)
+
+        if not best:
+            config = tuple(0.5 * (lb + ub) for lb, ub in self.bounds.values())
+            return dict(zip(names, config)), None
+        solution = dict(zip(names, best['config']))
+        if self.resource_name is not None:
+            solution[self.resource_name] = resources[best['rung']]
+        return solution, None
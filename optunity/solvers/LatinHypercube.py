@@ -0,0 +1,164 @@
+#! /usr/bin/env python
+
+# Copyright (c) 2014 KU Leuven, ESAT-STADIUS
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# 3. Neither name of copyright holders nor the names of its contributors
+# may be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# ``AS IS'' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED.  IN NO EVENT SHALL THE REGENTS OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from .solver_registry import register_solver
+from .util import Solver, _copydoc
+from . import util
+from ..util import module_available
+
+# NumPy is only imported once the solver is used
+_numpy_available = module_available('numpy')
+
+
+class LatinHypercube(Solver):
+    """
+    .. include:: /global.rst
+
+    Please refer to |lhs| for details on this algorithm.
+
+    Samples the search space with a Latin hypercube design: the range of every
+    hyperparameter is split into ``num_evals`` strata of equal width, and every
+    stratum is sampled exactly once.
+
+    .. warning:: This solver has a dependency on NumPy_
+        and will be unavailable if it is not met.
+
+        .. _NumPy: http://www.numpy.org
+
+    """
+
+    def __init__(self, num_evals, seed=None, batch_size=None, **kwargs):
+        """
+        Initializes a Latin hypercube solver.
+
+        :param num_evals: number of evaluations to use
+        :type num_evals: int
+        :param seed: seed for the random number generator
+        :type seed: int or None
+        :param batch_size: number of points that are generated and evaluated at once,
+            all points at once if None
+        :type batch_size: int or None
+        :param kwargs: box constraints for each hyperparameter
+        :type kwargs: {'name': [lb, ub], ...}
+
+        """
+        if not _numpy_available:
+            raise ImportError('This solver requires NumPy but it is missing.')
+        assert all([len(v) == 2 and v[0] <= v[1]
+                    for v in kwargs.values()]), 'kwargs.values() are not [lb, ub] pairs'
+        self._bounds = kwargs
+        self._num_evals = num_evals
+        self._seed = seed
+        self._batch_size = batch_size
+
+    @staticmethod
+    def suggest_from_box(num_evals, **kwargs):
+        """Create a configuration for a LatinHypercube solver.
+        The bounds are first tightened, resulting in new bounds covering 99% of the area.
+
+        :param num_evals: number of permitted function evaluations
+        :type num_evals: int
+        :param kwargs: box constraints
+        :type kwargs: {'param': [lb, ub], ...}
+
+        >>> s = LatinHypercube.suggest_from_box(30, x=[0, 1], y=[-1, 0], z=[-1, 1])
+        >>> s['num_evals']
+        30
+        >>> solver = LatinHypercube(**s) #doctest:+SKIP
+
+        """
+        d = util.shrink_bounds(kwargs)
+        d['num_evals'] = num_evals
+        return d
+
+    @property
+    def bounds(self): return self._bounds
+
+    @property
+    def num_evals(self): return self._num_evals
+
+    @property
+    def seed(self): return self._seed
+
+    @property
+    def batch_size(self):
+        """Number of points that are generated and evaluated at once."""
+        return self._batch_size
+
+    def batches(self):
+        """Generates the design in batches of points in the box constraints.
+
+        Every stratum is sampled once (this check requires NumPy).
+
+        >>> s = LatinHypercube(num_evals=4, seed=1, batch_size=3, x=[0, 4]) if _numpy_available else None
+        >>> not _numpy_available or sorted(int(p[0]) for batch in s.batches() for p in batch) == [0, 1, 2, 3]
+        True
+
+        """
+        import numpy as np
+        rng = np.random.RandomState(self.seed)
+        n = self.num_evals
+        lb = np.array([float(v[0]) for v in self.bounds.values()])
+        width = np.array([float(v[1]) for v in self.bounds.values()]) - lb
+
+        # the stratum of every point per dimension
+        strata = np.array([rng.permutation(n) for _ in range(len(lb))]).T.reshape(n, len(lb))
+        batch_size = self.batch_size or n
+        for start in range(0, n, batch_size):
+            rows = strata[start:start + batch_size]
+            unit = (rows + rng.uniform(size=rows.shape)) / n
+            yield (lb + unit * width).tolist()
+
+    @_copydoc(Solver.optimize)
+    def optimize(self, f, maximize=True, pmap=map):
+        names = list(self.bounds.keys())
+        best = util.best_of_batches(f, names, self.batches(), maximize, pmap)
+        if best is None:
+            best = dict([(k, 0.5 * (v[0] + v[1])) for k, v in self.bounds.items()])
+        return best, None
+
+
+if _numpy_available:
+    LatinHypercube = register_solver('latin hypercube',
+                                     'sample the search space using a Latin hypercube design',
+                                     ['Samples the search space using a Latin hypercube design.',
+                                      '',
+                                      'The range of every hyperparameter is split into num_evals strata',
+                                      'of equal width, each of which is sampled exactly once.',
+                                      'This covers every hyperparameter evenly, unlike uniform random sampling.',
+                                      '',
+                                      'This solver requires the following arguments:',
+                                      '- num_evals :: number of evaluations to use',
+                                      '- seed :: (optional) seed for the random number generator',
+                                      '- batch_size :: (optional) number of points evaluated at once',
+                                      '- box constraints via key words: constraints are lists [lb, ub]'
+                                      ])(LatinHypercube)
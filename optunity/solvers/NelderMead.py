@@ -31,6 +31,8 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import array
+import functools
+import math
 import operator as op
 
 from .. import functions as fun
@@ -47,7 +49,11 @@ from . import util
                  ' ',
                  'This solver requires the following arguments:',
                  '- start :: starting point for the solver (through kwargs)',
-                 '- ftol :: accuracy up to which to optimize the function (default 1e-4)'
+                 '- ftol :: accuracy up to which to optimize the function (default 1e-4)',
+                 '- speculative :: evaluate reflection, expansion and contraction',
+                 '  candidates together (default False)',
+                 ' ',
+                 'The initial simplex and shrink steps are evaluated in parallel through pmap.'
                  ])
 class NelderMead(Solver):
     """
@@ -55,6 +61,11 @@ class NelderMead(Solver):
 
     Please refer to |nelder-mead| for details about this algorithm.
 
+    The vertices of the initial simplex and of every shrink step are evaluated together
+    through ``pmap``. With ``speculative=True``, the reflection, expansion and contraction
+    candidates of every iteration are evaluated together as well. The simplex then follows
+    exactly the same path as the sequential algorithm, at the cost of additional evaluations.
+
     >>> s = NelderMead(x=1, y=1, xtol=1e-8) #doctest:+SKIP
     >>> best_pars, _ = s.optimize(lambda x, y: -x**2 - y**2) #doctest:+SKIP
     >>> [math.fabs(best_pars['x']) < 1e-8, math.fabs(best_pars['y']) < 1e-8]  #doctest:+SKIP
@@ -62,7 +73,7 @@ class NelderMead(Solver):
 
     """
 
-    def __init__(self, ftol=1e-4, max_iter=None, **kwargs):
+    def __init__(self, ftol=1e-4, max_iter=None, speculative=False, **kwargs):
         """Initializes the solver with a tuple indicating parameter values.
 
         >>> s = NelderMead(x=1, ftol=2) #doctest:+SKIP
@@ -78,6 +89,7 @@ class NelderMead(Solver):
         self._start = kwargs
         self._ftol = ftol
         self._max_iter = max_iter
+        self._speculative = speculative
         if max_iter is None:
             self._max_iter = len(kwargs) * 200
 
@@ -106,103 +118,156 @@ class NelderMead(Solver):
         """Returns the starting point."""
         return self._start
 
+    @property
+    def speculative(self):
+        """Returns whether all candidates of an iteration are evaluated together."""
+        return self._speculative
+
     @_copydoc(Solver.optimize)
     def optimize(self, f, maximize=True, pmap=map):
-        if maximize:
-            f = fun.negated(f)
-
         sortedkeys = sorted(self.start.keys())
         x0 = [float(self.start[k]) for k in sortedkeys]
 
         f = fun.static_key_order(sortedkeys)(f)
 
+        @functools.wraps(f)
         def func(x):
             return util.score(f(*x))
 
-        xopt = self._solve(func, x0)
+        xopt = self._solve(func, x0, pmap, maximize)
         return dict([(k, v) for k, v in zip(sortedkeys, xopt)]), None
 
-    def _solve(self, func, x0):
+    def _solve(self, func, x0, pmap=map, maximize=False):
+        @functools.wraps(func)
         def f(x):
             return func(list(x))
 
-        x0 = array.array('f', x0)
-        N = len(x0)
+        # the simplex is minimized, negation happens outside of pmap
+        # because parallel maps record the values they return in the call log
+        def objective(x):
+            value = f(x)
+            return -value if maximize else value
 
-        vertices = [x0]
-        values = [f(x0)]
+        def evaluate(xs):
+            values = list(pmap(f, xs))
+            if len(values) < len(xs):
+                # the evaluation budget ran out within this batch
+                raise fun.MaximumEvaluationsException(len(values))
+            return [-value if maximize else value for value in values]
+
+        N = len(x0)
 
         # defaults taken from Wikipedia and SciPy
         alpha = 1.; gamma = 2.; rho = -0.5; sigma = 0.5;
         nonzdelt = 0.05
         zdelt = 0.00025
 
-        # generate vertices
+        # the simplex is stored row-major in a single buffer,
+        # vertex i occupies simplex[i * N:(i + 1) * N]
+        simplex = array.array('d', x0) * (N + 1)
         for k in range(N):
-            vert = vertices[0][:]
-            if vert[k] != 0:
-                vert[k] = (1 + nonzdelt) * vert[k]
+            idx = (k + 1) * N + k
+            if simplex[idx] != 0:
+                simplex[idx] = (1 + nonzdelt) * simplex[idx]
             else:
-                vert[k] = zdelt
-
-            vertices.append(vert)
-            values.append(f(vert))
-
+                simplex[idx] = zdelt
+
+        def vertex(i):
+            return simplex[i * N:(i + 1) * N]
+
+        def column_sums():
+            return array.array('d', [math.fsum(simplex[j::N]) for j in range(N)])
+
+        def move(out, center, i, coeff):
+            """Sets out to center + coeff * (center - vertex i)."""
+            offset = i * N
+            for j in range(N):
+                out[j] = center[j] + coeff * (center[j] - simplex[offset + j])
+
+        def replace(i, x, fx):
+            offset = i * N
+            for j in range(N):
+                total[j] += x[j] - simplex[offset + j]
+            simplex[offset:offset + N] = x
+            values[i] = fx
+
+        values = array.array('d', evaluate([vertex(i) for i in range(N + 1)]))
+
+        # the sum of all vertices is updated incrementally,
+        # and recomputed every N + 1 iterations to avoid drift
+        total = column_sums()
+        centroid = array.array('d', [0.0]) * N
+        xr = array.array('d', [0.0]) * N
+        xe = array.array('d', [0.0]) * N
+        xc = array.array('d', [0.0]) * N
+
+        order = list(range(N + 1))
         niter = 1
         while niter < self.max_iter:
 
-            # sort vertices by ftion value
-            vertices, values = NelderMead.sort_vertices(vertices, values)
+            # sort vertices by function value
+            order.sort(key=values.__getitem__)
+            best, second, worst = order[0], order[-2], order[-1]
 
             # check for convergence
-            if abs(values[0] - values[-1]) <= self.ftol:
+            if abs(values[best] - values[worst]) <= self.ftol:
                 break
 
             niter += 1
+            if niter % (N + 1) == 0:
+                total = column_sums()
+
+            # compute center of gravity of all but the worst vertex
+            offset = worst * N
+            for j in range(N):
+                centroid[j] = (total[j] - simplex[offset + j]) / N
 
-            # compute center of gravity
-            x0 = NelderMead.simplex_center(vertices[:-1])
+            move(xr, centroid, worst, alpha)
+            move(xe, centroid, worst, gamma)
+            move(xc, centroid, worst, rho)
+            if self.speculative:
+                fxr, fxe, fxc = evaluate([xr, xe, xc])
 
             # reflect
-            xr = NelderMead.reflect(x0, vertices[-1], alpha)
-            fxr = f(xr)
-            if values[0] < fxr < values[-2]:
-                vertices[-1] = xr
-                values[-1] = fxr
+            if not self.speculative:
+                fxr = objective(xr)
+            if values[best] < fxr < values[second]:
+                replace(worst, xr, fxr)
                 continue
 
             # expand
-            if fxr < values[0]:
-                xe = NelderMead.reflect(x0, vertices[-1], gamma)
-                fxe = f(xe)
+            if fxr < values[best]:
+                if not self.speculative:
+                    fxe = objective(xe)
                 if fxe < fxr:
-                    vertices[-1] = xe
-                    values[-1] = fxe
+                    replace(worst, xe, fxe)
                 else:
-                    vertices[-1] = xr
-                    values[-1] = fxr
+                    replace(worst, xr, fxr)
                 continue
 
             # contract
-            xc = NelderMead.reflect(x0, vertices[-1], rho)
-            fxc = f(xc)
-            if fxc < values[-1]:
-                vertices[-1] = xc
-                values[-1] = fxc
+            if not self.speculative:
+                fxc = objective(xc)
+            if fxc < values[worst]:
+                replace(worst, xc, fxc)
                 continue
 
             # reduce
-            for idx in range(1, len(vertices)):
-                vertices[idx] = NelderMead.reflect(vertices[0], vertices[idx],
-                                                   sigma)
-                values[idx] = f(vertices[idx])
+            others = order[1:]
+            center = vertex(best)
+            for idx in others:
+                move(xr, center, idx, sigma)
+                simplex[idx * N:(idx + 1) * N] = xr
+            for idx, value in zip(others, evaluate([vertex(idx) for idx in others])):
+                values[idx] = value
+            total = column_sums()
 
-        return list(vertices[min(enumerate(values), key=op.itemgetter(1))[0]])
+        return list(vertex(min(range(N + 1), key=values.__getitem__)))
 
     @staticmethod
     def simplex_center(vertices):
         vector_sum = map(sum, zip(*vertices))
-        return array.array('f', map(lambda x: x / len(vertices), vector_sum))
+        return array.array('d', map(lambda x: x / len(vertices), vector_sum))
 
     @staticmethod
     def sort_vertices(vertices, values):
@@ -213,10 +278,10 @@ class NelderMead(Solver):
 
     @staticmethod
     def scale(vertex, coeff):
-        return array.array('f', map(lambda x: coeff * x, vertex))
+        return array.array('d', map(lambda x: coeff * x, vertex))
 
     @staticmethod
     def reflect(x0, xn1, alpha):
         diff = map(op.sub, x0, xn1)
-        xr = array.array('f', map(op.add, x0, NelderMead.scale(diff, alpha)))
+        xr = array.array('d', map(op.add, x0, NelderMead.scale(diff, alpha)))
         return xr
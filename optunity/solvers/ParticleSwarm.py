@@ -35,12 +35,28 @@ import operator as op
 import random
 import array
 import functools
+import sys
 
+from .. import functions as fun
 from .solver_registry import register_solver
 from .util import Solver, _copydoc, uniform_in_bounds
 from . import util
 from .Sobol import Sobol
 
+
+def _fork_context():
+    """Returns a multiprocessing context that forks, or None if forking is unavailable."""
+    try:
+        import multiprocessing
+    except ImportError:
+        return None
+    if not hasattr(multiprocessing, 'get_context'):
+        return None if sys.platform == 'win32' else multiprocessing
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return None
+    return multiprocessing.get_context('fork')
+
+
 @register_solver('particle swarm',
                  'particle swarm optimization',
                  ['Maximizes the function using particle swarm optimization.',
@@ -55,6 +71,9 @@ from .Sobol import Sobol
                   '- num_particles: number of particles to use in the swarm',
                   '- num_generations: number of iterations used by the swarm',
                   '- max_speed: maximum speed of the particles in each direction (in (0, 1])',
+                  '- num_islands: number of sub-swarms (default 1)',
+                  '- migration_interval: generations between migrations among islands (default 5)',
+                  '- parallel_islands: run islands in separate processes (default True)',
                   '- box constraints via key words: constraints are lists [lb, ub]', ' ',
                   'This solver performs num_particles*num_generations function evaluations.'
                   ])
@@ -63,6 +82,11 @@ class ParticleSwarm(Solver):
     .. include:: /global.rst
 
     Please refer to |pso| for details on this algorithm.
+
+    The swarm can be split into ``num_islands`` sub-swarms, which evolve independently
+    and periodically send their best particle to the next island in a ring.
+    Islands run as separate processes when possible, otherwise they are
+    interleaved and every generation is evaluated through ``pmap``.
     """
 
     class Particle:
@@ -89,7 +113,8 @@ class ParticleSwarm(Solver):
             string += '}'
             return string
 
-    def __init__(self, num_particles, num_generations, max_speed=None, phi1=1.5, phi2=2.0, **kwargs):
+    def __init__(self, num_particles, num_generations, max_speed=None, phi1=1.5, phi2=2.0,
+                 num_islands=1, migration_interval=5, parallel_islands=True, **kwargs):
         """
         Initializes a PSO solver.
 
@@ -103,12 +128,23 @@ class ParticleSwarm(Solver):
         :type phi1: float
         :param phi2: parameter used in updating position based on global best
         :type phi2: float
+        :param num_islands: number of sub-swarms the particles are divided over
+        :type num_islands: int
+        :param migration_interval: number of generations between migrations
+        :type migration_interval: int
+        :param parallel_islands: run every island in a separate process (if forking is available)
+        :type parallel_islands: bool
         :param kwargs: box constraints for each hyperparameter
         :type kwargs: {'name': [lb, ub], ...}
 
         The number of function evaluations it will perform is `num_particles`*`num_generations`.
         The search space is rescaled to the unit hypercube before the solving process begins.
 
+        Islands that run in separate processes evaluate their particles sequentially and
+        ignore ``pmap``. They do not wait for each other: migrants are picked up when they
+        have arrived. Their evaluations are added to the call log of the objective function
+        once all islands are done.
+
         >>> solver = ParticleSwarm(num_particles=10, num_generations=5, x=[-1, 1], y=[0, 2])
         >>> solver.bounds['x']
         [-1, 1]
@@ -118,6 +154,9 @@ class ParticleSwarm(Solver):
         10
         >>> solver.num_generations
         5
+        >>> solver = ParticleSwarm(num_particles=10, num_generations=5, num_islands=3, x=[-1, 1])
+        >>> [len(island) for island in solver._islands()]
+        [4, 3, 3]
 
         .. warning:: |warning-unconstrained|
 
@@ -142,6 +181,10 @@ class ParticleSwarm(Solver):
         self._phi1 = phi1
         self._phi2 = phi2
 
+        self._num_islands = max(1, min(num_islands, num_particles))
+        self._migration_interval = migration_interval
+        self._parallel_islands = parallel_islands
+
     @property
     def phi1(self):
         return self._phi1
@@ -150,6 +193,18 @@ class ParticleSwarm(Solver):
     def phi2(self):
         return self._phi2
 
+    @property
+    def num_islands(self):
+        return self._num_islands
+
+    @property
+    def migration_interval(self):
+        return self._migration_interval
+
+    @property
+    def parallel_islands(self):
+        return self._parallel_islands
+
     @property
     def sobolseed(self): return self._sobolseed
 
@@ -251,21 +306,14 @@ class ParticleSwarm(Solver):
         return dict([(k, v) for k, v in zip(self.bounds.keys(),
                                             particle.position)])
 
-    @_copydoc(Solver.optimize)
-    def optimize(self, f, maximize=True, pmap=map):
+    def _swarm(self, pop, evaluate, fit, pmap):
+        """Evolves a population, yielding its best particle after every generation.
 
-        @functools.wraps(f)
-        def evaluate(d):
-            return f(**d)
+        A migrant particle can be sent into the swarm in return,
+        it replaces the worst particle if it is better than the swarm's best.
 
-        if maximize:
-            fit = 1.0
-        else:
-            fit = -1.0
-
-        pop = [self.generate() for _ in range(self.num_particles)]
+        """
         best = None
-
         for g in range(self.num_generations):
             fitnesses = pmap(evaluate, list(map(self.particle2dict, pop)))
             for part, fitness in zip(pop, fitnesses):
@@ -275,8 +323,131 @@ class ParticleSwarm(Solver):
                     part.best_fitness = part.fitness
                 if not best or best.fitness < part.fitness:
                     best = part.clone()
+
+            migrant = yield best
+            if migrant is not None and best.fitness < migrant.fitness:
+                worst = min(pop, key=op.attrgetter('fitness'))
+                worst.position = migrant.position[:]
+                worst.best = migrant.position[:]
+                worst.fitness = worst.best_fitness = migrant.fitness
+                best = migrant.clone()
+
             for part in pop:
                 self.updateParticle(part, best, self.phi1, self.phi2)
 
+    def _islands(self):
+        """Divides the initial particles over the islands."""
+        sizes = [self.num_particles // self.num_islands + (i < self.num_particles % self.num_islands)
+                 for i in range(self.num_islands)]
+        return [[self.generate() for _ in range(size)] for size in sizes]
+
+    def _interleaved_islands(self, evaluate, fit, pmap):
+        """Runs all islands in this process, one generation at a time.
+        Returns the best position."""
+        swarms = [self._swarm(pop, evaluate, fit, pmap) for pop in self._islands()]
+        bests = [next(swarm) for swarm in swarms]
+        for g in range(1, self.num_generations):
+            if g % self.migration_interval:
+                migrants = [None] * len(swarms)
+            else:
+                migrants = bests[-1:] + bests[:-1]
+            bests = [swarm.send(migrant) for swarm, migrant in zip(swarms, migrants)]
+        return max(bests, key=op.attrgetter('fitness')).position
+
+    def _process_islands(self, context, f, fit):
+        """Runs every island in a separate process, with asynchronous migration in a ring.
+        Returns the best position."""
+        islands = self._islands()
+        inboxes = [context.Queue() for _ in islands]
+        results = context.Queue()
+
+        # islands share the budget of evaluations, if there is one
+        budget = getattr(f, 'max_evals', None)
+        used = context.Value('l', getattr(f, 'num_evals', 0))
+
+        def run(index, pop):
+            random.seed()
+            evaluations = []
+
+            @functools.wraps(f)
+            def evaluate(d):
+                if budget is not None:
+                    with used.get_lock():
+                        if used.value >= budget:
+                            raise fun.MaximumEvaluationsException(budget)
+                        used.value += 1
+                value = f(**d)
+                evaluations.append((d, value))
+                return value
+
+            best = None
+            try:
+                swarm = self._swarm(pop, evaluate, fit, map)
+                best = next(swarm)
+                for g in range(1, self.num_generations):
+                    migrant = None
+                    if not g % self.migration_interval:
+                        inboxes[(index + 1) % len(inboxes)].put((list(best.position), best.fitness))
+                        # take whatever has arrived, without waiting for slower islands
+                        while not inboxes[index].empty():
+                            position, fitness = inboxes[index].get()
+                            if migrant is None or migrant.fitness < fitness:
+                                migrant = ParticleSwarm.Particle(position=array.array('d', position),
+                                                                 speed=array.array('d', [0.0] * len(position)),
+                                                                 best=array.array('d', position),
+                                                                 fitness=fitness, best_fitness=fitness)
+                    best = swarm.send(migrant)
+            except fun.MaximumEvaluationsException:
+                pass
+            finally:
+                if best is None:
+                    results.put((index, None, None, evaluations))
+                else:
+                    results.put((index, list(best.position), best.fitness, evaluations))
+
+        processes = [context.Process(target=run, args=(i, pop)) for i, pop in enumerate(islands)]
+        for process in processes:
+            process.daemon = True
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        # merge the evaluations of all islands in the call log
+        call_log = getattr(f, 'call_log', None)
+        if call_log is not None:
+            for _, _, _, evaluations in sorted(outcomes, key=op.itemgetter(0)):
+                for d, value in evaluations:
+                    call_log.insert(value, **d)
+
+        bests = [(fitness, position) for _, position, fitness, _ in outcomes
+                 if position is not None]
+        if not bests:
+            raise fun.MaximumEvaluationsException(0)
+        return max(bests, key=op.itemgetter(0))[1]
+
+    @_copydoc(Solver.optimize)
+    def optimize(self, f, maximize=True, pmap=map):
+
+        @functools.wraps(f)
+        def evaluate(d):
+            return f(**d)
+
+        if maximize:
+            fit = 1.0
+        else:
+            fit = -1.0
+
+        context = _fork_context() if self.parallel_islands else None
+        if self.num_islands > 1 and context is not None:
+            position = self._process_islands(context, f, fit)
+        elif self.num_islands > 1:
+            position = self._interleaved_islands(evaluate, fit, pmap)
+        else:
+            pop = [self.generate() for _ in range(self.num_particles)]
+            for best in self._swarm(pop, evaluate, fit, pmap):
+                pass
+            position = best.position
+
         return dict([(k, v)
-                        for k, v in zip(self.bounds.keys(), best.position)]), None
+                        for k, v in zip(self.bounds.keys(), position)]), None
@@ -0,0 +1,330 @@
+#! /usr/bin/env python
+
+# Copyright (c) 2014 KU Leuven, ESAT-STADIUS
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# 3. Neither name of copyright holders nor the names of its contributors
+# may be used to endorse or promote products derived from this software
+# without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# ``AS IS'' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED.  IN NO EVENT SHALL THE REGENTS OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import random
+
+from .solver_registry import register_solver
+from .util import Solver, _copydoc
+from .Sobol import _initial_direction_numbers
+from . import util
+from ..util import module_available
+
+# NumPy is only imported once the solver is used
+_numpy_available = module_available('numpy')
+
+# number of bits of every coordinate
+_BITS = 32
+
+
+def _gf2_mulmod(a, b, poly, degree):
+    """Multiplies two polynomials over GF(2) modulo ``poly``, all encoded as bits."""
+    result = 0
+    while b:
+        if b & 1:
+            result ^= a
+        b >>= 1
+        a <<= 1
+        if a >> degree & 1:
+            a ^= poly
+    return result
+
+
+def _gf2_powmod(a, exponent, poly, degree):
+    result = 1
+    while exponent:
+        if exponent & 1:
+            result = _gf2_mulmod(result, a, poly, degree)
+        a = _gf2_mulmod(a, a, poly, degree)
+        exponent >>= 1
+    return result
+
+
+def _prime_factors(n):
+    factors, p = [], 2
+    while p * p <= n:
+        if n % p == 0:
+            factors.append(p)
+            while n % p == 0:
+                n //= p
+        p += 1
+    if n > 1:
+        factors.append(n)
+    return factors
+
+
+def _primitive_polynomials(degree):
+    """Yields all primitive polynomials of given degree over GF(2) in increasing order.
+
+    Polynomials are encoded as bits, including the leading and constant term.
+
+    >>> list(_primitive_polynomials(3))
+    [11, 13]
+    >>> len(list(_primitive_polynomials(5)))
+    6
+
+    """
+    order = 2 ** degree - 1
+    cofactors = [order // p for p in _prime_factors(order)]
+    for poly in range(2 ** degree + 1, 2 ** (degree + 1), 2):
+        # x is a generator iff its multiplicative order modulo poly is 2^degree - 1
+        if degree == 1 or (_gf2_powmod(2, order, poly, degree) == 1 and
+                           all(_gf2_powmod(2, c, poly, degree) != 1 for c in cofactors)):
+            yield poly
+
+
+def _direction_numbers(num_dimensions):
+    """Computes the direction numbers of the first ``num_dimensions`` dimensions.
+
+    The first 40 dimensions use the table of :func:`Sobol.i4_sobol`. Further
+    dimensions use the next primitive polynomials in order of degree, with
+    fixed odd initial direction numbers drawn by a generator seeded with the dimension.
+
+    :returns: a list of ``_BITS`` integers per dimension, bit ``_BITS - 1 - k``
+        of direction number ``k`` is its leading bit
+
+    >>> [v[:3] for v in _direction_numbers(3)]
+    [[2147483648, 1073741824, 536870912], [2147483648, 3221225472, 2684354560], [2147483648, 1073741824, 3758096384]]
+
+    """
+    poly, v = _initial_direction_numbers()
+    polys = list(poly[:num_dimensions])
+    initial = [[v[k][j] for k in range(len(v)) if v[k][j]] for j in range(len(polys))]
+
+    degree = 1
+    while len(polys) < num_dimensions:
+        for p in _primitive_polynomials(degree):
+            if len(polys) == num_dimensions:
+                break
+            if p in poly:
+                continue
+            rng = random.Random(len(polys))
+            initial.append([rng.getrandbits(k + 1) | 1 for k in range(degree)])
+            polys.append(p)
+        degree += 1
+
+    directions = []
+    for p, m in zip(polys, initial):
+        degree = p.bit_length() - 1
+        if degree == 0:
+            m = [1] * _BITS
+        else:
+            m = m[:degree]
+        # m_j = 2^s m_{j-s} xor m_{j-s} xor sum_k a_k 2^k m_{j-k} (Bratley and Fox, section 2)
+        for j in range(len(m), _BITS):
+            new = m[j - degree]
+            for k in range(1, degree + 1):
+                if p >> (degree - k) & 1:
+                    new ^= m[j - k] << k
+            m.append(new)
+        directions.append([m[k] << (_BITS - 1 - k) for k in range(_BITS)])
+    return directions
+
+
+def _reverse_bits(x):
+    """Reverses the bits of an array of 32-bit unsigned integers."""
+    import numpy as np
+    x = ((x >> np.uint32(1)) & np.uint32(0x55555555)) | ((x & np.uint32(0x55555555)) << np.uint32(1))
+    x = ((x >> np.uint32(2)) & np.uint32(0x33333333)) | ((x & np.uint32(0x33333333)) << np.uint32(2))
+    x = ((x >> np.uint32(4)) & np.uint32(0x0F0F0F0F)) | ((x & np.uint32(0x0F0F0F0F)) << np.uint32(4))
+    x = ((x >> np.uint32(8)) & np.uint32(0x00FF00FF)) | ((x & np.uint32(0x00FF00FF)) << np.uint32(8))
+    return (x >> np.uint32(16)) | (x << np.uint32(16))
+
+
+def _owen_scramble(x, seeds):
+    """Nested uniform scrambling of 32-bit coordinates, one seed per column.
+
+    This is the hash-based approximation of Owen scrambling by Burley (2020):
+    a Laine-Karras permutation of the bit-reversed coordinates, which only lets
+    each bit depend on the more significant ones.
+
+    """
+    import numpy as np
+    x = _reverse_bits(x)
+    x = x + seeds
+    for factor in (0x6c50b47c, 0xb82f1e52, 0xc7afe638, 0x8d22f6e6):
+        x ^= x * np.uint32(factor)
+    return _reverse_bits(x)
+
+
+def _sobol_points(start, stop, directions):
+    """Computes points ``start`` up to ``stop`` of the Sobol sequence as 32-bit integers.
+
+    Points are generated independently of each other in Gray code order, so any
+    range of the sequence can be computed at once.
+
+    :param directions: direction numbers as returned by :func:`_direction_numbers`
+    :returns: a NumPy array of shape ``(stop - start, len(directions))``
+
+    >>> _sobol_points(0, 4, _direction_numbers(2)) / 2.0 ** 32 #doctest:+SKIP
+    array([[0.  , 0.  ],
+           [0.5 , 0.5 ],
+           [0.75, 0.25],
+           [0.25, 0.75]])
+
+    """
+    import numpy as np
+    index = np.arange(start, stop, dtype=np.uint64)
+    gray = index ^ (index >> np.uint64(1))
+    v = np.array(directions, dtype=np.uint32).T
+    points = np.zeros((len(index), len(directions)), dtype=np.uint32)
+    for k in range(min(_BITS, int(stop).bit_length())):
+        bit = ((gray >> np.uint64(k)) & np.uint64(1)).astype(bool)
+        points[bit] ^= v[k]
+    return points
+
+
+class ScrambledSobol(Solver):
+    """
+    .. include:: /global.rst
+
+    Please refer to |scrambled-sobol| for details on this algorithm.
+
+    .. warning:: This solver has a dependency on NumPy_
+        and will be unavailable if it is not met.
+
+        .. _NumPy: http://www.numpy.org
+
+    """
+
+    def __init__(self, num_evals, seed=None, batch_size=None, **kwargs):
+        """
+        Initializes a scrambled Sobol sequence solver.
+
+        :param num_evals: number of evaluations to use
+        :type num_evals: int
+        :param seed: seed for the random scrambling
+        :type seed: int or None
+        :param batch_size: number of points that are generated and evaluated at once,
+            all points at once if None
+        :type batch_size: int or None
+        :param kwargs: box constraints for each hyperparameter
+        :type kwargs: {'name': [lb, ub], ...}
+
+        """
+        if not _numpy_available:
+            raise ImportError('This solver requires NumPy but it is missing.')
+        assert all([len(v) == 2 and v[0] <= v[1]
+                    for v in kwargs.values()]), 'kwargs.values() are not [lb, ub] pairs'
+        self._bounds = kwargs
+        self._num_evals = num_evals
+        self._seed = seed
+        self._batch_size = batch_size
+
+    @staticmethod
+    def suggest_from_box(num_evals, **kwargs):
+        """Create a configuration for a ScrambledSobol solver.
+        The bounds are first tightened, resulting in new bounds covering 99% of the area.
+
+        :param num_evals: number of permitted function evaluations
+        :type num_evals: int
+        :param kwargs: box constraints
+        :type kwargs: {'param': [lb, ub], ...}
+
+        >>> s = ScrambledSobol.suggest_from_box(30, x=[0, 1], y=[-1, 0], z=[-1, 1])
+        >>> s['num_evals']
+        30
+        >>> solver = ScrambledSobol(**s) #doctest:+SKIP
+
+        """
+        d = util.shrink_bounds(kwargs)
+        d['num_evals'] = num_evals
+        return d
+
+    @property
+    def bounds(self): return self._bounds
+
+    @property
+    def num_evals(self): return self._num_evals
+
+    @property
+    def seed(self): return self._seed
+
+    @property
+    def batch_size(self):
+        """Number of points that are generated and evaluated at once."""
+        return self._batch_size
+
+    def batches(self):
+        """Generates the scrambled sequence in batches of points in the box constraints.
+
+        Every stratum is sampled once, and batches are slices of the same sequence
+        (these checks require NumPy).
+
+        >>> def points(batch_size, num_evals=8):
+        ...     s = ScrambledSobol(num_evals=num_evals, seed=1, batch_size=batch_size, x=[0, 8], y=[0, 1])
+        ...     return [tuple(p) for batch in s.batches() for p in batch]
+        >>> not _numpy_available or sorted(int(x) for x, _ in points(4)) == list(range(8))
+        True
+        >>> not _numpy_available or points(7, 40) == points(None, 40)
+        True
+        >>> not _numpy_available or len(set(points(5, 40))) == 40
+        True
+
+        """
+        import numpy as np
+        rng = np.random.RandomState(self.seed)
+        lb = np.array([float(v[0]) for v in self.bounds.values()])
+        width = np.array([float(v[1]) for v in self.bounds.values()]) - lb
+        directions = _direction_numbers(len(lb))
+        seeds = rng.randint(0, 2 ** _BITS, size=len(lb), dtype=np.uint64).astype(np.uint32)
+
+        batch_size = self.batch_size or self.num_evals
+        for start in range(0, self.num_evals, batch_size):
+            stop = min(start + batch_size, self.num_evals)
+            points = _owen_scramble(_sobol_points(start, stop, directions), seeds)
+            unit = (points + 0.5) / 2.0 ** _BITS
+            yield (lb + unit * width).tolist()
+
+    @_copydoc(Solver.optimize)
+    def optimize(self, f, maximize=True, pmap=map):
+        names = list(self.bounds.keys())
+        best = util.best_of_batches(f, names, self.batches(), maximize, pmap)
+        if best is None:
+            best = dict([(k, 0.5 * (v[0] + v[1])) for k, v in self.bounds.items()])
+        return best, None
+
+
+if _numpy_available:
+    ScrambledSobol = register_solver('scrambled sobol',
+                                     'sample the search space using a scrambled Sobol sequence',
+                                     ['Samples the search space using an Owen-scrambled Sobol sequence.',
+                                      '',
+                                      'Scrambling randomizes the Sobol sequence while retaining its low discrepancy,',
+                                      'and removes the regular patterns of the plain sequence.',
+                                      'Any number of dimensions is supported.',
+                                      '',
+                                      'This solver requires the following arguments:',
+                                      '- num_evals :: number of evaluations to use',
+                                      '- seed :: (optional) seed for the random scrambling',
+                                      '- batch_size :: (optional) number of points evaluated at once',
+                                      '- box constraints via key words: constraints are lists [lb, ub]'
+                                      ])(ScrambledSobol)
@@ -35,6 +35,7 @@ import operator as op
 import random
 import array
 import functools
+import threading
 try:
     # Python 2
     from itertools import izip_longest
@@ -54,6 +55,18 @@ except NameError:
     #Python 3
     irange = range
 
+# the sequence generator keeps its state in module globals
+_sobol_lock = threading.RLock()
+
+
+def _synchronized(f):
+    """Serializes calls to f, so sequences can be generated from several threads."""
+    @functools.wraps(f)
+    def wrapped_f(*args, **kwargs):
+        with _sobol_lock:
+            return f(*args, **kwargs)
+    return wrapped_f
+
 # Parts of this implementation were obtained from here:
 # obtained from http://people.sc.fsu.edu/~jburkardt/py_src/sobol/sobol.html
 # we have removed all dependencies on numpy and replaced with standard
@@ -84,6 +97,64 @@ except NameError:
 
 
 
+def _initial_direction_numbers(log_max=30):
+    """Returns the primitive polynomials and initial direction numbers of the first 40 dimensions.
+
+    ``v[i][j]`` is direction number i of dimension j, entries beyond the degree
+    of the polynomial of dimension j are zero and completed by :func:`Sobol.i4_sobol`.
+
+    """
+    dim_max = 40
+    #
+    #    Initialize (part of) V.
+    #
+    v = [[0] * dim_max for _ in irange(log_max)]
+    v[0][0:40] = [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, \
+        1, 1, 1, 1, 1, 1, 1, 1, 1, 1, \
+        1, 1, 1, 1, 1, 1, 1, 1, 1, 1, \
+        1, 1, 1, 1, 1, 1, 1, 1, 1, 1 ]
+
+    v[1][2:40] = [1, 3, 1, 3, 1, 3, 3, 1, \
+        3, 1, 3, 1, 3, 1, 1, 3, 1, 3, \
+        1, 3, 1, 3, 3, 1, 3, 1, 3, 1, \
+        3, 1, 1, 3, 1, 3, 1, 3, 1, 3 ]
+
+    v[2][3:40] = [7, 5, 1, 3, 3, 7, 5, \
+        5, 7, 7, 1, 3, 3, 7, 5, 1, 1, \
+        5, 3, 3, 1, 7, 5, 1, 3, 3, 7, \
+        5, 1, 1, 5, 7, 7, 5, 1, 3, 3 ]
+
+    v[3][5:40] = [1, 7, 9, 13, 11, \
+        1, 3, 7, 9, 5, 13, 13, 11, 3, 15, \
+        5, 3, 15, 7, 9, 13, 9, 1, 11, 7, \
+        5, 15, 1, 15, 11, 5, 3, 1, 7, 9 ]
+
+    v[4][7:40] = [9, 3,27, \
+        15,29,21,23,19,11,25, 7,13,17, \
+        1,25,29, 3,31,11, 5,23,27,19, \
+        21, 5, 1,17,13, 7,15, 9,31, 9 ]
+
+    v[5][13:40] = [37, 33, 7, 5,11, 39, 63, \
+        27, 17, 15, 23, 29, 3, 21, 13, 31, 25, \
+        9, 49, 33, 19, 29, 11, 19, 27, 15, 25 ]
+
+    v[6][19:40] = [13, \
+        33, 115, 41, 79, 17, 29, 119, 75, 73, 105, \
+        7, 59, 65, 21, 3, 113, 61, 89, 45, 107 ]
+
+    v[7][37:40] = [7, 23, 39 ]
+    #
+    #    Set POLY.
+    #
+    poly= [ \
+        1,     3,     7,    11,    13,    19,    25,    37,    59,    47, \
+        61,    55,    41,    67,    97,    91, 109, 103, 115, 131, \
+        193, 137, 145, 143, 241, 157, 185, 167, 229, 171, \
+        213, 191, 253, 203, 211, 239, 247, 285, 369, 299 ]
+
+    return poly, v
+
+
 @register_solver('sobol',
                  'sample the search space using a Sobol sequence',
                  ['Generates a Sobol sequence of points to sample in the search space.',
@@ -269,6 +340,7 @@ class Sobol(Solver):
         return bit
 
     @staticmethod
+    @_synchronized
     def i4_sobol_generate ( m, n, skip ):
         """Generates a Sobol sequence.
 
@@ -286,6 +358,7 @@ class Sobol(Solver):
         return r
 
     @staticmethod
+    @_synchronized
     def i4_sobol ( dim_num, seed ):
         """
         Generates a new quasi-random Sobol vector with each call.
@@ -330,53 +403,7 @@ class Sobol(Solver):
             dim_num_save = -1
             log_max = 30
             seed_save = -1
-    #
-    #    Initialize (part of) V.
-    #
-            v = [[0] * dim_max for _ in irange(log_max)]
-            v[0][0:40] = [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, \
-                1, 1, 1, 1, 1, 1, 1, 1, 1, 1, \
-                1, 1, 1, 1, 1, 1, 1, 1, 1, 1, \
-                1, 1, 1, 1, 1, 1, 1, 1, 1, 1 ]
-
-            v[1][2:40] = [1, 3, 1, 3, 1, 3, 3, 1, \
-                3, 1, 3, 1, 3, 1, 1, 3, 1, 3, \
-                1, 3, 1, 3, 3, 1, 3, 1, 3, 1, \
-                3, 1, 1, 3, 1, 3, 1, 3, 1, 3 ]
-
-            v[2][3:40] = [7, 5, 1, 3, 3, 7, 5, \
-                5, 7, 7, 1, 3, 3, 7, 5, 1, 1, \
-                5, 3, 3, 1, 7, 5, 1, 3, 3, 7, \
-                5, 1, 1, 5, 7, 7, 5, 1, 3, 3 ]
-
-            v[3][5:40] = [1, 7, 9, 13, 11, \
-                1, 3, 7, 9, 5, 13, 13, 11, 3, 15, \
-                5, 3, 15, 7, 9, 13, 9, 1, 11, 7, \
-                5, 15, 1, 15, 11, 5, 3, 1, 7, 9 ]
-
-            v[4][7:40] = [9, 3,27, \
-                15,29,21,23,19,11,25, 7,13,17, \
-                1,25,29, 3,31,11, 5,23,27,19, \
-                21, 5, 1,17,13, 7,15, 9,31, 9 ]
-
-            v[5][13:40] = [37, 33, 7, 5,11, 39, 63, \
-                27, 17, 15, 23, 29, 3, 21, 13, 31, 25, \
-                9, 49, 33, 19, 29, 11, 19, 27, 15, 25 ]
-
-            v[6][19:40] = [13, \
-                33, 115, 41, 79, 17, 29, 119, 75, 73, 105, \
-                7, 59, 65, 21, 3, 113, 61, 89, 45, 107 ]
-
-            v[7][37:40] = [7, 23, 39 ]
-    #
-    #    Set POLY.
-    #
-            poly= [ \
-                1,     3,     7,    11,    13,    19,    25,    37,    59,    47, \
-                61,    55,    41,    67,    97,    91, 109, 103, 115, 131, \
-                193, 137, 145, 143, 241, 157, 185, 167, 229, 171, \
-                213, 191, 253, 203, 211, 239, 247, 285, 369, 299 ]
-
+            poly, v = _initial_direction_numbers(log_max)
             atmost = 2**log_max - 1
     #
     #    Find the number of bits in ATMOST.
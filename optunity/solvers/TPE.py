@@ -30,38 +30,147 @@
 # NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+
+import math
+import functools
+
 from .solver_registry import register_solver
 from .util import Solver, _copydoc
-import functools
+from . import util
+from .. import search_spaces
+from ..util import module_available
+
+# NumPy is only imported once the solver is used
+_numpy_available = module_available('numpy')
+
+
+class _History(object):
+    """Observations of a TPE run, stored in arrays that grow geometrically.
+
+    Inactive hyperparameters are stored as NaN.
+    """
+
+    def __init__(self, num_dimensions, capacity=64):
+        import numpy as np
+        self._X = np.empty((capacity, num_dimensions))
+        self._y = np.empty(capacity)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def X(self):
+        return self._X[:self._size]
+
+    @property
+    def y(self):
+        return self._y[:self._size]
+
+    def append(self, x, y):
+        import numpy as np
+        if self._size == len(self._y):
+            self._X = np.concatenate([self._X, np.empty_like(self._X)])
+            self._y = np.concatenate([self._y, np.empty_like(self._y)])
+        self._X[self._size] = x
+        self._y[self._size] = y
+        self._size += 1
 
-import random
 
-_numpy_available = True
-try:
-    import numpy
-except ImportError:
-    _numpy_available = False
+def _normal_cdf(z):
+    import numpy as np
+    return 0.5 * (1.0 + np.array([math.erf(v / math.sqrt(2.0)) for v in z]))
+
+
+def _parzen(observations, lb, ub, prior_weight):
+    """Fits a truncated Parzen estimator within [lb, ub] to given observations.
+
+    The estimator includes a broad prior component in the middle of the box.
+    Bandwidths are based on the distances between neighbouring observations,
+    as in [TPE2011]_.
+
+    :returns: weights, means, bandwidths and log normalization constants of all components
+
+    """
+    import numpy as np
+    width = float(ub - lb)
+    mus = np.sort(np.append(observations, 0.5 * (lb + ub)))
+    prior = np.searchsorted(mus, 0.5 * (lb + ub))
+
+    padded = np.concatenate([[lb], mus, [ub]])
+    sigmas = np.maximum(mus - padded[:-2], padded[2:] - mus)
+    sigmas = np.clip(sigmas, width / min(100.0, 1.0 + len(mus)), width)
+    sigmas[prior] = width
+
+    weights = np.ones(len(mus))
+    weights[prior] = prior_weight
+    weights /= weights.sum()
+
+    mass = _normal_cdf((ub - mus) / sigmas) - _normal_cdf((lb - mus) / sigmas)
+    return weights, mus, sigmas, np.log(np.maximum(mass, 1e-300))
+
+
+def _parzen_sample(rng, estimator, num_samples, lb, ub):
+    """Samples from a truncated Parzen estimator."""
+    import numpy as np
+    weights, mus, sigmas, _ = estimator
+    components = rng.choice(len(weights), size=num_samples, p=weights)
+    samples = rng.normal(mus[components], sigmas[components])
+    for _ in range(10):
+        outside = (samples <= lb) | (samples >= ub)
+        if not outside.any():
+            break
+        samples[outside] = rng.normal(mus[components[outside]], sigmas[components[outside]])
+    outside = (samples <= lb) | (samples >= ub)
+    samples[outside] = rng.uniform(lb, ub, size=outside.sum())
+    return samples
+
+
+def _parzen_logpdf(x, estimator):
+    """Log density of a truncated Parzen estimator in each point of x."""
+    import numpy as np
+    weights, mus, sigmas, logmass = estimator
+    z = (x[:, None] - mus) / sigmas
+    terms = (np.log(weights) - logmass - np.log(sigmas * math.sqrt(2 * math.pi))
+             - 0.5 * z ** 2)
+    top = terms.max(axis=1)
+    return top + np.log(np.exp(terms - top[:, None]).sum(axis=1))
+
+
+def _categorical(observations, num_options, prior_weight):
+    """Smoothed option probabilities of a choice, based on observed option indices."""
+    import numpy as np
+    counts = np.bincount(np.floor(observations).astype(int), minlength=num_options)
+    counts = counts[:num_options] + prior_weight
+    return counts / counts.sum()
 
-_hyperopt_available = True
-try:
-    import hyperopt
-except ImportError:
-    _hyperopt_available = False
 
 class TPE(Solver):
     """
     .. include:: /global.rst
 
     This solver implements the Tree-structured Parzen Estimator, as described in [TPE2011]_.
-    This solver uses Hyperopt in the back-end and exposes the TPE estimator with uniform priors.
 
     Please refer to |tpe| for details about this algorithm.
 
+    Candidates are proposed in batches of ``batch_size``, using the constant liar strategy,
+    and every batch is evaluated through ``pmap``. :func:`optunity.maximize` and
+    :func:`optunity.minimize` choose the batch size based on the number of evaluations. Structured search spaces (see :doc:`/user/structured_search_spaces`)
+    are supported natively: choices are modelled as categorical distributions and conditional
+    hyperparameters are only modelled using the evaluations in which they were active.
+
     .. [TPE2011] Bergstra, James S., et al. "Algorithms for hyper-parameter optimization." Advances in Neural Information Processing Systems. 2011
 
+    .. warning:: This solver has a dependency on NumPy_
+        and will be unavailable if it is not met.
+
+        .. _NumPy: http://www.numpy.org
+
     """
 
-    def __init__(self, num_evals=100, seed=None, **kwargs):
+    def __init__(self, num_evals=100, seed=None, batch_size=1, gamma=0.25,
+                 num_startup=10, num_candidates=24, prior_weight=1.0,
+                 search_space=None, **kwargs):
         """
 
         Initialize the TPE solver.
@@ -69,34 +178,81 @@ class TPE(Solver):
         :param num_evals: number of permitted function evaluations
         :type num_evals: int
         :param seed: the random seed to be used
-        :type seed: double
+        :type seed: int or None
+        :param batch_size: number of candidates proposed (and evaluated in parallel) per step
+        :type batch_size: int
+        :param gamma: fraction of the evaluations that is considered good
+        :type gamma: float
+        :param num_startup: number of random evaluations before the estimators are used
+        :type num_startup: int
+        :param num_candidates: number of candidates sampled to propose a single point
+        :type num_candidates: int
+        :param prior_weight: weight of the uniform prior in the estimators
+        :type prior_weight: float
+        :param search_space: a structured search space, instead of box constraints
+        :type search_space: dict or None
         :param kwargs: box constraints for each hyperparameter
         :type kwargs: {'name': [lb, ub], ...}
 
+        When a structured search space is given, the solver works in the vector representation
+        of :class:`optunity.search_spaces.SearchTree`.
 
         """
-        if not _hyperopt_available:
-            raise ImportError('This solver requires Hyperopt but it is missing.')
         if not _numpy_available:
             raise ImportError('This solver requires NumPy but it is missing.')
+        if search_space is not None and kwargs:
+            raise ValueError('Specify either box constraints or a search space, not both.')
 
         self._seed = seed
-        self._bounds = kwargs
         self._num_evals = num_evals
+        self._batch_size = batch_size
+        self._gamma = gamma
+        self._num_startup = num_startup
+        self._num_candidates = num_candidates
+        self._prior_weight = prior_weight
+        self._search_space = search_space
+
+        if search_space is None:
+            self._bounds = kwargs
+            self._choices = {}
+            self._conditions = dict([(k, []) for k in kwargs])
+        else:
+            tree = search_spaces.SearchTree(search_space)
+            self._bounds = tree.to_box()
+            self._choices = dict([(k, len(v)) for k, v in tree.vectorcontent.items()
+                                  if type(v) is search_spaces.Options])
+            self._conditions = tree.conditions()
 
     @staticmethod
     def suggest_from_box(num_evals, **kwargs):
         """
         Verify that we can effectively make a solver from box.
 
-        >>> s = TPE.suggest_from_box(30, x=[0, 1], y=[-1, 0], z=[-1, 1])
+        >>> s = TPE.suggest_from_box(100, x=[0, 1], y=[-1, 0], z=[-1, 1])
+        >>> s['num_evals'], s['batch_size']
+        (100, 4)
         >>> solver = TPE(**s) #doctest:+SKIP
 
         """
         d = dict(kwargs)
         d['num_evals'] = num_evals
+        d['batch_size'] = util.suggest_batch_size(num_evals)
         return d
 
+    @staticmethod
+    def suggest_from_tree(num_evals, search_space):
+        """
+        Verify that we can effectively make a solver for a structured search space.
+
+        >>> s = TPE.suggest_from_tree(30, {'kernel': {'linear': None, 'rbf': {'gamma': [0, 3]}}})
+        >>> s['batch_size']
+        1
+        >>> solver = TPE(**s) #doctest:+SKIP
+
+        """
+        return {'num_evals': num_evals, 'search_space': search_space,
+                'batch_size': util.suggest_batch_size(num_evals)}
+
     @property
     def seed(self):
         return self._seed
@@ -109,29 +265,156 @@ class TPE(Solver):
     def num_evals(self):
         return self._num_evals
 
+    @property
+    def batch_size(self):
+        """Number of candidates per batch."""
+        return self._batch_size
+
+    @property
+    def gamma(self):
+        return self._gamma
+
+    @property
+    def num_startup(self):
+        return self._num_startup
+
+    @property
+    def num_candidates(self):
+        return self._num_candidates
+
+    @property
+    def prior_weight(self):
+        return self._prior_weight
+
+    @property
+    def search_space(self):
+        """The structured search space, if any."""
+        return self._search_space
+
+    def _active(self, X, names):
+        """Determines which hyperparameters are active in each row of X."""
+        import numpy as np
+        index = dict([(name, i) for i, name in enumerate(names)])
+        active = np.ones(X.shape, dtype=bool)
+        for i, name in enumerate(names):
+            for choice, option in self._conditions[name]:
+                active[:, i] &= np.floor(X[:, index[choice]]) == option
+        return active
+
+    def _sample_prior(self, rng, num_samples, names):
+        import numpy as np
+        X = np.empty((num_samples, len(names)))
+        for i, name in enumerate(names):
+            if name in self._choices:
+                X[:, i] = rng.randint(self._choices[name], size=num_samples) + 0.5
+            else:
+                lb, ub = self.bounds[name]
+                X[:, i] = rng.uniform(lb, ub, size=num_samples)
+        return X
+
+    def _propose(self, rng, X, y, names):
+        """Proposes the candidate with the highest ratio l(x) / g(x)."""
+        import numpy as np
+        num_good = max(1, int(math.ceil(self.gamma * len(y))))
+        order = np.argsort(y, kind='mergesort')
+        good, bad = X[order[:num_good]], X[order[num_good:]]
+
+        candidates = np.empty((self.num_candidates, len(names)))
+        scores = np.zeros(candidates.shape)
+        for i, name in enumerate(names):
+            good_i = good[:, i][~np.isnan(good[:, i])]
+            bad_i = bad[:, i][~np.isnan(bad[:, i])]
+            if name in self._choices:
+                num_options = self._choices[name]
+                l = _categorical(good_i, num_options, self.prior_weight)
+                g = _categorical(bad_i, num_options, self.prior_weight)
+                options = rng.choice(num_options, size=self.num_candidates, p=l)
+                candidates[:, i] = options + 0.5
+                scores[:, i] = np.log(l[options]) - np.log(g[options])
+            else:
+                lb, ub = self.bounds[name]
+                l = _parzen(good_i, lb, ub, self.prior_weight)
+                g = _parzen(bad_i, lb, ub, self.prior_weight)
+                candidates[:, i] = _parzen_sample(rng, l, self.num_candidates, lb, ub)
+                scores[:, i] = _parzen_logpdf(candidates[:, i], l) - _parzen_logpdf(candidates[:, i], g)
+
+        scores = np.where(self._active(candidates, names), scores, 0.0).sum(axis=1)
+        return candidates[np.argmax(scores)]
+
     @_copydoc(Solver.optimize)
     def optimize(self, f, maximize=True, pmap=map):
+        import numpy as np
 
-        if maximize:
-            def obj(args):
-                kwargs = dict([(k, v) for k, v in zip(self.bounds.keys(), args)])
-                return -f(**kwargs)
+        names = list(self.bounds.keys())
+        rng = np.random.RandomState(self.seed)
+        history = _History(len(names))
 
-        else:
-            def obj(args):
-                kwargs = dict([(k, v) for k, v in zip(self.bounds.keys(), args)])
-                return f(**kwargs)
+        def observe(X, scores):
+            X = np.where(self._active(X, names), X, np.nan)
+            for x, score in zip(X, scores):
+                history.append(x, -score if maximize else score)
+
+        # known evaluations in the call log are used as observations
+        call_log = getattr(f, 'call_log', None)
+        if call_log:
+            for args, value in list(call_log.items()):
+                args = args._asdict()
+                try:
+                    x = [float(args[name]) for name in names]
+                    score = float(util.score(value))
+                except (KeyError, TypeError, ValueError):
+                    continue
+                observe(np.array([x]), [score])
+
+        @functools.wraps(f)
+        def evaluate(args):
+            return util.score(f(**dict(zip(names, args))))
+
+        best = {'x': None, 'score': None}
+        num_evals = 0
+        while num_evals < self.num_evals:
+            batch_size = min(self.batch_size, self.num_evals - num_evals)
+            if len(history) < max(self.num_startup, 2):
+                batch = self._sample_prior(rng, batch_size, names)
+            else:
+                # constant liar: pending candidates are assumed to be as bad as the worst observation
+                X, y = history.X, history.y
+                lie = y.max()
+                batch = np.empty((batch_size, len(names)))
+                for i in range(batch_size):
+                    batch[i] = self._propose(rng, X, y, names)
+                    pending = np.where(self._active(batch[i:i + 1], names), batch[i:i + 1], np.nan)
+                    X, y = np.vstack([X, pending]), np.append(y, lie)
 
-        seed = self.seed if self.seed else random.randint(0, 9999999999)
-        algo = functools.partial(hyperopt.tpe.suggest, seed=seed)
+            scores = list(pmap(evaluate, batch.tolist()))
+            observe(batch[:len(scores)], scores)
+            num_evals += len(scores)
+            for x, score in zip(batch, scores):
+                if best['score'] is None or (score > best['score'] if maximize
+                                             else score < best['score']):
+                    best['x'], best['score'] = x, score
+            if len(scores) < batch_size:
+                # evaluations ran out
+                break
 
-        space = [hyperopt.hp.uniform(k, v[0], v[1]) for k, v in self.bounds.items()]
-        best = hyperopt.fmin(obj, space=space, algo=algo, max_evals=self.num_evals)
-        return best, None
+        if best['x'] is None:
+            return dict([(k, 0.5 * (v[0] + v[1])) for k, v in self.bounds.items()]), None
+        return dict([(k, float(v)) for k, v in zip(names, best['x'])]), None
 
 
-# TPE is a simple wrapper around Hyperopt's TPE solver
-if _hyperopt_available and _numpy_available:
+if _numpy_available:
     TPE = register_solver('TPE', 'Tree of Parzen estimators',
-                        ['TPE: Tree of Parzen Estimators']
-                          )(TPE)
+                          ['TPE: Tree of Parzen Estimators',
+                           ' ',
+                           'This method requires the following parameters:',
+                           '- num_evals :: number of permitted function evaluations',
+                           '- seed :: (optional) seed for the random number generator',
+                           '- batch_size :: (optional) candidates evaluated in parallel per step, default 1',
+                           '- gamma :: (optional) fraction of good evaluations, default 0.25',
+                           '- num_startup :: (optional) number of initial random evaluations, default 10',
+                           '- box constraints via key words: constraints are lists [lb, ub]',
+                           '  or a structured search space via search_space',
+                           ' ',
+                           'This method is described in detail in:',
+                           'Bergstra et al., 2011. Algorithms for hyper-parameter optimization. NIPS.'
+                           ])(TPE)
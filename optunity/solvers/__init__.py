@@ -42,34 +42,86 @@ Main classes in this module:
 * :class:`TPE`
 * :class:`Sobol`
 * :class:`BayesOpt`
+* :class:`LatinHypercube`
+* :class:`ScrambledSobol`
+* :class:`Hyperband`
 
 .. warning::
-    :class:`CMA_ES` require DEAP_ and NumPy_.
+    :class:`CMA_ES` requires NumPy_.
 
-    .. _DEAP: https://code.google.com/p/deap/
     .. _NumPy: http://www.numpy.org
 
 .. warning::
-    :class:`TPE` require Hyperopt_ and NumPy_.
+    :class:`TPE` requires NumPy_.
 
-    .. _Hyperopt: http://jaberg.github.io/hyperopt/
     .. _NumPy: http://www.numpy.org
 
 .. warning::
-    :class:`BayesOpt` require BayesOpt_ and NumPy_.
+    :class:`BayesOpt`, :class:`LatinHypercube` and :class:`ScrambledSobol` require NumPy_.
 
-    .. _BayesOpt: http://rmcantin.bitbucket.org/html/
     .. _NumPy: http://www.numpy.org
 
+Solver classes are imported on first access, importing this package does not
+import any solver module.
+
 .. moduleauthor:: Marc Claesen
 
 """
 
-from .GridSearch import GridSearch
-from .RandomSearch import RandomSearch
-from .NelderMead import NelderMead
-from .ParticleSwarm import ParticleSwarm
-from .CMAES import CMA_ES
-from .TPE import TPE
-from .Sobol import Sobol
-from .BayesOpt import BayesOpt
+import importlib
+import sys
+import types
+
+from . import solver_registry
+
+# solver classes and the modules that define them
+_solver_modules = [('GridSearch', 'GridSearch'),
+                   ('RandomSearch', 'RandomSearch'),
+                   ('NelderMead', 'NelderMead'),
+                   ('ParticleSwarm', 'ParticleSwarm'),
+                   ('CMA_ES', 'CMAES'),
+                   ('TPE', 'TPE'),
+                   ('Sobol', 'Sobol'),
+                   ('BayesOpt', 'BayesOpt'),
+                   ('LatinHypercube', 'LatinHypercube'),
+                   ('ScrambledSobol', 'ScrambledSobol'),
+                   ('Hyperband', 'Hyperband')]
+
+__all__ = [name for name, _ in _solver_modules]
+
+
+if sys.version_info >= (3, 5):
+
+    class _LazySolvers(types.ModuleType):
+        """Imports solver classes on first access."""
+
+        def __getattr__(self, name):
+            module_name = dict(_solver_modules).get(name, None)
+            if module_name is None:
+                raise AttributeError("module '" + __name__ + "' has no attribute '" + name + "'")
+            module = importlib.import_module('.' + module_name, __name__)
+            cls = getattr(module, name)
+            self.__dict__[name] = cls
+            return cls
+
+        def __setattr__(self, name, value):
+            # importing a solver module binds it to this package under the
+            # name of its class, which must keep referring to the class
+            if isinstance(value, types.ModuleType) and name in dict(_solver_modules):
+                return
+            types.ModuleType.__setattr__(self, name, value)
+
+    sys.modules[__name__].__class__ = _LazySolvers
+
+else:
+    from .GridSearch import GridSearch
+    from .RandomSearch import RandomSearch
+    from .NelderMead import NelderMead
+    from .ParticleSwarm import ParticleSwarm
+    from .CMAES import CMA_ES
+    from .TPE import TPE
+    from .Sobol import Sobol
+    from .BayesOpt import BayesOpt
+    from .LatinHypercube import LatinHypercube
+    from .ScrambledSobol import ScrambledSobol
+    from .Hyperband import Hyperband
@@ -32,9 +32,33 @@
 
 """Module to take care of registering solvers for use in the main Optunity API.
 
+Solvers are registered lazily: the registry holds their name, a brief description,
+the class to use (as ``module:Class``) and the modules they require. A solver's module
+is only imported when the solver is first requested via :func:`get`.
+
+Third-party packages can provide solvers through the ``optunity.solvers`` entry point group,
+e.g. in their ``setup.py``::
+
+    entry_points={'optunity.solvers': ['my solver = mypackage.solver:MySolver']}
+
+Entry points are only inspected when a solver is requested that is not built in, or when
+all registered solvers are listed. To provide descriptions without importing the solver
+class, an entry point can instead refer to a declaration, i.e. a dictionary in a lightweight
+module with the keys ``target`` (the class, as ``'module:Class'``), ``desc_brief``,
+``desc_full`` and optionally ``requires``::
+
+    entry_points={'optunity.solvers': ['my solver = mypackage.declarations:MY_SOLVER']}
+
+    MY_SOLVER = {'target': 'mypackage.solver:MySolver',
+                 'desc_brief': 'my solver',
+                 'desc_full': ['My solver.', 'It requires num_evals.']}
+
+The solver class is then only imported when the solver is built.
+
 Main functions in this module:
 
 * :func:`register_solver`
+* :func:`declare_solver`
 * :func:`manual`
 * :func:`get`
 
@@ -42,36 +66,195 @@ Main functions in this module:
 
 """
 
-__all__ = ['get', 'manual', 'register_solver', 'solver_names']
+import importlib
+
+from ..util import module_available
+
+__all__ = ['get', 'manual', 'register_solver', 'declare_solver', 'solver_names']
+
+
+class _SolverSpec(object):
+    """Registry entry of a solver whose class is imported on first use."""
+
+    def __init__(self, name, desc_brief=None, target=None, requires=(), cls=None,
+                 desc_full=None):
+        self.name = name
+        self.desc_brief = desc_brief
+        self.desc_full = desc_full
+        self.target = target
+        self.requires = tuple(requires)
+        self.cls = cls
+        self._available = None if requires else True
+        # entry points may refer to a declaration rather than a class
+        self._declared = False
+
+    @property
+    def available(self):
+        """Whether all modules this solver requires can be imported."""
+        if self._available is None:
+            self._available = all(map(module_available, self.requires))
+        return self._available
+
+    def _import(self):
+        module_name, attr = self.target.split(':')
+        # built-in solver modules register their class while being imported
+        return getattr(importlib.import_module(module_name), attr)
+
+    def _resolve(self):
+        """Imports the target and returns it if it is a class. If it is a declaration,
+        the declared class becomes the target, the declared descriptions and requirements
+        are used and None is returned."""
+        target = self._import()
+        if not isinstance(target, dict):
+            return target
+        self._declared = True
+        self.target = target['target']
+        if self.desc_brief is None:
+            self.desc_brief = target.get('desc_brief', None)
+        if self.desc_full is None:
+            self.desc_full = target.get('desc_full', None)
+        self.requires = tuple(target.get('requires', ()))
+        self._available = None if self.requires else True
+        return None
+
+    def description(self, full=False):
+        """Returns the brief or full description, only importing the class if it is
+        not declared."""
+        attr = 'desc_full' if full else 'desc_brief'
+        if getattr(self, attr) is None and self.cls is None and not self._declared:
+            self._resolve()
+        if getattr(self, attr) is None:
+            self.load()
+        return getattr(self, attr)
+
+    def load(self):
+        """Imports and returns the solver class.
+
+        Raises ``KeyError`` if the solver's declaration requires modules that are missing."""
+        if self.cls is None:
+            cls = None if self._declared else self._resolve()
+            if cls is None:
+                if not self.available:
+                    raise KeyError(self.name)
+                cls = self._import()
+            if self.cls is None:
+                # classes not decorated themselves may inherit another solver's registration
+                if 'desc_full' not in vars(cls):
+                    desc_brief = self.desc_brief or getattr(cls, 'desc_brief', '')
+                    cls = register_solver(self.name, desc_brief,
+                                          self.desc_full or [desc_brief])(cls)
+                self.cls = cls
+        if self.desc_brief is None:
+            self.desc_brief = self.cls.desc_brief
+        if self.desc_full is None:
+            self.desc_full = self.cls.desc_full
+        return self.cls
 
 __registered_solvers = {}
+__entry_points_loaded = False
 
 
 def __register(cls):
     global __registered_solvers
-    __registered_solvers[cls.name.lower()] = cls
+    spec = __registered_solvers.get(cls.name.lower(), None)
+    if spec is None:
+        __registered_solvers[cls.name.lower()] = _SolverSpec(cls.name, cls.desc_brief, cls=cls)
+    else:
+        spec.cls = cls
+
+
+def _entry_points(group):
+    """Returns (name, 'module:attr') pairs of all entry points in given group."""
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        try:
+            import pkg_resources
+        except ImportError:
+            return []
+        return [(ep.name, ep.module_name + ':' + '.'.join(ep.attrs))
+                for ep in pkg_resources.iter_entry_points(group)]
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        eps = eps.select(group=group)
+    else:  # Python < 3.10
+        eps = eps.get(group, [])
+    return [(ep.name, ep.value) for ep in eps]
+
+
+def _load_entry_points():
+    """Declares all solvers provided through entry points (once)."""
+    global __entry_points_loaded
+    if not __entry_points_loaded:
+        __entry_points_loaded = True
+        for name, target in _entry_points('optunity.solvers'):
+            if name.lower() not in __registered_solvers:
+                declare_solver(name, None, target)
+
+
+def _available_specs():
+    _load_entry_points()
+    return [spec for spec in __registered_solvers.values() if spec.available]
 
 
 def get(solver_name):
     """Returns the class of the solver registered under given name.
 
     :param solver_name: name of the solver
-    :returns: the solver class"""
+    :returns: the solver class
+
+    Raises ``KeyError`` if the solver is not registered or its requirements are missing.
+
+    >>> get('grid search').name
+    'grid search'
+
+    """
+    return _get_spec(solver_name).load()
+
+
+def _get_spec(solver_name):
     global __registered_solvers
-    return __registered_solvers[solver_name]
+    key = solver_name.lower()
+    if key not in __registered_solvers:
+        _load_entry_points()
+    spec = __registered_solvers.get(key, None)
+    if spec is None or not spec.available:
+        raise KeyError(solver_name)
+    return spec
 
 
-def manual():
+def manual(solver_name=None):
     """
-    Returns the general manual of Optunity, with a brief introduction of all registered solvers.
+    Returns the manual of given solver or, if none is specified, the general manual of Optunity,
+    with a brief introduction of all registered solvers.
 
+    :param solver_name: (optional) name of the solver to request a manual from
     :returns: the manual as a list of strings (lines)
+
+    Raises ``KeyError`` if the solver is not registered or its requirements are missing.
+
+    Solvers that declare their descriptions are not imported to produce their manual:
+
+    >>> declare_solver('declared solver', 'brief description', 'nonexistent_module:Solver',
+    ...                desc_full=['Full description.'])
+    >>> manual('declared solver')
+    ['Full description.']
+    >>> 'declared solver :: brief description' in manual()
+    True
+    >>> del __registered_solvers['declared solver']
+
     """
-    global __registered_solvers
+    if solver_name:
+        spec = _get_spec(solver_name)
+        return spec.description(full=True)
+
     manual = ['Optunity: optimization algorithms for hyperparameter tuning', ' ',
                 'The following solvers are available:']
-    for name, cls in __registered_solvers.items():
-        manual.append(name + ' :: ' + cls.desc_brief)
+    for spec in _available_specs():
+        desc_brief = spec.description()
+        # declarations may add requirements
+        if spec.available:
+            manual.append(spec.name.lower() + ' :: ' + desc_brief)
     manual.append(' ')
     manual.append("For a solver-specific manual, include its name in the request.")
     manual.append("For more detailed info, please consult the Optunity documentation at:")
@@ -81,8 +264,29 @@ def manual():
 
 def solver_names():
     """Returns a list of all registered solvers."""
+    return [spec.name.lower() for spec in _available_specs()]
+
+
+def declare_solver(name, desc_brief, target, requires=(), desc_full=None):
+    """Declares a solver in the registry without importing it.
+
+    :param name: name to register the solver with
+    :param desc_brief: one-line description of the solver,
+        None to take it from the class once it is imported
+    :param target: the solver class, as ``'module:Class'``
+    :param requires: names of modules the solver requires,
+        it is only available if all of them can be imported
+    :param desc_full: extensive description and manual of the solver as list of strings (lines),
+        None to take it from the class once it is imported
+
+    The class is imported when the solver is first requested via :func:`get`.
+    If it was not decorated with :func:`register_solver`, it is registered
+    with the given name and brief description.
+
+    """
     global __registered_solvers
-    return list(__registered_solvers.keys())
+    __registered_solvers[name.lower()] = _SolverSpec(name, desc_brief, target, requires,
+                                                     desc_full=desc_full)
 
 
 def register_solver(name, desc_brief, desc_full):
@@ -112,3 +316,30 @@ def register_solver(name, desc_brief, desc_full):
         __register(cls)
         return cls
     return class_wrapper
+
+
+# built-in solvers, their manuals are defined along with their classes
+for _args in [('grid search', 'finds optimal parameter values on a predefined grid',
+               'optunity.solvers.GridSearch:GridSearch'),
+              ('random search', 'random parameter tuples sampled uniformly within box constraints',
+               'optunity.solvers.RandomSearch:RandomSearch'),
+              ('nelder-mead', 'simplex method for unconstrained optimization',
+               'optunity.solvers.NelderMead:NelderMead'),
+              ('sobol', 'sample the search space using a Sobol sequence',
+               'optunity.solvers.Sobol:Sobol'),
+              ('particle swarm', 'particle swarm optimization',
+               'optunity.solvers.ParticleSwarm:ParticleSwarm'),
+              ('cma-es', 'covariance matrix adaptation evolutionary strategy',
+               'optunity.solvers.CMAES:CMA_ES', ('numpy',)),
+              ('TPE', 'Tree of Parzen estimators',
+               'optunity.solvers.TPE:TPE', ('numpy',)),
+              ('BayesOpt', 'Bayesian optimization with Gaussian processes',
+               'optunity.solvers.BayesOpt:BayesOpt', ('numpy',)),
+              ('latin hypercube', 'sample the search space using a Latin hypercube design',
+               'optunity.solvers.LatinHypercube:LatinHypercube', ('numpy',)),
+              ('scrambled sobol', 'sample the search space using a scrambled Sobol sequence',
+               'optunity.solvers.ScrambledSobol:ScrambledSobol', ('numpy',)),
+              ('hyperband', 'successive halving of configurations evaluated with growing resources',
+               'optunity.solvers.Hyperband:Hyperband')]:
+    declare_solver(*_args)
+del _args
@@ -32,6 +32,7 @@
 
 
 import abc
+import functools
 import random
 import threading
 
@@ -159,6 +160,64 @@ def score(value):
         return value
 
 
+def suggest_batch_size(num_evals, max_batch_size=8):
+    """Suggests the number of candidates a sequential model-based solver proposes per step.
+
+    :param num_evals: number of permitted function evaluations
+    :type num_evals: int
+    :param max_batch_size: the largest batch size to suggest
+    :type max_batch_size: int
+    :returns: the batch size
+
+    Small budgets are spent one evaluation at a time, as every evaluation
+    improves the model. Larger budgets are spent in batches, so that a
+    parallel ``pmap`` evaluates several candidates concurrently.
+
+    >>> [suggest_batch_size(n) for n in [10, 50, 100, 1000]]
+    [1, 2, 4, 8]
+
+    """
+    return max(1, min(max_batch_size, num_evals // 25))
+
+
+def best_of_batches(f, names, batches, maximize=True, pmap=map):
+    """Evaluates batches of points through ``pmap`` and returns the best point.
+
+    :param f: the objective function, called with keyword arguments
+    :param names: the names of the hyperparameters, in the order of the points
+    :type names: list
+    :param batches: iterable of batches, each a list of points (sequences of values)
+    :param maximize: maximize or minimize?
+    :type maximize: bool
+    :param pmap: the map() function to evaluate each batch with
+    :returns: the best point as a dict, or None if no points were evaluated
+
+    Batches are consumed one at a time, so they can be generated lazily.
+
+    >>> best_of_batches(lambda x: -x ** 2, ['x'], [[[-2], [1]], [[0.5], [3]]])
+    {'x': 0.5}
+
+    """
+    @functools.wraps(f)
+    def evaluate(args):
+        return f(**dict(zip(names, args)))
+
+    best, best_score = None, None
+    for batch in batches:
+        batch = list(batch)
+        scores = list(pmap(evaluate, batch))
+        for point, value in zip(batch, scores):
+            value = score(value)
+            if best is None or (value > best_score if maximize else value < best_score):
+                best, best_score = point, value
+        if len(scores) < len(batch):
+            # evaluations ran out
+            break
+    if best is None:
+        return None
+    return dict([(k, float(v)) for k, v in zip(names, best)])
+
+
 class ThreadSafeQueue(object):
     def __init__(self, lst=None):
         """
@@ -47,18 +47,34 @@ are keys in the JSON root message.
 
 This standalone subprocess can communicate through stdin/stdout or sockets. To use sockets:
 
-- **standalone as client**: specify the port as first commandline argument and host as second (omitting host will imply `localhost`).
+- **standalone as client**: specify the port as first commandline argument and host as second (omitting host will imply `localhost`),
+  or ``unix:<PATH>`` to connect to a Unix domain socket.
 
     .. code::
 
         python -m optunity.standalone <PORT> <HOST>
+        python -m optunity.standalone unix:<PATH>
 
 
 - **standalone as server**: launch with 'server' as first command line argument. The port number that is being listened on will be printed on stdout.
+  Add ``unix:<PATH>`` to listen on a Unix domain socket instead, which is removed once the connection is made.
 
     .. code::
 
         python -m optunity.standalone server
+        python -m optunity.standalone server unix:<PATH>
+
+- **standalone as daemon**: launch with 'daemon' as first command line argument, optionally
+  followed by a port (default: an arbitrary free port) and host (default: `localhost`),
+  or by ``unix:<path>`` to listen on a Unix domain socket. The address that is being
+  listened on will be printed on stdout. The daemon handles any number of concurrent
+  sessions, one per connection, until it is interrupted. Each session behaves exactly
+  like a session with the standalone server, but avoids launching a new process.
+
+    .. code::
+
+        python -m optunity.standalone daemon <PORT> <HOST>
+        python -m optunity.standalone daemon unix:<PATH>
 
 
 Requesting manuals
@@ -341,14 +357,157 @@ and then exit. This final message contains the following:
 +----------+--------------------------------------------------------+--------------+
 
 
+Binary protocol
+----------------
+
+Wrappers evaluating cheap objective functions can avoid most of the JSON overhead by
+negotiating binary frames. The startup message is always a JSON line as described above;
+adding the key ``binary`` to it switches all subsequent messages, in both directions, to
+length-prefixed frames:
+
++--------+-----------------------------------------------------------------+----------+
+| Key    | Value                                                           | Optional |
++========+=================================================================+==========+
+| binary | ``true`` or ``"json"`` for JSON-encoded frames,                 | yes      |
+|        | ``"msgpack"`` for MessagePack-encoded frames (requires msgpack) |          |
++--------+-----------------------------------------------------------------+----------+
+
+Each frame is a 4-byte big-endian unsigned payload length, followed by the payload.
+The first byte of the payload identifies its encoding:
+
+- ``j``: UTF-8 JSON, the remaining bytes are a JSON message as in text mode.
+- ``m``: MessagePack, the remaining bytes are a MessagePack message.
+- ``v``: packed values, the remaining bytes are little-endian float64 values. This
+  is equivalent to ``{"values": [...]}`` and may be used to reply to scalar and
+  vector evaluation requests.
+- ``a``: packed arguments, used for vector evaluation requests in which all
+  hyperparameters are numeric. The remaining bytes are a 4-byte big-endian header
+  length, a UTF-8 JSON list of hyperparameter names, and a row-major matrix of
+  little-endian float64 values with one row per evaluation and one column per name.
+
+Optunity sends vector evaluation requests as ``a`` frames whenever possible (all values
+are then float64) and uses the negotiated encoding for all other messages. Replies may
+use any frame type.
+
+Example exchange to evaluate f(x, y) in (x=1, y=2) and (x=2, y=3)::
+
+    startup (JSON line): {"binary": true, "maximize": {...}}
+    request (a frame):   ["x", "y"] [[1.0, 2.0], [2.0, 3.0]]
+    reply (v frame):     [3.0, 5.0]
+
+Shared memory payloads
+-----------------------
+
+When the external environment runs on the same host, large messages (e.g. call logs,
+folds and vector evaluation requests) can be exchanged through shared memory rather than
+the stream. To enable this, add the key ``shm`` to the startup message:
+
++------+-------------------------------------------------------------------+----------+
+| Key  | Value                                                             | Optional |
++======+===================================================================+==========+
+| shm  | ``true`` or a dictionary:                                         | yes      |
+|      |                                                                   |          |
+|      | - **size** size of the ring buffer in bytes (default: 64 MiB)     | - yes    |
+|      | - **threshold** minimum message size in bytes (default: 64 KiB)   | - yes    |
++------+-------------------------------------------------------------------+----------+
+
+Optunity then writes every message larger than the threshold to a ring buffer in a
+memory-mapped file (in ``/dev/shm`` if available) and sends a reference in its place::
+
+    {"shm_payload": {"path": "/dev/shm/optunity-x2a9.shm", "offset": 0, "length": 1048576}}
+
+The referenced bytes are exactly what would otherwise have been sent: a JSON message in
+text mode or a frame payload in binary mode. A payload in an evaluation request remains
+valid until the client replies to that request, Optunity never overwrites it before.
+When the ring buffer has no room left, messages are sent inline. The ring buffer is
+removed when the session ends, so the final messages of a session (results, folds, call
+logs and errors) are always sent inline.
+
+The client may use the same kind of reference, pointing to a file of its own, for large
+replies and for the startup message itself (which must then contain a JSON message).
+Such files must be regular files named ``optunity-*`` in the same directory as the ring
+buffer (``/dev/shm`` if available) and the referenced bytes must lie within the file,
+other references are rejected.
+
+Streaming
+----------
+
+Folds for large data sets and call logs of long runs lead to large messages. Such replies
+can be streamed in chunks by adding the key ``stream`` to the startup message:
+
++--------+--------------------------------------------------------------------+----------+
+| Key    | Value                                                              | Optional |
++========+====================================================================+==========+
+| stream | ``true`` or a dictionary:                                          | yes      |
+|        |                                                                    |          |
+|        | - **chunk_size** maximum number of elements per chunk (10000)      | - yes    |
++--------+--------------------------------------------------------------------+----------+
+
+A streamed reply consists of a header message, any number of chunk messages and a final
+``{"end_stream": <name>}`` message.
+
+**Folds** (name ``folds``) are generated and sent one iteration at a time. The header is
+``{"fold_stream": {"num_iter": ..., "num_folds": ...}}``, each chunk contains (part of)
+the instance indices of a fold::
+
+    {"fold_chunk": {"iteration": 0, "fold": 1, "indices": [1, 3, 1, 2]}}
+
+Indices are sorted and delta-encoded: the first element is an index, every subsequent element
+is the difference with the previous index (the example encodes indices 1, 4, 5 and 7). Every
+chunk can be decoded on its own; a fold may span several consecutive chunks.
+
+**Call logs** (name ``call_log``) are streamed in the final message of maximize, minimize and
+optimize. The header is the usual final message, with key ``call_log_stream`` containing
+``{"num_evals": ...}`` instead of ``call_log``. Each chunk contains consecutive entries of the
+call log, in the same form as the call log itself::
+
+    {"call_log_chunk": {"args": {"x": [1, 2]}, "values": [3, 4]}}
+
+Pipelined evaluations
+----------------------
+
+By default, Optunity waits for the reply to each evaluation request before sending the next
+one. Environments that evaluate objective functions in parallel (e.g. MATLAB's parfor or R's
+future) can instead allow several outstanding requests by adding the key ``pipeline`` to
+the startup message of maximize, minimize or optimize:
+
++----------+------------------------------------------------------------+----------+
+| Key      | Value                                                      | Optional |
++==========+============================================================+==========+
+| pipeline | maximum number of outstanding evaluation requests          | yes      |
++----------+------------------------------------------------------------+----------+
+
+In pipelined mode, every evaluation request contains a single evaluation tagged with a
+unique id, and each reply must echo the id of the request it answers::
+
+    {"id": 0, "evaluate": {"x": 1, "y": 2}}
+    {"id": 1, "evaluate": {"x": 2, "y": 3}}
+    {"id": 1, "value": 5}
+    {"id": 0, "value": 3}
+
+Optunity sends up to ``pipeline`` requests before waiting for replies, and sends the next
+request as soon as any reply arrives, so replies may be returned in any order. Pipelining
+can be combined with binary frames.
+
+Most solvers propose evaluations in batches, so requests only overlap within a batch.
+Asynchronous solvers continue as replies arrive: Hyperband with ``asynchronous`` enabled
+(ASHA) decides on its next evaluation whenever a reply comes in, keeping ``pipeline``
+requests outstanding. Without pipelining, ``asynchronous`` is disabled. The islands of
+particle swarms are always interleaved in standalone sessions.
+
 
 .. moduleauthor:: Marc Claesen
 
 """
 
 from __future__ import print_function
+import os
 import sys
 import keyword
+import socket
+import threading
+import itertools
+import collections
 
 # optunity imports
 from . import communication as comm
@@ -358,6 +517,90 @@ import optunity
 # list of all Python keywords, which may be used as argument names in wrappers
 _illegal_keys = keyword.kwlist
 
+# default number of elements per chunk of a streamed reply
+_default_chunk_size = 10000
+
+
+def _stream_chunk_size(startup_msg):
+    """Returns the chunk size for streamed replies, or None if not streaming."""
+    stream = startup_msg.get('stream', False)
+    if not stream:
+        return None
+    if isinstance(stream, dict):
+        return int(stream.get('chunk_size', _default_chunk_size))
+    return _default_chunk_size
+
+
+def _fold_chunks(folds, chunk_size):
+    """Yields delta-encoded chunks of the folds of every iteration."""
+    for iteration, iteration_folds in enumerate(folds):
+        for fold, indices in enumerate(iteration_folds):
+            indices = sorted(indices)
+            for start in range(0, max(len(indices), 1), chunk_size):
+                chunk = indices[start:start + chunk_size]
+                yield {'fold_chunk': {'iteration': iteration, 'fold': fold,
+                                      'indices': comm.delta_encode(chunk)}}
+
+
+class _StreamedCallLog(functions.CallLog):
+    """A call log that is streamed in chunks (see :func:`_call_log_chunks`)
+    and therefore never converted into a single dictionary.
+
+    >>> log = _StreamedCallLog()
+    >>> log.insert(1, x=1)
+    >>> log.to_dict() is None
+    True
+
+    """
+
+    def to_dict(self):
+        return None
+
+
+def _call_log_chunks(call_log, chunk_size):
+    """Yields chunks of a call log, each in the dictionary form of a call log.
+
+    Chunks are built one at a time from the entries of the call log.
+
+    >>> log = functions.CallLog()
+    >>> for x in range(5):
+    ...     log.insert(x * x, x=x)
+    >>> chunks = _call_log_chunks(log, 2)
+    >>> next(chunks)
+    {'call_log_chunk': {'args': {'x': [0, 1]}, 'values': [0, 1]}}
+    >>> [chunk['call_log_chunk']['values'] for chunk in chunks]
+    [[4, 9], [16]]
+
+    """
+    entries = iter(call_log.items())
+    while True:
+        chunk = list(itertools.islice(entries, chunk_size))
+        if not chunk:
+            break
+        args = collections.defaultdict(list)
+        for k, _ in chunk:
+            for key, value in k:
+                args[key].append(value)
+        yield {'call_log_chunk': {'args': dict(args),
+                                  'values': [v for _, v in chunk]}}
+
+
+def _send_result(result, chunk_size=None, call_log=None):
+    """Sends the final message of a solving session, streaming call_log
+    if chunk_size is specified.
+
+    Final messages are always sent inline: the shared memory ring buffer
+    is removed when the session ends, possibly before the client reads them.
+
+    """
+    if chunk_size:
+        result.pop('call_log', None)
+        result['call_log_stream'] = {'num_evals': len(call_log)}
+        comm.send_stream('call_log', result, _call_log_chunks(call_log, chunk_size),
+                         inline=True)
+    else:
+        comm.send_message(result, inline=True)
+
 
 def _change_keys_in_solver_config(cfg):
     replacements = comm._find_replacements(_illegal_keys, solver_config)
@@ -372,41 +615,48 @@ def manual_request(solver_name):
         manual, solver_names = optunity.api._manual_lines(solver_name)
     except (ValueError, KeyError):
         msg = {'error_msg': 'Solver does not exist (' + solver_name + ').'}
-        comm.send(comm.json_encode(msg))
-        print(startup_msg, file=sys.stderr)
-        exit(1)
+        comm.send_message(msg, inline=True)
+        print(solver_name, file=sys.stderr)
+        sys.exit(1)
     except EOFError:
         msg = {'error_msg': 'Broken pipe.'}
-        comm.send(comm.json_encode(msg))
-        exit(1)
+        comm.send_message(msg, inline=True)
+        sys.exit(1)
     msg = {'manual': manual, 'solver_names': solver_names}
-    comm.send(comm.json_encode(msg))
-    exit(0)
+    comm.send_message(msg, inline=True)
+    sys.exit(0)
 
 
-def fold_request(cv_opts):
+def fold_request(cv_opts, chunk_size=None):
     """Computes k-fold cross-validation folds.
-    Emulates :func:`optunity.cross_validated`."""
+    Emulates :func:`optunity.cross_validated`.
+
+    If chunk_size is specified, the folds are streamed one iteration at a time."""
     try:
         num_instances = cv_opts['num_instances']
     except (KeyError, ValueError):
         msg = {'error_msg': 'number of instances num_instances must be set.'}
-        comm.send(comm.json_encode(msg))
-        print(startup_msg, file=sys.stderr)
-        exit(1)
+        comm.send_message(msg, inline=True)
+        print(cv_opts, file=sys.stderr)
+        sys.exit(1)
 
     num_folds = cv_opts.get('num_folds', 10)
     strata = cv_opts.get('strata', None)
     clusters = cv_opts.get('clusters', None)
     num_iter = cv_opts.get('num_iter', 1)
 
-    folds = [optunity.generate_folds(num_instances, num_folds=num_folds,
+    folds = (optunity.generate_folds(num_instances, num_folds=num_folds,
                                      strata=strata, clusters=clusters)
-             for _ in range(num_iter)]
+             for _ in range(num_iter))
 
-    msg = {'folds': folds}
-    comm.send(comm.json_encode(msg))
-    exit(0)
+    if chunk_size:
+        header = {'fold_stream': {'num_iter': num_iter, 'num_folds': num_folds}}
+        comm.send_stream('folds', header, _fold_chunks(folds, chunk_size),
+                         inline=True)
+    else:
+        msg = {'folds': list(folds)}
+        comm.send_message(msg, inline=True)
+    sys.exit(0)
 
 
 def make_solver(solver_config):
@@ -414,117 +664,157 @@ def make_solver(solver_config):
         optunity.make_solver(**solver_config)
     except (KeyError, ValueError, TypeError) as e:
         msg = {'error_msg': 'Unable to instantiate solver: ' + str(e)}
-        comm.send(comm.json_encode(msg))
+        comm.send_message(msg, inline=True)
         print(solver_config, file=sys.stderr)
-        exit(1)
+        sys.exit(1)
 
     msg = {'success': 'true'}
-    comm.send(comm.json_encode(msg))
-    exit(0)
+    comm.send_message(msg, inline=True)
+    sys.exit(0)
 
 
-def prepare_fun(mgr, constraints, default, call_log):
+def prepare_fun(mgr, constraints, default, call_log, stream=False):
     """Creates the objective function and wraps it with domain constraints
-    and an existing call log, if applicable."""
+    and an existing call log, if applicable.
+
+    If the call log will be streamed, it is a :class:`_StreamedCallLog`."""
     func = optunity.wrap_constraints(comm.make_piped_function(mgr),
                                      default, **constraints)
     if call_log:
         func = optunity.wrap_call_log(func, call_log)
     else:
         func = functions.logged(func)
+    if stream:
+        streamed = _StreamedCallLog()
+        streamed.update(func.call_log)
+        func.call_log = streamed
     return func
 
 
-def max_or_min(solve_fun, kwargs, constraints, default, call_log):
-    """Emulates :func:`optunity.maximize` and :func:`optunity.minimize`."""
+def max_or_min(solve_fun, kwargs, constraints, default, call_log, pipeline=0,
+               chunk_size=None):
+    """Emulates :func:`optunity.maximize` and :func:`optunity.minimize`.
+
+    A streamed call log is sent in chunks, without ever building it completely:
+
+    >>> import io
+    >>> out = io.BytesIO()
+    >>> comm.use_channel(comm.Channel(io.BytesIO(b'{"values": [1, 2, 3, 4]}\\n'), out))
+    >>> to_dict = functions.CallLog.to_dict
+    >>> def fail(self): raise AssertionError('complete call log built')
+    >>> functions.CallLog.to_dict = fail
+    >>> try:
+    ...     max_or_min(optunity.maximize, {'num_evals': 4, 'solver_name': 'random search',
+    ...                                    'x': [0, 1]}, {}, None, None, chunk_size=3)
+    ... except SystemExit:
+    ...     pass
+    ... finally:
+    ...     functions.CallLog.to_dict = to_dict
+    ...     comm.use_channel(None)
+    >>> messages = [comm.json_decode(line) for line in out.getvalue().decode('utf-8').splitlines()]
+    >>> messages[1]['call_log_stream'], 'call_log' in messages[1]
+    ({'num_evals': 4}, False)
+    >>> [chunk['call_log_chunk']['values'] for chunk in messages[2:-1]]
+    [[1, 2, 3], [4]]
+    >>> messages[-1]
+    {'end_stream': 'call_log'}
+
+    """
     replacements = comm._find_replacements(_illegal_keys, kwargs)
     solver_config = comm._replace_keys(kwargs, replacements)
     constraints = comm._replace_keys(constraints, replacements)
 
     # prepare objective function
-    mgr = comm.EvalManager(replacements=replacements)
-    func = prepare_fun(mgr, constraints, default, call_log)
+    mgr = comm.EvalManager(replacements=replacements, pipeline=pipeline)
+    func = prepare_fun(mgr, constraints, default, call_log, bool(chunk_size))
 
     # solve problem
     try:
-        solution, rslt, solver = solve_fun(func, pmap=mgr.pmap, **solver_config)
+        solution, rslt, solver = solve_fun(func, pmap=comm.make_pmap(mgr), **solver_config)
     except EOFError:
         msg = {'error_msg': 'Broken pipe.'}
-        comm.send(comm.json_encode(msg))
-        exit(1)
+        comm.send_message(msg, inline=True)
+        sys.exit(1)
 
     # send solution and exit
     result = rslt._asdict()
     result['solution'] = solution
     result['solver'] = solver
-    result_json = comm.json_encode(result)
-    comm.send(result_json)
-    exit(0)
+    _send_result(result, chunk_size, func.call_log)
+    sys.exit(0)
+
+
+def _restrict_solver_config(solver_name, solver_config, pipeline=0):
+    """Adapts solver_config to evaluations through this process' channel.
+
+    Islands can't run in forked processes. Asynchronous solvers send pipelined
+    requests, which is impossible without pipelining.
+
+    """
+    if 'num_islands' in solver_config:
+        solver_config.setdefault('parallel_islands', False)
+    if solver_name == 'hyperband' and not pipeline:
+        solver_config['asynchronous'] = False
 
 
-def optimize(solver_config, constraints, default, call_log, maximize, max_evals):
+def optimize(solver_config, constraints, default, call_log, maximize, max_evals,
+             pipeline=0, chunk_size=None):
     """Emulates :func:`optunity.optimize`."""
     replacements = comm._find_replacements(_illegal_keys, solver_config)
     solver_config = comm._replace_keys(solver_config, replacements)
     constraints = comm._replace_keys(constraints, replacements)
 
     # prepare objective function
-    mgr = comm.EvalManager(replacements=replacements)
-    func = prepare_fun(mgr, constraints, default, call_log)
+    mgr = comm.EvalManager(replacements=replacements, pipeline=pipeline)
+    func = prepare_fun(mgr, constraints, default, call_log, bool(chunk_size))
+
+    _restrict_solver_config(solver_config.get('solver_name'), solver_config, pipeline)
 
     # make the solver
     try:
         solver = optunity.make_solver(**solver_config)
     except (ValueError, KeyError) as e:
         msg = {'error_msg': 'Unable to instantiate solver: ' + str(e)}
-        comm.send(comm.json_encode(msg))
+        comm.send_message(msg, inline=True)
         print(solver_config, file=sys.stderr)
-        exit(1)
+        sys.exit(1)
 
     # solve problem
     try:
         solution, rslt = optunity.optimize(solver, func, maximize=maximize,
-                                           max_evals=max_evals, pmap=mgr.pmap)
+                                           max_evals=max_evals, pmap=comm.make_pmap(mgr))
     except EOFError:
         msg = {'error_msg': 'Broken pipe.'}
-        comm.send(comm.json_encode(msg))
-        exit(1)
+        comm.send_message(msg, inline=True)
+        sys.exit(1)
 
     # send solution and exit
     result = rslt._asdict()
     result['solution'] = solution
-    result_json = comm.json_encode(result)
-    comm.send(result_json)
-    exit(0)
-
-
-def main():
-
-    # open a socket if port [+ host] specified in commandline args
-    if len(sys.argv) > 1:
-        if sys.argv[1] == 'server':
-            port, server_socket = comm.open_server_socket()
-            print(port)
-            ## flush is needed for R pipe():
-            sys.stdout.flush()
-            comm.accept_server_connection(server_socket)
+    _send_result(result, chunk_size, func.call_log)
+    sys.exit(0)
 
-        else:
-            try:
-                port = int(sys.argv[1])
-            except ValueError as e:
-                print('Invalid socket port: ' + str(e))
-                sys.exit(1)
-            if len(sys.argv) > 2:
-                host = sys.argv[2]
-            else:
-                host = 'localhost'
-            comm.open_socket(port, host)
 
+def session():
+    """Handles a single session: receives the startup message and
+    dispatches it to the requested use case."""
     startup_json = comm.receive()
 
     try:
         startup_msg = comm.json_decode(startup_json)
+        if list(startup_msg) == ['shm_payload']:
+            payload = comm.read_shm_payload(startup_msg['shm_payload'])
+            startup_msg = comm.json_decode(payload.decode('utf-8'))
+
+        # negotiate binary frames, all subsequent messages are framed
+        binary = startup_msg.get('binary', False)
+        if binary:
+            comm.enable_binary('msgpack' if binary == 'msgpack' else 'json')
+
+        # bulk payloads through shared memory
+        shm = startup_msg.get('shm', False)
+        if shm:
+            comm.enable_shm(**(shm if isinstance(shm, dict) else {}))
 
         if 'manual' in startup_msg:
             solver_name = startup_msg['manual']
@@ -533,7 +823,7 @@ def main():
         elif 'generate_folds' in startup_msg:
             import optunity.cross_validation as cv
             cv_opts = startup_msg['generate_folds']
-            fold_request(cv_opts)
+            fold_request(cv_opts, _stream_chunk_size(startup_msg))
 
         elif 'make_solver' in startup_msg:
             solver_config = startup_msg['make_solver']
@@ -552,7 +842,9 @@ def main():
             max_or_min(solve_fun, kwargs,
                     startup_msg.get('constraints', {}),
                     startup_msg.get('default', None),
-                    startup_msg.get('call_log', None))
+                    startup_msg.get('call_log', None),
+                    startup_msg.get('pipeline', 0),
+                    _stream_chunk_size(startup_msg))
 
         elif 'optimize' in startup_msg:
             max_evals = startup_msg['optimize'].get('max_evals', 0)
@@ -561,63 +853,142 @@ def main():
             # sanity check
             if not 'solver' in startup_msg:
                 msg = {'error_msg': 'No solver specified in startup message.'}
-                comm.send(comm.json_encode(msg))
+                comm.send_message(msg, inline=True)
                 print(startup_msg, file=sys.stderr)
-                exit(1)
+                sys.exit(1)
 
             optimize(startup_msg['solver'],
                     startup_msg.get('constraints', {}),
                     startup_msg.get('default', None),
                     startup_msg.get('call_log', None),
-                    maximize, max_evals)
+                    maximize, max_evals, startup_msg.get('pipeline', 0),
+                    _stream_chunk_size(startup_msg))
 
         else:  # solving a given problem
-            mgr = comm.EvalManager()
-            func = optunity.wrap_constraints(comm.make_piped_function(mgr),
-                                            startup_msg.get('default', None),
-                                            **startup_msg.get('constraints', {})
-                                            )
-
-            if startup_msg.get('call_log', False):
-                func = optunity.wrap_call_log(func, startup_msg['call_log'])
-            else:
-                func = functions.logged(func)
+            mgr = comm.EvalManager(pipeline=startup_msg.get('pipeline', 0))
+            chunk_size = _stream_chunk_size(startup_msg)
+            func = prepare_fun(mgr, startup_msg.get('constraints', {}),
+                               startup_msg.get('default', None),
+                               startup_msg.get('call_log', None), bool(chunk_size))
 
             maximize = startup_msg.get('maximize', True)
 
             # instantiate solver
             try:
+                _restrict_solver_config(startup_msg['solver'], startup_msg['config'],
+                                        startup_msg.get('pipeline', 0))
                 solver = optunity.make_solver(startup_msg['solver'],
                                             **startup_msg['config'])
             except (ValueError, KeyError):
                 msg = {'error_msg': 'Unable to instantiate solver.'}
-                comm.send(comm.json_encode(msg))
+                comm.send_message(msg, inline=True)
                 print(startup_msg, file=sys.stderr)
-                exit(1)
+                sys.exit(1)
             except EOFError:
                 msg = {'error_msg': 'Broken pipe.'}
-                comm.send(comm.json_encode(msg))
-                exit(1)
+                comm.send_message(msg, inline=True)
+                sys.exit(1)
 
             # solve and send result
             try:
                 solution, rslt = optunity.optimize(solver, func, maximize,
-                                                pmap=mgr.pmap)
+                                                pmap=comm.make_pmap(mgr))
             except EOFError:
                 msg = {'error_msg': 'Broken pipe.'}
-                comm.send(comm.json_encode(msg))
-                exit(1)
+                comm.send_message(msg, inline=True)
+                sys.exit(1)
 
             result = rslt._asdict()
             result['solution'] = solution
-            result_json = comm.json_encode(result)
-            comm.send(result_json)
-            exit(0)
+            _send_result(result, chunk_size, func.call_log)
+            sys.exit(0)
 
     except (ValueError, TypeError, AttributeError) as e:
         msg = {'error_msg': str(e)}
-        comm.send(comm.json_encode(msg))
-        exit(1)
+        comm.send_message(msg, inline=True)
+        sys.exit(1)
+    finally:
+        comm.channel().disable_shm()
+
+
+
+def _daemon_session(channel):
+    comm.use_channel(channel)
+    try:
+        session()
+    except (SystemExit, EOFError):
+        pass
+    except Exception as e:
+        print('Session failed: ' + str(e), file=sys.stderr)
+    finally:
+        comm.use_channel(None)
+        channel.close()
+
+
+def daemon(address='0', host='localhost'):
+    """Serves sessions until interrupted, each session in its own thread.
+
+    :param address: TCP port (0 for an arbitrary free port) or ``unix:<path>``
+    :type address: str
+    :param host: the host to bind to for TCP
+    :type host: str
+
+    The address that is being listened on is printed on stdout.
+
+    """
+    try:
+        address, server_socket = comm.open_daemon_socket(address, host)
+    except (socket.error, OverflowError, ValueError) as e:
+        print('Error making socket: ' + str(e), file=sys.stderr)
+        sys.exit(1)
+    print(address)
+    sys.stdout.flush()
+
+    try:
+        while True:
+            channel = comm.accept_session(server_socket)
+            thread = threading.Thread(target=_daemon_session, args=(channel,))
+            thread.daemon = True
+            thread.start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server_socket.close()
+        if address.startswith('unix:'):
+            os.unlink(address[len('unix:'):])
+
+
+def main():
+
+    # open a socket if port [+ host] specified in commandline args
+    if len(sys.argv) > 1:
+        if sys.argv[1] == 'daemon':
+            daemon(*sys.argv[2:4])
+            return
+
+        elif sys.argv[1] == 'server':
+            port, server_socket = comm.open_server_socket(*sys.argv[2:3])
+            print(port)
+            ## flush is needed for R pipe():
+            sys.stdout.flush()
+            comm.accept_server_connection(server_socket)
+
+        elif sys.argv[1].startswith('unix:'):
+            comm.open_socket(sys.argv[1])
+
+        else:
+            try:
+                port = int(sys.argv[1])
+            except ValueError as e:
+                print('Invalid socket port: ' + str(e))
+                sys.exit(1)
+            if len(sys.argv) > 2:
+                host = sys.argv[2]
+            else:
+                host = 'localhost'
+            comm.open_socket(port, host)
+
+    session()
 
 
 if __name__ == '__main__':
@@ -3,9 +3,11 @@
 import unittest
 import doctest
 
-modules = ['cross_validation', 'functions', 'solvers', 'communication',
+modules = ['cross_validation', 'functions', 'solvers', 'communication', 'parallel',
            'solvers.GridSearch', 'solvers.RandomSearch', 'solvers.ParticleSwarm',
-           'solvers.CMAES', 'solvers.NelderMead']
+           'solvers.CMAES', 'solvers.NelderMead', 'solvers.TPE', 'solvers.BayesOpt',
+           'solvers.LatinHypercube', 'solvers.ScrambledSobol', 'solvers.Hyperband',
+           'search_spaces', 'util', 'standalone', 'api']
 
 def load_tests(loader, tests, ignore):
     for mod in modules:
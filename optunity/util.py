@@ -35,6 +35,35 @@
 import collections
 import itertools
 import inspect
+import sys
+
+try:
+    from importlib.util import find_spec as _find_spec
+except ImportError:  # Python 2
+    import imp
+    _find_spec = None
+
+
+def module_available(name):
+    """Returns whether the top-level module name can be imported, without importing it.
+
+    Use this to check optional dependencies that should only be imported on first use.
+
+    >>> module_available('math')
+    True
+    >>> module_available('optunity_nonexistent_module')
+    False
+
+    """
+    if name in sys.modules:
+        return sys.modules[name] is not None
+    if _find_spec is not None:
+        return _find_spec(name) is not None
+    try:
+        imp.find_module(name)
+    except ImportError:
+        return False
+    return True
 
 def nth(iterable, n):
     """Returns the nth item from iterable."""